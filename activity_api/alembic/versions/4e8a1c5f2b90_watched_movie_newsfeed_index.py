@@ -0,0 +1,27 @@
+"""watched_movie_newsfeed_index
+
+Revision ID: 4e8a1c5f2b90
+Revises: 9d2f4b7a1c36
+Create Date: 2026-10-17 15:40:21.118374
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e8a1c5f2b90'
+down_revision: Union[str, None] = '9d2f4b7a1c36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_watched_movie_user_id_watched_at', 'watched_movie',
+                    ['user_id', sa.text('watched_at DESC'), sa.text('watched_movie_id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_watched_movie_user_id_watched_at', table_name='watched_movie')
@@ -0,0 +1,26 @@
+"""watched_movie_user_movie_index
+
+Revision ID: 9d2f4b7a1c36
+Revises: 3271297ac676
+Create Date: 2026-10-17 14:12:08.402731
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2f4b7a1c36'
+down_revision: Union[str, None] = '3271297ac676'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_watched_movie_user_id_movie_id_watched_at', 'watched_movie',
+                    ['user_id', 'movie_id', 'watched_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_watched_movie_user_id_movie_id_watched_at', table_name='watched_movie')
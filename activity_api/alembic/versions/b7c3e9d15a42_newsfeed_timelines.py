@@ -0,0 +1,55 @@
+"""newsfeed_timelines
+
+Revision ID: b7c3e9d15a42
+Revises: 4e8a1c5f2b90
+Create Date: 2026-10-17 17:05:46.927310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c3e9d15a42'
+down_revision: Union[str, None] = '4e8a1c5f2b90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('friendship',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('friend_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id', 'friend_id')
+    )
+    op.create_table('timeline',
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('rebuilt_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_table('timeline_entry',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('watched_movie_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('movie_id', sa.Integer(), nullable=False),
+    sa.Column('watched_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('owner_id', 'watched_movie_id')
+    )
+    op.create_index('ix_timeline_entry_owner_id_watched_at', 'timeline_entry',
+                    ['owner_id', sa.text('watched_at DESC'), sa.text('watched_movie_id DESC')], unique=False)
+    op.create_table('timeline_job',
+    sa.Column('timeline_job_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=16), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('timeline_job_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('timeline_job')
+    op.drop_index('ix_timeline_entry_owner_id_watched_at', table_name='timeline_entry')
+    op.drop_table('timeline_entry')
+    op.drop_table('timeline')
+    op.drop_table('friendship')
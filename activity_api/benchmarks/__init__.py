@@ -0,0 +1,5 @@
+"""
+Benchmarks of the activity API, run them from the activity_api directory against a scratch database:
+
+    python -m benchmarks.<module> --database-url postgresql+psycopg://...
+"""
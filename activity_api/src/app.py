@@ -7,6 +7,7 @@ Disclaimer: This is based on our bachelor eindwerk project setup, which I also l
 """
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 from confz import EnvSource
 from flask import Flask
@@ -15,8 +16,10 @@ from flask_jwt_extended import JWTManager
 
 from src.config import APIConfig
 from src.database.database import db
+from src.database.timeline_worker import timeline_worker
+from src.database.watch_writer import GROUP_COMMIT, watch_writer
 from src.routes import register_public_routes
-from src.cache import cache
+from src.cache import cache, get_cache_config
 from src.limiter import limiter
 from src.error_handlers import register_error_handlers
 
@@ -51,6 +54,7 @@ def create_app(api_config: APIConfig) -> Flask:
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = api_config.db.connection_url
     flask_app.config["SECRET_KEY"] = api_config.secret_key
     flask_app.config["DEBUG"] = api_config.debug
+    flask_app.config.update(get_cache_config(api_config.cache))
 
     CORS(flask_app, supports_credentials=True)
     db.init_app(flask_app)
@@ -66,6 +70,13 @@ def create_app(api_config: APIConfig) -> Flask:
     # Register routes
     register_public_routes(flask_app)
 
+    # Keep the newsfeed timelines up to date with the watched movies in the background
+    # and commit the watched movies in groups if enabled
+    if "pytest" not in sys.modules:
+        timeline_worker.start(flask_app)
+        if GROUP_COMMIT:
+            watch_writer.start(flask_app)
+
     return flask_app
 
 
@@ -44,6 +44,26 @@ class LoggingConfig(BaseConfig):
         return self.level.value
 
 
+class CacheBackend(Enum):
+    """
+    Represents the cache backends.
+    """
+    SIMPLE = "simple"
+    FILESYSTEM = "filesystem"
+    REDIS = "redis"
+
+
+class CacheConfig(BaseConfig):
+    """
+    Represents the response cache configuration.
+    """
+    backend: CacheBackend = CacheBackend.FILESYSTEM
+    default_timeout: int = 300
+    stale_timeout: int = 300
+    directory: Optional[str] = None
+    redis_url: str = "redis://localhost:6379/0"
+
+
 class APIConfig(BaseConfig):
     """
     Represents the configuration for the API.
@@ -54,5 +74,6 @@ class APIConfig(BaseConfig):
                                                        string.digits, k=24))
     debug: Optional[bool] = True
     logging: LoggingConfig = LoggingConfig()
+    cache: CacheConfig = CacheConfig()
     host: Optional[str] = "0.0.0.0"
     port: Optional[int] = 8000
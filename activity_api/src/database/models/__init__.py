@@ -1 +1,3 @@
+from .friendship import Friendship
+from .timeline import Timeline, TimelineEntry, TimelineJob
 from .watched_movie import WatchedMovie
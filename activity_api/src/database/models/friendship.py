@@ -0,0 +1,16 @@
+from sqlalchemy.orm import Mapped, mapped_column
+from src.database.base import Base
+
+
+class Friendship(Base):
+    """
+    Friendship mirrored from the user API, stored in both directions, so the timelines can be kept up to date
+    without asking the user API for the friends of every watcher
+    """
+    __tablename__ = "friendship"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True)
+    """The ID of the user."""
+
+    friend_id: Mapped[int] = mapped_column(primary_key=True)
+    """The ID of a friend of the user."""
@@ -0,0 +1,62 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Index, String
+from sqlalchemy.orm import Mapped, mapped_column
+from src.database.base import Base
+
+
+class Timeline(Base):
+    """
+    Timeline model for the application, a user whose friendships are mirrored and whose newsfeed is kept in the
+    timeline entries
+    """
+    __tablename__ = "timeline"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    """The ID of the user the timeline belongs to."""
+
+    rebuilt_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    """The date and time when the timeline was last built from the watched movies."""
+
+
+class TimelineEntry(Base):
+    """
+    TimelineEntry model for the application, a copy of a watched movie in the timeline of a friend of the watcher
+    """
+    __tablename__ = "timeline_entry"
+
+    owner_id: Mapped[int] = mapped_column(primary_key=True)
+    """The ID of the user whose timeline the entry is in."""
+
+    watched_movie_id: Mapped[int] = mapped_column(primary_key=True)
+    """The ID of the watched movie entry."""
+
+    user_id: Mapped[int]
+    """The ID of the user who watched the movie."""
+
+    movie_id: Mapped[int]
+    """The ID of the movie that was watched."""
+
+    watched_at: Mapped[datetime] = mapped_column(DateTime)
+    """The date and time when the movie was watched."""
+
+
+class TimelineJob(Base):
+    """
+    TimelineJob model for the application, a change to the timelines that the timeline worker has not made yet,
+    stored in the transaction that caused it so it survives a restart
+    """
+    __tablename__ = "timeline_job"
+
+    timeline_job_id: Mapped[int] = mapped_column(primary_key=True)
+    """The ID of the job, the jobs are run in this order."""
+
+    kind: Mapped[str] = mapped_column(String(16))
+    """The kind of job: "fan_out" to copy a watched movie entry, "rebuild" to build the timeline of a user again."""
+
+    target_id: Mapped[int]
+    """The ID of the watched movie entry to copy, or of the user whose timeline is built again."""
+
+
+# Matches the ordering of the newsfeed, so a page is a single index range scan
+Index("ix_timeline_entry_owner_id_watched_at", TimelineEntry.owner_id, TimelineEntry.watched_at.desc(),
+      TimelineEntry.watched_movie_id.desc())
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import DateTime
+from sqlalchemy import DateTime, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from src.database.base import Base
 
@@ -19,5 +19,15 @@ class WatchedMovie(Base):
     movie_id: Mapped[int]
     """The ID of the movie that was watched."""
 
-    watched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now())
+    watched_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
     """The date and time when the movie was watched."""
+
+
+# Covers the counts of a group of users, so they are read from the index alone, and the lookup of the movies
+# a single user watched
+Index("ix_watched_movie_user_id_movie_id_watched_at", WatchedMovie.user_id, WatchedMovie.movie_id,
+      WatchedMovie.watched_at)
+
+# Matches the ordering of the newsfeed, so the page of every friend is an index range scan
+Index("ix_watched_movie_user_id_watched_at", WatchedMovie.user_id, WatchedMovie.watched_at.desc(),
+      WatchedMovie.watched_movie_id.desc())
@@ -0,0 +1,326 @@
+"""
+Fan-out-on-write timelines for the newsfeed.
+
+Every user that reads the newsfeed gets a timeline: a copy of the most recent TIMELINE_LENGTH movies their friends
+watched, kept in the timeline_entry table in newsfeed order. A background worker copies every new watch into the
+timelines of the friends of the watcher, and builds a timeline again from the watched movies when the friendships
+of its user change. The friendships are mirrored from the user API, so neither needs to call it.
+
+The jobs are stored in the timeline_job table in the transaction of the change that causes them, so they are not
+lost when the process stops before running them: any worker sharing the database runs them, also after a restart.
+Jobs that fail are retried with backoff. When they keep failing, the timelines they would have changed are
+dropped, so they are built again from the watched movies on their next read instead of missing watches.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Collection, Iterable
+
+from flask import Flask
+from sqlalchemy import and_, delete, func, literal, or_, select, true, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session, aliased
+
+from src.database.database import db
+from src.database.models import Friendship, Timeline, TimelineEntry, TimelineJob, WatchedMovie
+
+TIMELINE_LENGTH = int(os.getenv("TIMELINE_LENGTH", "500"))
+"""The number of most recent watched movies kept in a timeline, older ones drop out of the newsfeed."""
+
+TIMELINE_COLUMNS = ("owner_id", "watched_movie_id", "user_id", "movie_id", "watched_at")
+"""The columns of a timeline entry, in the order the fan-out and rebuild queries select them."""
+
+JOB_ATTEMPTS = 3
+"""The number of times a batch of jobs is tried before its timelines are dropped."""
+
+RETRY_DELAY = 1.0
+"""The number of seconds before the first retry of a failed batch of jobs, doubled for every next retry."""
+
+JOB_BATCH_SIZE = 1000
+"""The largest number of jobs run together in one transaction."""
+
+POLL_INTERVAL = 5.0
+"""The number of seconds the worker waits to be woken up before it looks for jobs stored by other processes."""
+
+
+def sync_friends(db_session: Session, user_id: int, friend_ids: Iterable[int]) -> set[int]:
+    """
+    Replace the mirrored friendships of a user, in both directions.
+    :param db_session: The database session.
+    :param user_id: The id of the user.
+    :param friend_ids: The ids of all the friends of the user, according to the user API.
+    :return: The ids of the users who became or stopped being a friend of the user.
+    """
+    friend_ids = set(friend_ids)
+    current = set(db_session.scalars(select(Friendship.friend_id).where(Friendship.user_id == user_id)))
+    added, removed = friend_ids - current, current - friend_ids
+    if removed:
+        db_session.execute(delete(Friendship).where(or_(
+            and_(Friendship.user_id == user_id, Friendship.friend_id.in_(removed)),
+            and_(Friendship.friend_id == user_id, Friendship.user_id.in_(removed)),
+        )))
+    if added:
+        db_session.execute(insert(Friendship).values([
+            *({"user_id": user_id, "friend_id": friend_id} for friend_id in added),
+            *({"user_id": friend_id, "friend_id": user_id} for friend_id in added),
+        ]).on_conflict_do_nothing())
+    return added | removed
+
+
+def trim_timelines(db_session: Session, owner_ids: Collection[int]) -> None:
+    """
+    Remove the entries of timelines beyond the TIMELINE_LENGTH most recent ones.
+    :param db_session: The database session.
+    :param owner_ids: The ids of the users whose timelines are trimmed.
+    """
+    if not owner_ids:
+        return
+    ranked = select(
+        TimelineEntry.owner_id,
+        TimelineEntry.watched_movie_id,
+        func.row_number().over(
+            partition_by=TimelineEntry.owner_id,
+            order_by=(TimelineEntry.watched_at.desc(), TimelineEntry.watched_movie_id.desc())
+        ).label("position"),
+    ).where(TimelineEntry.owner_id.in_(owner_ids)).subquery()
+    db_session.execute(delete(TimelineEntry).where(
+        tuple_(TimelineEntry.owner_id, TimelineEntry.watched_movie_id).in_(
+            select(ranked.c.owner_id, ranked.c.watched_movie_id).where(ranked.c.position > TIMELINE_LENGTH)
+        )
+    ))
+
+
+def fan_out(db_session: Session, watched_movie_ids: Collection[int]) -> None:
+    """
+    Copy watched movies into the timelines of the friends of their watchers, with a single statement.
+
+    Users without a timeline are skipped, theirs is built from the watched movies when they first read it.
+    :param db_session: The database session.
+    :param watched_movie_ids: The ids of the watched movie entries.
+    """
+    entries = (
+        select(
+            Friendship.friend_id, WatchedMovie.watched_movie_id, WatchedMovie.user_id, WatchedMovie.movie_id,
+            WatchedMovie.watched_at
+        )
+        .join(Friendship, Friendship.user_id == WatchedMovie.user_id)
+        .join(Timeline, Timeline.user_id == Friendship.friend_id)
+        .where(WatchedMovie.watched_movie_id.in_(watched_movie_ids))
+    )
+    owner_ids = db_session.scalars(
+        insert(TimelineEntry).from_select(TIMELINE_COLUMNS, entries).on_conflict_do_nothing()
+        .returning(TimelineEntry.owner_id)
+    ).all()
+    trim_timelines(db_session, set(owner_ids))
+
+
+def rebuild_timeline(db_session: Session, user_id: int) -> None:
+    """
+    Build the timeline of a user again from the most recent movies their friends watched.
+
+    Every friend contributes at most TIMELINE_LENGTH movies, read from the newsfeed index of the watched movies.
+    :param db_session: The database session.
+    :param user_id: The id of the user.
+    """
+    db_session.execute(delete(TimelineEntry).where(TimelineEntry.owner_id == user_id))
+
+    friend_page = select(WatchedMovie).where(WatchedMovie.user_id == Friendship.friend_id).order_by(
+        WatchedMovie.watched_at.desc(), WatchedMovie.watched_movie_id.desc()
+    ).limit(TIMELINE_LENGTH).lateral("friend_page")
+    entry = aliased(WatchedMovie, friend_page)
+    entries = (
+        select(literal(user_id), entry.watched_movie_id, entry.user_id, entry.movie_id, entry.watched_at)
+        .select_from(Friendship)
+        .join(friend_page, true())
+        .where(Friendship.user_id == user_id)
+        .order_by(entry.watched_at.desc(), entry.watched_movie_id.desc())
+        .limit(TIMELINE_LENGTH)
+    )
+    db_session.execute(insert(TimelineEntry).from_select(TIMELINE_COLUMNS, entries).on_conflict_do_nothing())
+    db_session.execute(insert(Timeline).values(user_id=user_id, rebuilt_at=datetime.now()).on_conflict_do_update(
+        index_elements=[Timeline.user_id], set_={"rebuilt_at": datetime.now()}
+    ))
+
+
+def drop_timelines(db_session: Session, user_ids: Collection[int], watched_movie_ids: Collection[int]) -> None:
+    """
+    Remove timelines, so they are built again when their user next reads the newsfeed.
+    :param db_session: The database session.
+    :param user_ids: The ids of the users whose timelines are removed.
+    :param watched_movie_ids: The ids of watched movie entries, the timelines of the friends of their watchers are
+    removed too.
+    """
+    watchers = select(WatchedMovie.user_id).where(WatchedMovie.watched_movie_id.in_(watched_movie_ids))
+    owners = or_(
+        Timeline.user_id.in_(user_ids),
+        Timeline.user_id.in_(select(Friendship.friend_id).where(Friendship.user_id.in_(watchers))),
+    )
+    db_session.execute(delete(TimelineEntry).where(TimelineEntry.owner_id.in_(select(Timeline.user_id).where(owners))))
+    db_session.execute(delete(Timeline).where(owners))
+
+
+class TimelineWorker:
+    """
+    Keeps the timelines up to date with the watched movies and the friendships in a background thread.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize a TimelineWorker that is not woken up.
+        """
+        self._wake = threading.Event()
+
+    @staticmethod
+    def fan_out_later(db_session: Session, watched_movie_ids: Iterable[int]) -> None:
+        """
+        Store the jobs that copy watched movies into the timelines of the friends of their watchers.
+
+        The jobs are part of the transaction of the session, call wake once it is committed.
+        :param db_session: The database session.
+        :param watched_movie_ids: The ids of the watched movie entries.
+        """
+        TimelineWorker._store_jobs(db_session, "fan_out", watched_movie_ids)
+
+    @staticmethod
+    def rebuild_later(db_session: Session, user_ids: Iterable[int]) -> None:
+        """
+        Store the jobs that build the timelines of users again, after their friendships changed.
+
+        The jobs are part of the transaction of the session, call wake once it is committed.
+        :param db_session: The database session.
+        :param user_ids: The ids of the users, those without a timeline are skipped.
+        """
+        TimelineWorker._store_jobs(db_session, "rebuild", user_ids)
+
+    @staticmethod
+    def _store_jobs(db_session: Session, kind: str, target_ids: Iterable[int]) -> None:
+        """
+        Store jobs of one kind with a single statement.
+        :param db_session: The database session.
+        :param kind: The kind of the jobs.
+        :param target_ids: The id every job is for.
+        """
+        values = [{"kind": kind, "target_id": target_id} for target_id in target_ids]
+        if values:
+            db_session.execute(insert(TimelineJob), values)
+
+    def wake(self) -> None:
+        """
+        Let the worker run the jobs that were just committed, instead of at its next poll.
+        """
+        self._wake.set()
+
+    def run_pending(self, db_session: Session, retry_delay: float = RETRY_DELAY) -> int:
+        """
+        Run the oldest stored jobs, at most JOB_BATCH_SIZE, and commit.
+
+        The jobs are locked while they run, workers of other processes take the next ones.
+        :param db_session: The database session.
+        :param retry_delay: The number of seconds before the first retry if the jobs fail.
+        :return: The number of jobs that were run.
+        """
+        jobs = [
+            (job.timeline_job_id, job.kind, job.target_id) for job in db_session.execute(
+                select(TimelineJob.timeline_job_id, TimelineJob.kind, TimelineJob.target_id)
+                .order_by(TimelineJob.timeline_job_id)
+                .limit(JOB_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+            )
+        ]
+        if jobs:
+            self._run_with_retries(db_session, jobs, retry_delay)
+        else:
+            db_session.rollback()
+        return len(jobs)
+
+    @staticmethod
+    def _run_jobs(db_session: Session, jobs: list[tuple[int, str, int]]) -> None:
+        """
+        Run a batch of jobs in one transaction, the rebuilds first and then all fan-outs at once, and remove them.
+        :param db_session: The database session.
+        :param jobs: The jobs, as (job id, kind, id) tuples.
+        """
+        rebuild_ids = {user_id for _, kind, user_id in jobs if kind == "rebuild"}
+        if rebuild_ids:
+            existing = db_session.scalars(select(Timeline.user_id).where(Timeline.user_id.in_(rebuild_ids)))
+            for user_id in sorted(existing):
+                rebuild_timeline(db_session, user_id)
+        watched_movie_ids = {watched_movie_id for _, kind, watched_movie_id in jobs if kind == "fan_out"}
+        if watched_movie_ids:
+            fan_out(db_session, watched_movie_ids)
+        TimelineWorker._remove_jobs(db_session, jobs)
+        db_session.commit()
+
+    @staticmethod
+    def _remove_jobs(db_session: Session, jobs: list[tuple[int, str, int]]) -> None:
+        """
+        Remove jobs that are done from the table, in the transaction that did them.
+        :param db_session: The database session.
+        :param jobs: The jobs, as (job id, kind, id) tuples.
+        """
+        db_session.execute(delete(TimelineJob).where(TimelineJob.timeline_job_id.in_([job[0] for job in jobs])))
+
+    @staticmethod
+    def _run_with_retries(db_session: Session, jobs: list[tuple[int, str, int]], retry_delay: float) -> None:
+        """
+        Run a batch of jobs, retrying it with backoff. When it keeps failing, its timelines are dropped instead, and
+        when even that fails, the jobs stay stored for the next run.
+        :param db_session: The database session.
+        :param jobs: The jobs, as (job id, kind, id) tuples.
+        :param retry_delay: The number of seconds before the first retry.
+        """
+        for attempt in range(JOB_ATTEMPTS):
+            if attempt:
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+            try:
+                TimelineWorker._run_jobs(db_session, jobs)
+                return
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                db_session.rollback()
+                logging.warning("Could not update the timelines for %d jobs (attempt %d): %s", len(jobs),
+                                attempt + 1, e)
+
+        try:
+            drop_timelines(
+                db_session,
+                {user_id for _, kind, user_id in jobs if kind == "rebuild"},
+                {watched_movie_id for _, kind, watched_movie_id in jobs if kind == "fan_out"},
+            )
+            TimelineWorker._remove_jobs(db_session, jobs)
+            db_session.commit()
+            logging.error("Dropped the timelines of %d failed jobs, they are built again when read.", len(jobs))
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            db_session.rollback()
+            logging.error("Could not drop the timelines of %d failed jobs, they are tried again: %s", len(jobs), e)
+
+    def start(self, flask_app: Flask) -> threading.Thread:
+        """
+        Run the stored jobs in a background thread, starting with those a previous process left behind.
+        :param flask_app: The Flask app, whose database engine is used.
+        :return: The worker thread.
+        """
+        thread = threading.Thread(target=self._run, args=(flask_app,), name="timeline-worker", daemon=True)
+        thread.start()
+        return thread
+
+    def _run(self, flask_app: Flask) -> None:
+        """
+        Run the stored jobs, then wait until woken up or the next poll, forever.
+        :param flask_app: The Flask app, whose database engine is used.
+        """
+        while True:
+            with flask_app.app_context(), Session(db.engine) as db_session:
+                try:
+                    while self.run_pending(db_session) == JOB_BATCH_SIZE:
+                        pass
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # The jobs stay stored, the next poll tries again
+                    logging.error("Could not read the timeline jobs: %s", e)
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+
+
+timeline_worker = TimelineWorker()
+"""The timeline worker of this process."""
@@ -0,0 +1,193 @@
+"""
+Group commit of the watched movies.
+
+Committing every watch on its own makes the database flush its log once per request. With WATCH_GROUP_COMMIT set,
+the watches are handed to a writer thread instead, which inserts everything that queued up while it committed the
+previous batch, up to GROUP_COMMIT_ROWS watches, with one multi-row INSERT and one commit. A request still only
+answers once the transaction holding its watch has committed, so no acknowledged watch is lost. The writer itself
+passes the committed watches on to the newsfeeds and the watched sets, so they get them even when the request
+stopped waiting.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from src.database.database import db
+from src.database.models import WatchedMovie
+from src.database.timeline_worker import timeline_worker
+from src.database.watched_sets import watched_sets
+
+GROUP_COMMIT = os.getenv("WATCH_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+"""Whether the watches are committed in groups by the writer thread, instead of one commit per request."""
+
+GROUP_COMMIT_WINDOW = float(os.getenv("WATCH_GROUP_COMMIT_WINDOW", "0"))
+"""
+The number of seconds the writer waits for more watches after the first one of a batch. Without waiting, the
+batches already grow with the load, and a lone request is not delayed.
+"""
+
+GROUP_COMMIT_ROWS = int(os.getenv("WATCH_GROUP_COMMIT_ROWS", "500"))
+"""The largest number of watches inserted and committed at once."""
+
+RECORD_TIMEOUT = 10.0
+"""The number of seconds a request waits for the batch of its watch to commit."""
+
+
+class WatchWriteError(Exception):
+    """
+    The batch holding a watch could not be stored, nothing of it was.
+    """
+
+
+class PendingWatch:
+    """
+    A watch waiting in the queue of the writer, with the outcome of its batch once it is done.
+    """
+
+    def __init__(self, user_id: int, movie_id: int, watched_at: datetime) -> None:
+        """
+        Initialize a PendingWatch.
+        :param user_id: The ID of the user who watched the movie.
+        :param movie_id: The ID of the movie that was watched.
+        :param watched_at: The date and time when the movie was watched.
+        """
+        self.user_id = user_id
+        self.movie_id = movie_id
+        self.values = {"user_id": user_id, "movie_id": movie_id, "watched_at": watched_at}
+        self.done = threading.Event()
+        self.watched_movie_id: Optional[int] = None
+        self.error: Optional[Exception] = None
+
+
+class WatchWriter:
+    """
+    Inserts the watches of all requests in batches from a single writer thread.
+    """
+
+    def __init__(self, window: float = GROUP_COMMIT_WINDOW, max_rows: int = GROUP_COMMIT_ROWS) -> None:
+        """
+        Initialize a WatchWriter that is not running yet.
+        :param window: The number of seconds to wait for more watches after the first one of a batch.
+        :param max_rows: The largest number of watches in a batch.
+        """
+        self.window = window
+        self.max_rows = max_rows
+        self.batches = 0
+        self._queue: queue.SimpleQueue[Optional[PendingWatch]] = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        """
+        Whether the writer thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def record(self, user_id: int, movie_id: int, timeout: float = RECORD_TIMEOUT) -> int:
+        """
+        Store a watch and wait until the batch holding it has committed.
+        :param user_id: The ID of the user who watched the movie.
+        :param movie_id: The ID of the movie that was watched.
+        :param timeout: The number of seconds to wait for the commit.
+        :return: The ID of the watched movie entry.
+        :raises TimeoutError: If the batch did not commit in time, the watch may still be stored later.
+        :raises WatchWriteError: If the batch failed, nothing of the batch was stored.
+        """
+        watch = PendingWatch(user_id, movie_id, datetime.now())
+        self._queue.put(watch)
+        if not watch.done.wait(timeout):
+            raise TimeoutError("The watched movie was not committed in time")
+        if watch.error is not None:
+            raise WatchWriteError("The watched movie could not be stored") from watch.error
+        assert watch.watched_movie_id is not None
+        return watch.watched_movie_id
+
+    def write(self, db_session: Session, batch: list[PendingWatch]) -> None:
+        """
+        Insert a batch of watches with one statement and commit them with their newsfeed jobs, then wake up the
+        timeline worker, pass them on to the watched sets and wake up the requests waiting on them.
+        :param db_session: The database session.
+        :param batch: The watches.
+        """
+        try:
+            watched_movie_ids = db_session.scalars(
+                insert(WatchedMovie).returning(WatchedMovie.watched_movie_id, sort_by_parameter_order=True),
+                [watch.values for watch in batch]
+            ).all()
+            timeline_worker.fan_out_later(db_session, watched_movie_ids)
+            db_session.commit()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            db_session.rollback()
+            logging.error("Could not store a batch of %d watched movies: %s", len(batch), e)
+            for watch in batch:
+                watch.error = e
+        else:
+            self.batches += 1
+            timeline_worker.wake()
+            for watch, watched_movie_id in zip(batch, watched_movie_ids):
+                watch.watched_movie_id = watched_movie_id
+                watched_sets.add(watch.user_id, watch.movie_id)
+        for watch in batch:
+            watch.done.set()
+
+    def _next_batch(self) -> Optional[list[PendingWatch]]:
+        """
+        Wait for a watch, then collect what arrives within the window, up to max_rows.
+        :return: The batch, None once the writer is stopped.
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_rows:
+            try:
+                watch = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if watch is None:
+                # Write what was collected, then stop on the next call
+                self._queue.put(None)
+                break
+            batch.append(watch)
+        return batch
+
+    def start(self, flask_app: Flask) -> threading.Thread:
+        """
+        Start the writer thread.
+        :param flask_app: The Flask app, whose database engine is used.
+        :return: The writer thread.
+        """
+        self._thread = threading.Thread(target=self._run, args=(flask_app,), name="watch-writer", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        """
+        Write the queued watches and stop the writer thread.
+        """
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, flask_app: Flask) -> None:
+        """
+        Write batches until the writer is stopped.
+        :param flask_app: The Flask app, whose database engine is used.
+        """
+        with flask_app.app_context(), Session(db.engine) as db_session:
+            while (batch := self._next_batch()) is not None:
+                self.write(db_session, batch)
+
+
+watch_writer = WatchWriter()
+"""The watch writer of this process, only started in group commit mode."""
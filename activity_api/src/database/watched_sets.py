@@ -0,0 +1,265 @@
+"""
+Compact in-memory sets of the movies every user watched, for membership and exclusion checks.
+
+The sets are laid out like roaring bitmaps: the movie ids are split on their upper 16 bits into containers, and a
+container holds its lower 16 bits as a sorted array while it has few entries and as a bitmap once that is smaller.
+The catalog numbers its movies densely from 1, so a set is a single container of at most a few kilobytes.
+
+The sets of the most recently used users are loaded from the database once and updated by the watches this process
+stores. Watches are never removed, so a set can only miss watches stored by another process. It is loaded again
+after SET_TTL seconds to bound that, and membership checks read the users of their misses again right away.
+"""
+import bisect
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Iterable, Iterator, Union
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.orm import Session
+
+from src.database.models import WatchedMovie
+
+ARRAY_LIMIT = 4096
+"""The number of entries above which a container is stored as a bitmap, where the two take the same space."""
+
+MAX_CACHED_USERS = 10000
+"""The number of users whose sets are kept in memory, the least recently used are dropped first."""
+
+SET_TTL = 60.0
+"""The number of seconds after which a set is loaded from the database again."""
+
+Container = Union["array[int]", int]
+"""A sorted array of the lower 16 bits of the ids, or a bitmap of them as an int with bit i set for id i."""
+
+
+class WatchedSet:
+    """
+    Roaring-style compressed set of movie ids.
+    """
+
+    def __init__(self, movie_ids: Iterable[int] = ()) -> None:
+        """
+        Initialize a WatchedSet.
+        :param movie_ids: The movie ids in the set.
+        """
+        self._containers: dict[int, Container] = {}
+        self._size = 0
+        for movie_id in sorted(set(movie_ids)):
+            self.add(movie_id)
+
+    def add(self, movie_id: int) -> None:
+        """
+        Add a movie id to the set.
+        :param movie_id: The movie id, 0 or more.
+        """
+        key, low = movie_id >> 16, movie_id & 0xFFFF
+        container = self._containers.get(key, array("H"))
+        if isinstance(container, int):
+            if container >> low & 1:
+                return
+            self._containers[key] = container | 1 << low
+        else:
+            position = bisect.bisect_left(container, low)
+            if position < len(container) and container[position] == low:
+                return
+            container.insert(position, low)
+            self._containers[key] = container
+            if len(container) > ARRAY_LIMIT:
+                self._containers[key] = sum(1 << value for value in container)
+        self._size += 1
+
+    def __contains__(self, movie_id: object) -> bool:
+        """
+        Check whether a movie id is in the set.
+        :param movie_id: The movie id.
+        :return: Whether it is in the set.
+        """
+        if not isinstance(movie_id, int) or movie_id < 0:
+            return False
+        container = self._containers.get(movie_id >> 16)
+        if container is None:
+            return False
+        low = movie_id & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        position = bisect.bisect_left(container, low)
+        return position < len(container) and container[position] == low
+
+    def __len__(self) -> int:
+        """
+        Get the number of movie ids in the set.
+        :return: The number of movie ids.
+        """
+        return self._size
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Iterate over the movie ids in the set.
+        :return: The movie ids, in increasing order.
+        """
+        for key, container in sorted(self._containers.items()):
+            if isinstance(container, int):
+                lows: Iterable[int] = (low for low in range(container.bit_length()) if container >> low & 1)
+            else:
+                lows = container
+            for low in lows:
+                yield key << 16 | low
+
+    def to_bytes(self) -> bytes:
+        """
+        Encode the set as a plain little-endian bitmap, bit i of byte i // 8 is set if movie id i is in the set.
+        :return: The bitmap, as long as needed for the largest movie id.
+        """
+        bitmap = 0
+        for key, container in list(self._containers.items()):
+            if not isinstance(container, int):
+                container = sum(1 << low for low in container)
+            bitmap |= container << (key << 16)
+        return bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+
+
+class WatchedSets:
+    """
+    The watched sets of the most recently used users.
+    """
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS, ttl: float = SET_TTL) -> None:
+        """
+        Initialize WatchedSets without any set in memory.
+        :param max_users: The number of users whose sets are kept in memory.
+        :param ttl: The number of seconds after which a set is loaded again.
+        """
+        self.max_users = max_users
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sets: OrderedDict[int, tuple[float, WatchedSet]] = OrderedDict()
+        # The movies added while a set is read from the database, which the read may not see yet
+        self._loading: dict[int, list[list[int]]] = {}
+
+    def get(self, db_session: Session, user_id: int) -> WatchedSet:
+        """
+        Get the watched set of a user, reading it from the database if it is not in memory or too old.
+        :param db_session: The database session.
+        :param user_id: The id of the user.
+        :return: The set of the movies the user watched.
+        """
+        return self.get_many(db_session, [user_id])[0][user_id]
+
+    def get_many(
+        self,
+        db_session: Session,
+        user_ids: Iterable[int],
+        refresh: bool = False
+    ) -> tuple[dict[int, WatchedSet], set[int]]:
+        """
+        Get the watched sets of users, reading all those not in memory or too old with a single query.
+        :param db_session: The database session.
+        :param user_ids: The ids of the users.
+        :param refresh: Whether to read every set from the database, also those in memory.
+        :return: The set of every user, and the ids of the users whose set was read from the database.
+        """
+        sets: dict[int, WatchedSet] = {}
+        loading: dict[int, list[int]] = {}
+        with self._lock:
+            now = time.monotonic()
+            for user_id in set(user_ids):
+                cached = self._sets.get(user_id)
+                if not refresh and cached is not None and now - cached[0] < self.ttl:
+                    self._sets.move_to_end(user_id)
+                    sets[user_id] = cached[1]
+                else:
+                    # The movies added while the set is read, which the read may not see yet
+                    loading[user_id] = []
+                    self._loading.setdefault(user_id, []).append(loading[user_id])
+        if not loading:
+            return sets, set()
+
+        loaded_at = time.monotonic()
+        try:
+            movie_ids: dict[int, list[int]] = {user_id: [] for user_id in loading}
+            for user_id, movie_id in db_session.execute(
+                select(WatchedMovie.user_id, WatchedMovie.movie_id).where(WatchedMovie.user_id.in_(loading))
+            ):
+                movie_ids[user_id].append(movie_id)
+        except Exception:
+            with self._lock:
+                self._stop_loading(loading)
+            raise
+
+        with self._lock:
+            self._stop_loading(loading)
+            for user_id, added in loading.items():
+                watched_set = sets[user_id] = WatchedSet(movie_ids[user_id] + added)
+                self._sets[user_id] = (loaded_at, watched_set)
+                self._sets.move_to_end(user_id)
+            while len(self._sets) > self.max_users:
+                self._sets.popitem(last=False)
+        return sets, set(loading)
+
+    def _stop_loading(self, loading: dict[int, list[int]]) -> None:
+        """
+        Stop collecting the movies added to sets while they were read, holding the lock.
+        :param loading: The lists the movies were collected in, per user id.
+        """
+        for user_id, added in loading.items():
+            pending = [other for other in self._loading[user_id] if other is not added]
+            if pending:
+                self._loading[user_id] = pending
+            else:
+                del self._loading[user_id]
+
+    def add(self, user_id: int, movie_id: int) -> None:
+        """
+        Update the watched set of a user in memory after they watched a movie.
+
+        Users that are not in memory read their set from the database on their next check.
+        :param user_id: The id of the user.
+        :param movie_id: The id of the watched movie.
+        """
+        with self._lock:
+            cached = self._sets.get(user_id)
+            if cached is not None:
+                cached[1].add(movie_id)
+            for added in self._loading.get(user_id, []):
+                added.append(movie_id)
+
+    def clear(self) -> None:
+        """
+        Drop every set from memory, they are read from the database again on their next check.
+        """
+        with self._lock:
+            self._sets.clear()
+
+    def contains(self, db_session: Session, pairs: Iterable[tuple[int, int]]) -> list[bool]:
+        """
+        Check for many (user, movie) pairs whether the user watched the movie.
+
+        Watches are never removed, so a pair found in memory is certain. A pair that is not found in a set from
+        memory may have been stored by another process, so only those pairs are looked up in the (user, movie)
+        index before answering, and the watches found are added to the sets. A check costs at most two queries,
+        however many users it is for.
+        :param db_session: The database session.
+        :param pairs: The (user id, movie id) pairs.
+        :return: Whether the user watched the movie, for every pair in order.
+        """
+        pairs = list(pairs)
+        sets, loaded = self.get_many(db_session, (user_id for user_id, _ in pairs))
+        unsure = {
+            (user_id, movie_id) for user_id, movie_id in pairs
+            if user_id not in loaded and movie_id not in sets[user_id]
+        }
+        found: set[tuple[int, int]] = set()
+        if unsure:
+            for user_id, movie_id in db_session.execute(
+                select(WatchedMovie.user_id, WatchedMovie.movie_id)
+                .where(tuple_(WatchedMovie.user_id, WatchedMovie.movie_id).in_(unsure))
+            ):
+                found.add((user_id, movie_id))
+                self.add(user_id, movie_id)
+        return [(user_id, movie_id) in found or movie_id in sets[user_id] for user_id, movie_id in pairs]
+
+
+watched_sets = WatchedSets()
+"""The watched sets of this process."""
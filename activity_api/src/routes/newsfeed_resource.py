@@ -1,56 +1,188 @@
 """
 This module contains the API endpoints for the newsfeed resource.
 """
+import base64
+import binascii
+import json
+from datetime import datetime
+
 import requests
 from flask import request
-from flask_jwt_extended import jwt_required
-from flask_restx import Namespace, Api, marshal, Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_restx import Namespace, Api, Resource, fields
+from sqlalchemy import tuple_
 
-from src.database import db, WatchedMovie
-from src.routes.watched_movie_resource import watched_movie_list_model
+from src.database import db, Timeline, TimelineEntry
+from src.database.timeline_worker import TIMELINE_LENGTH, rebuild_timeline, sync_friends, timeline_worker
+from src.routes.watched_movie_resource import watched_movie_model
+from src.serializer import serialize
 
 newsfeed_ns = Namespace("newsfeed", description="Newsfeed operations")
 
+PAGE_SIZE = 20
+"""The number of watched movies on a page of the newsfeed when no limit is given."""
+
+MAX_PAGE_SIZE = 100
+"""The largest number of watched movies on a page of the newsfeed."""
+
+newsfeed_parser = newsfeed_ns.parser()
+newsfeed_parser.add_argument(
+    "limit", type=int, default=PAGE_SIZE,
+    help=f"Number of watched movies to fetch, minimum 1, maximum {MAX_PAGE_SIZE}"
+)
+newsfeed_parser.add_argument(
+    "cursor", type=str, required=False, help="The 'next' cursor of the previous page, to fetch the next page"
+)
+
+newsfeed_page_model = newsfeed_ns.model(
+    "NewsfeedPage",
+    {
+        "results": fields.List(fields.Nested(watched_movie_model), description="The watched movies, newest first"),
+        "next": fields.String(description="Cursor for the next page, null on the last page"),
+    },
+)
+
+
+class FriendsError(Exception):
+    """
+    The user API could not give the friends of the current user.
+    """
+
+    def __init__(self, message: str, status_code: int) -> None:
+        """
+        Initialize a FriendsError.
+        :param message: The message for the client of this service.
+        :param status_code: The status code the user API answered with.
+        """
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def encode_cursor(entry: TimelineEntry) -> str:
+    """
+    Encode the position of a watched movie in the newsfeed as an opaque cursor.
+    :param entry: The last watched movie of a page.
+    :return: The cursor.
+    """
+    position = [entry.watched_at.isoformat(), entry.watched_movie_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Decode a cursor into the (watched at, watched movie id) position it was made from.
+    :param cursor: The cursor.
+    :return: The position of the last watched movie of the previous page.
+    :raises ValueError: If the cursor is not a valid cursor.
+    """
+    try:
+        watched_at, watched_movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        position = datetime.fromisoformat(watched_at), watched_movie_id
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(watched_movie_id, int):
+        raise ValueError("Invalid cursor")
+    return position
+
+
+def fetch_friend_ids() -> list[int]:
+    """
+    Get the friends of the current user from the user API.
+    :return: The ids of the friends.
+    :raises FriendsError: If the user API answers with an error.
+    """
+    response = requests.get(
+        "http://user_api:5000/api/users/friends",
+        cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
+        timeout=5,
+    )
+    if response.status_code != 200:
+        raise FriendsError(f"Failed to fetch friends, error: {response.text}", response.status_code)
+    return [friend["user_id"] for friend in response.json().get("results", [])]
+
+
+def sync_timeline(user_id: int) -> None:
+    """
+    Mirror the friends of the current user and build their timeline. The timelines of the users who became or
+    stopped being their friend are built again by the timeline worker.
+    :param user_id: The id of the current user.
+    :raises FriendsError: If the user API answers with an error.
+    """
+    changed = sync_friends(db.session, user_id, fetch_friend_ids())
+    rebuild_timeline(db.session, user_id)
+    timeline_worker.rebuild_later(db.session, changed)
+    db.session.commit()
+    timeline_worker.wake()
+
 
 @newsfeed_ns.route("/")
 class NewsfeedResource(Resource):
     """
     This resource handles the newsfeed operations.
     """
-    @newsfeed_ns.response(200, "Success", model=watched_movie_list_model)
+    @newsfeed_ns.expect(newsfeed_parser)
+    @newsfeed_ns.response(200, "Success", model=newsfeed_page_model)
+    @newsfeed_ns.response(400, "Bad Request")
     @newsfeed_ns.response(401, "Unauthorized")
     @newsfeed_ns.response(404, "Not Found")
     @newsfeed_ns.response(500, "Internal Server Error")
     @jwt_required()
     def get(self):
         """
-        Get the newsfeed data.
+        Get a page of the newsfeed, the movies the friends watched, newest first.
+
+        The newsfeed is read from the timeline of the user, which holds the TIMELINE_LENGTH most recent movies
+        their friends watched. The timeline is built on the first read, later reads do not call the user API.
+        The next page is fetched by passing the 'next' cursor of a page as cursor.
         """
-        # Get the friends of the user
-        response = requests.get(
-            "http://user_api:5000/api/users/friends",
-            cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
-            timeout=5,
-        )
-        if response.status_code != 200:
-            return {"message": f"Failed to fetch friends, error: {response.text}"}, response.status_code
-
-        # Get the watched movies of the friends
-        friends = response.json().get("results", [])
-        if not friends:
-            return {"results": []}, 200
-        friend_ids = [friend["user_id"] for friend in friends]
-
-        # Query the watched movies of the friends
-        news_feed = db.session.query(WatchedMovie).filter(
-            WatchedMovie.user_id.in_(friend_ids)
-        ).order_by(WatchedMovie.watched_at.desc()).all()
-
-        if not news_feed:
-            return {"results": []}, 200
+        args = newsfeed_parser.parse_args()
+        limit = min(max(args.get("limit") or PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        try:
+            after = decode_cursor(args["cursor"]) if args.get("cursor") else None
+        except ValueError:
+            return {"message": "Invalid cursor."}, 400
+
+        user_id = int(get_jwt_identity())
+        if db.session.get(Timeline, user_id) is None:
+            try:
+                sync_timeline(user_id)
+            except FriendsError as e:
+                return {"message": e.message}, e.status_code
+
+        # Fetch one watched movie extra to know whether there is a next page
+        news_feed = db.session.query(TimelineEntry).filter(TimelineEntry.owner_id == user_id)
+        if after is not None:
+            news_feed = news_feed.filter(tuple_(TimelineEntry.watched_at, TimelineEntry.watched_movie_id) < after)
+        news_feed = news_feed.order_by(
+            TimelineEntry.watched_at.desc(), TimelineEntry.watched_movie_id.desc()
+        ).limit(limit + 1).all()
+        next_cursor = encode_cursor(news_feed[limit - 1]) if len(news_feed) > limit else None
 
         # Return the watched movies of the friends
-        return marshal({"results": news_feed}, watched_movie_list_model), 200
+        return serialize({"results": news_feed[:limit], "next": next_cursor}, newsfeed_page_model), 200
+
+
+@newsfeed_ns.route("/friends")
+class NewsfeedFriendsResource(Resource):
+    """
+    This resource keeps the newsfeeds up to date with the friendships.
+    """
+    @newsfeed_ns.response(200, "Success")
+    @newsfeed_ns.response(401, "Unauthorized")
+    @newsfeed_ns.response(500, "Internal Server Error")
+    @jwt_required()
+    def post(self):
+        """
+        Let the newsfeeds know the friends of the current user changed, called by the user API.
+
+        The friends are fetched from the user API, so only the actual friendships end up in the newsfeeds.
+        """
+        try:
+            sync_timeline(int(get_jwt_identity()))
+        except FriendsError as e:
+            return {"message": e.message}, e.status_code
+        return {"message": f"Newsfeed rebuilt with the {TIMELINE_LENGTH} most recent watched movies."}, 200
 
 
 def register_routes(api_blueprint: Api) -> None:
@@ -3,11 +3,18 @@ This keeps track of the watched movies for each user.
 """
 
 from datetime import datetime
-from flask_restx import Namespace, Resource, fields, Api, marshal
+from flask import make_response, request
+from flask_restx import Namespace, Resource, fields, Api
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import distinct, exists, func
+from sqlalchemy.orm import aliased
 
 from src.database import db
 from src.database.models.watched_movie import WatchedMovie
+from src.database.timeline_worker import timeline_worker
+from src.database.watch_writer import WatchWriteError, watch_writer
+from src.database.watched_sets import watched_sets
+from src.serializer import serialize
 
 watched_movie_api = Namespace("watched", description="Watched movie related operations")
 
@@ -45,6 +52,65 @@ watched_users_parser.add_argument(
     "since_timestamp", type=str, required=False, help="The timestamp to filter watched movies since."
 )
 
+watched_counts_parser = watched_movie_api.parser()
+watched_counts_parser.add_argument(
+    "user_id", type=int, required=True, help="The ID of a user whose watched movies are counted.", action="append"
+)
+watched_counts_parser.add_argument(
+    "exclude_user", type=int, required=False, help="The ID of a user whose watched movies are left out."
+)
+watched_counts_parser.add_argument(
+    "since_timestamp", type=str, required=False, help="The timestamp to count watched movies since."
+)
+watched_counts_parser.add_argument(
+    "top_n", type=int, required=False, help="The number of most watched movies to return, minimum 1."
+)
+
+watched_count_model = watched_movie_api.model(
+    "WatchedCount",
+    {
+        "movie_id": fields.Integer(description="The ID of the movie."),
+        "count": fields.Integer(description="The number of the given users who watched the movie."),
+    },
+)
+
+watched_count_list_model = watched_movie_api.model(
+    "WatchedCountList",
+    {
+        "results": fields.List(
+            fields.Nested(watched_count_model), description="The watched movies, the most watched first"
+        ),
+    },
+)
+
+MAX_MEMBERSHIP_PAIRS = 10000
+"""The largest number of (user, movie) pairs checked in one membership request."""
+
+watched_pair_model = watched_movie_api.model(
+    "WatchedPair",
+    {
+        "user_id": fields.Integer(required=True, description="The ID of the user."),
+        "movie_id": fields.Integer(required=True, description="The ID of the movie."),
+    },
+)
+
+watched_membership_model = watched_movie_api.model(
+    "WatchedMembership",
+    {
+        "pairs": fields.List(
+            fields.Nested(watched_pair_model), required=True,
+            description=f"The (user, movie) pairs to check, at most {MAX_MEMBERSHIP_PAIRS}"
+        ),
+    },
+)
+
+watched_membership_result_model = watched_movie_api.model(
+    "WatchedMembershipResult",
+    {
+        "results": fields.List(fields.Boolean, description="Whether the user watched the movie, for every pair"),
+    },
+)
+
 
 @watched_movie_api.route("/<int:movie_id>")
 class WatchedMovieResource(Resource):
@@ -55,22 +121,40 @@ class WatchedMovieResource(Resource):
     @watched_movie_api.response(200, "Success")
     @watched_movie_api.response(400, "Bad Request")
     @watched_movie_api.response(401, "Unauthorized")
+    @watched_movie_api.response(503, "The watched movie was not stored in time")
     @jwt_required()
     def post(self, movie_id):
         """
         Mark a movie as watched by the user.
+
+        In group commit mode the watch is stored together with those of other requests, the response waits until
+        that has been committed, and the writer passes it on to the newsfeeds and the watched sets.
         """
         user_id = int(get_jwt_identity())
 
+        if watch_writer.running:
+            try:
+                watch_writer.record(user_id, movie_id)
+            except TimeoutError:
+                return {"message": "The watched movie could not be stored in time, try again later."}, 503
+            except WatchWriteError:
+                return {"message": "The watched movie could not be stored, try again later."}, 503
+            return {"message": "Movie marked as watched"}, 200
+
         watched_movie = WatchedMovie(
             user_id=user_id,
             movie_id=movie_id,
         )
 
-        # Save the watched movie to the database
+        # Save the watched movie to the database, with the job that copies it into the newsfeeds of the friends
         db.session.add(watched_movie)
+        db.session.flush()
+        timeline_worker.fan_out_later(db.session, [watched_movie.watched_movie_id])
         db.session.commit()
 
+        timeline_worker.wake()
+        watched_sets.add(user_id, movie_id)
+
         return {"message": "Movie marked as watched"}, 200
 
     @watched_movie_api.doc(params={"movie_id": "The ID of the movie to check if it's watched."})
@@ -81,7 +165,7 @@ class WatchedMovieResource(Resource):
         Get the watched status of a movie. This is whether the movie is in the watched list or not.
         """
         user_id = int(get_jwt_identity())
-        if db.session.query(WatchedMovie).filter_by(user_id=user_id, movie_id=movie_id).first():
+        if watched_sets.contains(db.session, [(user_id, movie_id)])[0]:
             return {"message": "Movie is watched."}
         return {"message": "Movie is not in the watched list."}
 
@@ -112,7 +196,103 @@ class WatchedMoviesResource(Resource):
                 WatchedMovie.watched_at >= datetime.fromisoformat(data["since_timestamp"])
             )
         watched_movies = watched_movies.all()
-        return marshal({"results": watched_movies}, watched_movie_list_model), 200
+        return serialize({"results": watched_movies}, watched_movie_list_model), 200
+
+
+@watched_movie_api.route("/counts")
+class WatchedCountsResource(Resource):
+    """
+    Resource for counting how many of a group of users watched every movie.
+    """
+
+    @watched_movie_api.expect(watched_counts_parser)
+    @watched_movie_api.response(200, "Success", model=watched_count_list_model)
+    @watched_movie_api.response(400, "Bad Request")
+    @watched_movie_api.response(401, "Unauthorized")
+    @jwt_required()
+    def get(self):
+        """
+        Get the number of the given users who watched every movie, the most watched first and ties by movie id.
+
+        The counting is done in the database, so only one row per movie is sent instead of every watch.
+        Movies the exclude_user watched are left out, only watches since since_timestamp are counted and
+        at most top_n movies are returned.
+        """
+        data = watched_counts_parser.parse_args()
+        if data.get("top_n") is not None and data["top_n"] < 1:
+            return {"message": "top_n must be at least 1."}, 400
+        try:
+            since = datetime.fromisoformat(data["since_timestamp"]) if data.get("since_timestamp") else None
+        except ValueError:
+            return {"message": "since_timestamp must be an ISO 8601 timestamp."}, 400
+
+        user_count = func.count(distinct(WatchedMovie.user_id))  # pylint: disable=not-callable
+        counts = db.session.query(WatchedMovie.movie_id, user_count).filter(
+            WatchedMovie.user_id.in_(data["user_id"])
+        )
+        if since is not None:
+            counts = counts.filter(WatchedMovie.watched_at >= since)
+        if data.get("exclude_user") is not None:
+            excluded = aliased(WatchedMovie)
+            counts = counts.filter(~exists().where(
+                excluded.user_id == data["exclude_user"], excluded.movie_id == WatchedMovie.movie_id
+            ))
+        counts = counts.group_by(WatchedMovie.movie_id).order_by(user_count.desc(), WatchedMovie.movie_id)
+        if data.get("top_n") is not None:
+            counts = counts.limit(data["top_n"])
+        counts = counts.all()
+        return {"results": [{"movie_id": movie_id, "count": count} for movie_id, count in counts]}, 200
+
+
+@watched_movie_api.route("/membership")
+class WatchedMembershipResource(Resource):
+    """
+    Resource for checking whether users watched movies, many at a time.
+    """
+
+    @watched_movie_api.expect(watched_membership_model)
+    @watched_movie_api.response(200, "Success", model=watched_membership_result_model)
+    @watched_movie_api.response(400, "Bad Request")
+    @watched_movie_api.response(401, "Unauthorized")
+    @jwt_required()
+    def post(self):
+        """
+        Check for every (user, movie) pair whether the user watched the movie.
+
+        The answers come from the watched sets in memory, the database is only read for users not in memory and
+        for the users of pairs that were not found, whose watches may have been stored by another instance.
+        """
+        pairs = (request.get_json(silent=True) or {}).get("pairs")
+        if not isinstance(pairs, list) or len(pairs) > MAX_MEMBERSHIP_PAIRS:
+            return {"message": f"pairs must be a list of at most {MAX_MEMBERSHIP_PAIRS} pairs."}, 400
+        try:
+            checked = [(pair["user_id"], pair["movie_id"]) for pair in pairs]
+        except (KeyError, TypeError):
+            return {"message": "Every pair needs a user_id and a movie_id."}, 400
+        if not all(isinstance(user_id, int) and isinstance(movie_id, int) for user_id, movie_id in checked):
+            return {"message": "Every pair needs a user_id and a movie_id."}, 400
+        return {"results": watched_sets.contains(db.session, checked)}, 200
+
+
+@watched_movie_api.route("/bitmap/<int:user_id>")
+class WatchedBitmapResource(Resource):
+    """
+    Resource for getting all the movies a user watched as a bitmap.
+    """
+
+    @watched_movie_api.response(200, "The bitmap, bit i of byte i // 8 is set if the user watched movie i")
+    @watched_movie_api.response(401, "Unauthorized")
+    @watched_movie_api.produces(["application/octet-stream"])
+    @jwt_required()
+    def get(self, user_id):
+        """
+        Get the movies a user watched as a little-endian bitmap, as long as needed for the largest movie id.
+        """
+        watched_set = watched_sets.get(db.session, user_id)
+        response = make_response(watched_set.to_bytes())
+        response.mimetype = "application/octet-stream"
+        response.headers["X-Watched-Count"] = str(len(watched_set))
+        return response
 
 
 def register_routes(api_blueprint: Api) -> None:
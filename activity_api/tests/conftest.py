@@ -14,6 +14,7 @@ from flask_jwt_extended import create_access_token, get_csrf_token
 from src.config import APIConfig, LoggingConfig, DBConfig, LogLevel
 from src.app import create_app
 from src.database import db
+from src.database.watched_sets import watched_sets
 
 test_db = factories.postgresql_proc(port=None, dbname="test_db")
 
@@ -67,6 +68,7 @@ def db_session(app):  # pylint: disable=unused-argument
         yield db.session
         db.session.rollback()
         transaction.rollback()
+        watched_sets.clear()
 
         connection.execute(text("SET session_replication_role = 'replica';"))
 
@@ -0,0 +1,170 @@
+"""
+Test cases for the fan-out-on-write timelines of the newsfeed.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.database import Friendship, Timeline, TimelineEntry, TimelineJob, WatchedMovie
+from src.database.timeline_worker import TimelineWorker, fan_out, rebuild_timeline, sync_friends
+
+
+def timeline(db_session, owner_id: int) -> list[int]:
+    """
+    Get the movie ids in the timeline of a user, newest first.
+    """
+    return [
+        entry.movie_id for entry in db_session.query(TimelineEntry).filter_by(owner_id=owner_id).order_by(
+            TimelineEntry.watched_at.desc(), TimelineEntry.watched_movie_id.desc()
+        )
+    ]
+
+
+def test_sync_friends(db_session):
+    """
+    Test mirroring the friends of a user in both directions.
+    """
+    assert sync_friends(db_session, 1, [2, 3]) == {2, 3}
+    assert sync_friends(db_session, 1, [3, 4]) == {2, 4}
+    assert sync_friends(db_session, 1, [3, 4]) == set()
+
+    friendships = {(friendship.user_id, friendship.friend_id) for friendship in db_session.query(Friendship)}
+    assert friendships == {(1, 3), (3, 1), (1, 4), (4, 1)}
+
+
+def test_fan_out_to_friend_timelines(db_session):
+    """
+    Test copying new watches into the timelines of the friends that have one, in one batch.
+    """
+    sync_friends(db_session, 1, [2, 3])
+    rebuild_timeline(db_session, 1)
+    db_session.commit()
+    worker = TimelineWorker()
+
+    now = datetime.now()
+    watches = [
+        WatchedMovie(user_id=2, movie_id=10, watched_at=now - timedelta(minutes=1)),
+        WatchedMovie(user_id=3, movie_id=11, watched_at=now),
+        WatchedMovie(user_id=4, movie_id=12, watched_at=now),
+        WatchedMovie(user_id=1, movie_id=13, watched_at=now),
+    ]
+    db_session.add_all(watches)
+    db_session.commit()
+    worker.fan_out_later(db_session, [watch.watched_movie_id for watch in watches])
+    db_session.commit()
+
+    assert worker.run_pending(db_session) == 4
+    assert timeline(db_session, 1) == [11, 10]
+    # Users 2 and 3 have no timeline yet, theirs is built when they first read it
+    assert timeline(db_session, 2) == []
+    assert worker.run_pending(db_session) == 0
+
+
+def test_timelines_are_trimmed(db_session):
+    """
+    Test keeping only the most recent watches in a timeline, when built and after a fan-out.
+    """
+    now = datetime.now()
+    for minutes in range(3):
+        db_session.add(WatchedMovie(user_id=2, movie_id=minutes, watched_at=now - timedelta(minutes=minutes)))
+    sync_friends(db_session, 1, [2])
+    db_session.commit()
+    worker = TimelineWorker()
+
+    with patch("src.database.timeline_worker.TIMELINE_LENGTH", 2):
+        rebuild_timeline(db_session, 1)
+        assert timeline(db_session, 1) == [0, 1]
+
+        watch = WatchedMovie(user_id=2, movie_id=5, watched_at=now + timedelta(minutes=1))
+        db_session.add(watch)
+        db_session.commit()
+        worker.fan_out_later(db_session, [watch.watched_movie_id])
+        db_session.commit()
+        worker.run_pending(db_session)
+
+    assert timeline(db_session, 1) == [5, 0]
+
+
+def test_rebuild_after_friendship_change(db_session):
+    """
+    Test building the timelines that exist again after the friendships of their users changed.
+    """
+    db_session.add(WatchedMovie(user_id=3, movie_id=20))
+    sync_friends(db_session, 1, [2])
+    rebuild_timeline(db_session, 1)
+    db_session.commit()
+    assert timeline(db_session, 1) == []
+
+    worker = TimelineWorker()
+    worker.rebuild_later(db_session, sync_friends(db_session, 3, [1]) | {3})
+    db_session.commit()
+    worker.run_pending(db_session)
+
+    assert timeline(db_session, 1) == [20]
+    assert timeline(db_session, 3) == []
+
+
+
+def test_failed_fan_out_is_retried(db_session):
+    """
+    Test that a fan-out that fails once, like on a dropped connection, is retried instead of lost.
+    """
+    sync_friends(db_session, 1, [2])
+    rebuild_timeline(db_session, 1)
+    watch = WatchedMovie(user_id=2, movie_id=10)
+    db_session.add(watch)
+    db_session.commit()
+    worker = TimelineWorker()
+    worker.fan_out_later(db_session, [watch.watched_movie_id])
+    db_session.commit()
+    failures = [RuntimeError("connection lost")]
+
+    def flaky_fan_out(session, watched_movie_ids):
+        if failures:
+            raise failures.pop()
+        fan_out(session, watched_movie_ids)
+
+    with patch("src.database.timeline_worker.fan_out", flaky_fan_out):
+        assert worker.run_pending(db_session, retry_delay=0) == 1
+
+    assert timeline(db_session, 1) == [10]
+
+
+def test_failing_jobs_drop_their_timelines(db_session):
+    """
+    Test that the timelines of jobs that keep failing are dropped, so they are built again when read.
+    """
+    sync_friends(db_session, 1, [2])
+    sync_friends(db_session, 3, [4])
+    for user_id in (1, 3, 4):
+        rebuild_timeline(db_session, user_id)
+    watch = WatchedMovie(user_id=2, movie_id=10)
+    db_session.add(watch)
+    db_session.commit()
+    worker = TimelineWorker()
+    worker.fan_out_later(db_session, [watch.watched_movie_id])
+    worker.rebuild_later(db_session, [3])
+    db_session.commit()
+
+    with patch("src.database.timeline_worker.fan_out", side_effect=RuntimeError("bad batch")):
+        assert worker.run_pending(db_session, retry_delay=0) == 2
+
+    assert {timeline_row.user_id for timeline_row in db_session.query(Timeline)} == {4}
+    assert worker.run_pending(db_session) == 0
+
+
+def test_stored_jobs_outlive_the_worker(db_session):
+    """
+    Test that jobs are stored with the watch, so a worker started later, like after a restart, still runs them.
+    """
+    sync_friends(db_session, 1, [2])
+    rebuild_timeline(db_session, 1)
+    watch = WatchedMovie(user_id=2, movie_id=10)
+    db_session.add(watch)
+    db_session.flush()
+    TimelineWorker().fan_out_later(db_session, [watch.watched_movie_id])
+    db_session.commit()
+
+    assert db_session.query(TimelineJob).count() == 1
+    assert TimelineWorker().run_pending(db_session) == 1
+    assert timeline(db_session, 1) == [10]
+    assert db_session.query(TimelineJob).count() == 0
@@ -0,0 +1,71 @@
+"""
+Test cases for the group commit of the watched movies.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from src.database import WatchedMovie
+from src.database.timeline_worker import TimelineWorker
+from src.database.watch_writer import PendingWatch, WatchWriter
+from src.database.watched_sets import WatchedSets
+
+
+def test_record_concurrent_watches_in_batches(app, db_session):
+    """
+    Test that concurrent watches are committed together and every request gets the id of its own watch.
+    """
+    writer = WatchWriter(window=0.05, max_rows=8)
+    writer.start(app)
+    try:
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            watched_movie_ids = list(executor.map(lambda movie_id: writer.record(1, movie_id), range(20)))
+    finally:
+        writer.stop()
+
+    assert not writer.running
+    assert len(set(watched_movie_ids)) == 20
+    assert 3 <= writer.batches < 20
+    stored = {watch.watched_movie_id: watch.movie_id for watch in db_session.query(WatchedMovie)}
+    assert [stored[watched_movie_id] for watched_movie_id in watched_movie_ids] == list(range(20))
+
+
+def test_failed_batch_is_reported_to_every_request(db_session):
+    """
+    Test that the error of a batch that could not be stored reaches all the requests waiting on it.
+    """
+    session = MagicMock()
+    session.scalars.side_effect = RuntimeError("database is down")
+    batch = [PendingWatch(1, movie_id, None) for movie_id in range(3)]
+
+    WatchWriter().write(session, batch)
+
+    session.rollback.assert_called_once()
+    assert all(watch.done.is_set() and isinstance(watch.error, RuntimeError) for watch in batch)
+    assert db_session.query(WatchedMovie).count() == 0
+
+
+def test_record_times_out_without_writer():
+    """
+    Test that a request does not wait forever when no writer commits its watch.
+    """
+    with pytest.raises(TimeoutError):
+        WatchWriter().record(1, 1, timeout=0.01)
+
+
+def test_committed_batch_reaches_newsfeeds_and_watched_sets(db_session):
+    """
+    Test that the writer passes committed watches on itself, so a request that stopped waiting does not lose them.
+    """
+    worker, sets = TimelineWorker(), WatchedSets()
+    sets.get(db_session, 1)
+    batch = [PendingWatch(1, movie_id, datetime.now()) for movie_id in (5, 6)]
+
+    with patch("src.database.watch_writer.timeline_worker", worker), \
+            patch("src.database.watch_writer.watched_sets", sets):
+        WatchWriter().write(db_session, batch)
+
+    assert 5 in sets.get(db_session, 1) and 6 in sets.get(db_session, 1)
+    assert worker.run_pending(db_session) == 2
@@ -0,0 +1,91 @@
+"""
+Test cases for the compact watched sets.
+"""
+from unittest.mock import patch
+
+from src.database import WatchedMovie
+from src.database.watched_sets import ARRAY_LIMIT, WatchedSet, WatchedSets
+
+
+def test_watched_set_membership():
+    """
+    Test adding, checking and listing movie ids, across containers.
+    """
+    watched_set = WatchedSet([5, 3, 70000, 3])
+    watched_set.add(1)
+    watched_set.add(5)
+
+    assert len(watched_set) == 4
+    assert list(watched_set) == [1, 3, 5, 70000]
+    assert 3 in watched_set and 70000 in watched_set
+    assert 4 not in watched_set and 4464 not in watched_set and -1 not in watched_set and "3" not in watched_set
+
+
+def test_watched_set_turns_into_bitmap():
+    """
+    Test that a container with many entries becomes a bitmap, with the same contents.
+    """
+    movie_ids = list(range(1, 2 * ARRAY_LIMIT + 2, 2))
+    watched_set = WatchedSet(movie_ids)
+
+    assert isinstance(watched_set._containers[0], int)  # pylint: disable=protected-access
+    assert list(watched_set) == movie_ids
+    assert 3 in watched_set and 4 not in watched_set
+    watched_set.add(4)
+    assert 4 in watched_set and len(watched_set) == len(movie_ids) + 1
+
+
+def test_watched_set_to_bytes():
+    """
+    Test the little-endian bitmap encoding.
+    """
+    assert WatchedSet().to_bytes() == b""
+    assert WatchedSet([0, 9]).to_bytes() == bytes([0b00000001, 0b00000010])
+    encoded = WatchedSet(range(1, 2 * ARRAY_LIMIT + 2, 2)).to_bytes()
+    assert int.from_bytes(encoded, "little") == sum(1 << movie_id for movie_id in range(1, 2 * ARRAY_LIMIT + 2, 2))
+
+
+def test_watched_sets_load_and_update(db_session):
+    """
+    Test reading the sets from the database once and updating them on write.
+    """
+    db_session.add_all([WatchedMovie(user_id=1, movie_id=10), WatchedMovie(user_id=2, movie_id=11)])
+    db_session.commit()
+    sets = WatchedSets(max_users=1)
+
+    assert sets.contains(db_session, [(1, 10), (1, 11), (2, 11)]) == [True, False, True]
+
+    db_session.add(WatchedMovie(user_id=2, movie_id=12))
+    db_session.commit()
+    sets.add(2, 12)
+    sets.add(1, 13)
+    assert 12 in sets.get(db_session, 2)
+    # User 1 was dropped from memory and is read again
+    assert list(sets.get(db_session, 1)) == [10]
+
+
+def test_watched_sets_check_misses_in_the_database(db_session):
+    """
+    Test that many users are read with one query, and that a miss is looked up in the database, as the watch
+    may have been stored by another process.
+    """
+    db_session.add_all([WatchedMovie(user_id=user_id, movie_id=10) for user_id in range(1, 51)])
+    db_session.commit()
+    sets = WatchedSets()
+
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        assert sets.contains(db_session, [(user_id, 10) for user_id in range(1, 51)]) == [True] * 50
+    assert execute.call_count == 1
+
+    # Stored by another process, so not added to the sets of this one
+    db_session.add(WatchedMovie(user_id=1, movie_id=11))
+    db_session.commit()
+
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        assert sets.contains(db_session, [(1, 10), (2, 10)]) == [True, True]
+    execute.assert_not_called()
+    with patch.object(db_session, "execute", wraps=db_session.execute) as execute:
+        assert sets.contains(db_session, [(1, 11), (2, 11)]) == [True, False]
+        # Only the missed pairs are looked up, the sets in memory are kept
+        assert 11 in sets.get(db_session, 1)
+    assert execute.call_count == 1
@@ -1,33 +1,63 @@
 """
 This code is a test suite for the newsfeed resource API endpoints.
 """
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
+from src.database import Friendship, Timeline, WatchedMovie
+from src.database.timeline_worker import TimelineWorker
+
 
 @patch("src.routes.newsfeed_resource.requests.get")
-@patch("src.routes.newsfeed_resource.db.session.query")
-def test_get_newsfeed_success(mock_query, mock_requests, client):
+def test_get_newsfeed_success(mock_requests, client, db_session):
     """
-    Test the successful retrieval of the newsfeed.
+    Test the successful retrieval of the newsfeed, the watched movies of the friends newest first.
     """
     # Mock the user service response
     mock_requests.return_value = MagicMock(
         status_code=200,
         json=lambda: {"results": [{"user_id": 2}, {"user_id": 3}]}
     )
-
-    # Mock database query
-    mock_result = MagicMock()
-    mock_result.user_id = 2
-    mock_result.movie_id = 1
-    mock_result.watched_at = "2024-01-01T12:00:00"
-    mock_query.return_value.filter.return_value.order_by.return_value.all.return_value = [mock_result]
+    now = datetime.now()
+    db_session.add(WatchedMovie(user_id=2, movie_id=1, watched_at=now - timedelta(hours=2)))
+    db_session.add(WatchedMovie(user_id=3, movie_id=2, watched_at=now - timedelta(hours=1)))
+    db_session.add(WatchedMovie(user_id=4, movie_id=3, watched_at=now))
+    db_session.commit()
 
     response = client.get("/api/activity/newsfeed/")
 
     assert response.status_code == 200
-    assert "results" in response.json
-    assert isinstance(response.json["results"], list)
+    assert [entry["movie_id"] for entry in response.json["results"]] == [2, 1]
+    assert response.json["next"] is None
+
+
+@patch("src.routes.newsfeed_resource.requests.get")
+def test_get_newsfeed_pages(mock_requests, client, db_session):
+    """
+    Test following the next cursors through the newsfeed, with ties on the watch time.
+    """
+    mock_requests.return_value = MagicMock(
+        status_code=200,
+        json=lambda: {"results": [{"user_id": 2}, {"user_id": 3}]}
+    )
+    now = datetime.now()
+    for movie_id in range(1, 8):
+        db_session.add(WatchedMovie(
+            user_id=2 + movie_id % 2, movie_id=movie_id, watched_at=now - timedelta(minutes=movie_id // 2)
+        ))
+    db_session.commit()
+
+    movie_ids, cursor = [], None
+    for _ in range(3):
+        query = {"limit": 3} if cursor is None else {"limit": 3, "cursor": cursor}
+        response = client.get("/api/activity/newsfeed/", query_string=query)
+        assert response.status_code == 200
+        movie_ids.extend(entry["movie_id"] for entry in response.json["results"])
+        cursor = response.json["next"]
+
+    assert movie_ids == [1, 3, 2, 5, 4, 7, 6]
+    assert cursor is None
+    assert client.get("/api/activity/newsfeed/", query_string={"cursor": "not a cursor"}).status_code == 400
 
 
 @patch("src.routes.newsfeed_resource.requests.get")
@@ -54,20 +84,61 @@ def test_get_newsfeed_no_friends(mock_requests, client):
     response = client.get("/api/activity/newsfeed/")
 
     assert response.status_code == 200
-    assert response.json == {"results": []}
+    assert response.json == {"results": [], "next": None}
 
 
 @patch("src.routes.newsfeed_resource.requests.get")
-@patch("src.routes.newsfeed_resource.db.session.query")
-def test_get_newsfeed_no_movies(mock_query, mock_requests, client):
+def test_get_newsfeed_no_movies(mock_requests, client):
     mock_requests.return_value = MagicMock(
         status_code=200,
         json=lambda: {"results": [{"user_id": 2, "watched_at": "2024-01-01T12:00:00", "movie_id": 1}]}
     )
 
-    mock_query.return_value.filter.return_value.order_by.return_value.all.return_value = []
+    response = client.get("/api/activity/newsfeed/")
+
+    assert response.status_code == 200
+    assert response.json == {"results": [], "next": None}
+
+
+@patch("src.routes.newsfeed_resource.requests.get")
+def test_get_newsfeed_from_timeline(mock_requests, client, db_session):
+    """
+    Test that only the first read asks the user API for the friends, later reads use the timeline.
+    """
+    mock_requests.return_value = MagicMock(status_code=200, json=lambda: {"results": [{"user_id": 2}]})
+    assert client.get("/api/activity/newsfeed/").json == {"results": [], "next": None}
+    assert db_session.get(Timeline, 1) is not None
+
+    worker = TimelineWorker()
+    watch = WatchedMovie(user_id=2, movie_id=7)
+    db_session.add(watch)
+    db_session.flush()
+    worker.fan_out_later(db_session, [watch.watched_movie_id])
+    db_session.commit()
+    worker.run_pending(db_session)
 
     response = client.get("/api/activity/newsfeed/")
 
     assert response.status_code == 200
-    assert response.json == {"results": []}
+    assert [entry["movie_id"] for entry in response.json["results"]] == [7]
+    assert mock_requests.call_count == 1
+
+
+@patch("src.routes.newsfeed_resource.requests.get")
+def test_post_newsfeed_friends(mock_requests, client, db_session):
+    """
+    Test rebuilding the newsfeed when the friends of the user change.
+    """
+    worker = TimelineWorker()
+    db_session.add(WatchedMovie(user_id=3, movie_id=8))
+    db_session.commit()
+    mock_requests.return_value = MagicMock(status_code=200, json=lambda: {"results": [{"user_id": 3}]})
+
+    with patch("src.routes.newsfeed_resource.timeline_worker", worker):
+        response = client.post("/api/activity/newsfeed/friends", headers={"X-CSRF-Token": client.csrf_token})
+
+    assert response.status_code == 200
+    assert [entry["movie_id"] for entry in client.get("/api/activity/newsfeed/").json["results"]] == [8]
+    assert db_session.get(Friendship, (3, 1)) is not None
+    # The timeline of the new friend is built again by the worker
+    assert worker.run_pending(db_session) == 1
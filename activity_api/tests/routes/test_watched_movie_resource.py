@@ -2,8 +2,13 @@
 This file contains the test cases for the WatchedMovieResource class.
 """
 from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
 
 from src.database import WatchedMovie
+from src.database.timeline_worker import TimelineWorker
+from src.database.watch_writer import WatchWriteError, WatchWriter
 
 
 def test_mark_movie_as_watched(client, db_session):
@@ -13,7 +18,9 @@ def test_mark_movie_as_watched(client, db_session):
     headers = {
         "X-CSRF-Token": client.csrf_token,
     }
-    response = client.post("/api/activity/watched/42", headers=headers)
+    worker = TimelineWorker()
+    with patch("src.routes.watched_movie_resource.timeline_worker", worker):
+        response = client.post("/api/activity/watched/42", headers=headers)
 
     assert response.status_code == 200
     data = response.get_json()
@@ -21,6 +28,40 @@ def test_mark_movie_as_watched(client, db_session):
 
     watched = db_session.query(WatchedMovie).filter_by(movie_id=42).first()
     assert watched is not None
+    # The watch is fanned out to the newsfeeds of the friends in the background
+    assert worker.run_pending(db_session) == 1
+
+
+def test_mark_movie_as_watched_group_commit(app, client, db_session):
+    """
+    Test marking a movie as watched when the watches are committed in groups.
+    """
+    writer, worker = WatchWriter(), TimelineWorker()
+    writer.start(app)
+    try:
+        with patch("src.routes.watched_movie_resource.watch_writer", writer), \
+                patch("src.database.watch_writer.timeline_worker", worker):
+            response = client.post("/api/activity/watched/43", headers={"X-CSRF-Token": client.csrf_token})
+    finally:
+        writer.stop()
+
+    assert response.status_code == 200
+    assert writer.batches == 1
+    assert db_session.query(WatchedMovie).filter_by(user_id=1, movie_id=43).count() == 1
+    assert worker.run_pending(db_session) == 1
+
+
+@pytest.mark.parametrize("error", [WatchWriteError("The watched movie could not be stored"), TimeoutError()])
+def test_mark_movie_as_watched_group_commit_failure(client, db_session, error):  # pylint: disable=unused-argument
+    """
+    Test that a watch whose batch failed or did not commit in time answers 503 instead of an error.
+    """
+    writer = Mock(running=True)
+    writer.record.side_effect = error
+    with patch("src.routes.watched_movie_resource.watch_writer", writer):
+        response = client.post("/api/activity/watched/44", headers={"X-CSRF-Token": client.csrf_token})
+
+    assert response.status_code == 503
 
 
 def test_get_watched_movies(client, db_session):
@@ -103,3 +144,81 @@ def test_movie_is_not_watched(client):
     assert response.status_code == 200
     data = response.get_json()
     assert data["message"] == "Movie is not in the watched list."
+
+
+def test_get_watched_counts(client, db_session):
+    """
+    Test counting how many of the given users watched every movie.
+    """
+    for user_id, movie_id in [(2, 10), (2, 10), (3, 10), (3, 11), (4, 12), (5, 11)]:
+        db_session.add(WatchedMovie(user_id=user_id, movie_id=movie_id))
+    db_session.commit()
+
+    response = client.get("/api/activity/watched/counts", query_string={"user_id": [2, 3, 5]})
+
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [{"movie_id": 10, "count": 2}, {"movie_id": 11, "count": 2}]
+    assert client.get("/api/activity/watched/counts").status_code == 400
+
+
+def test_get_watched_counts_filters(client, db_session):
+    """
+    Test leaving out the movies of a user, counting only recent watches and limiting the number of movies.
+    """
+    old = datetime.now() - timedelta(days=30)
+    for user_id, movie_id, watched_at in [
+        (2, 10, datetime.now()), (3, 10, datetime.now()), (2, 11, datetime.now()), (3, 11, old),
+        (2, 12, datetime.now()), (1, 12, old), (3, 13, datetime.now()),
+    ]:
+        db_session.add(WatchedMovie(user_id=user_id, movie_id=movie_id, watched_at=watched_at))
+    db_session.commit()
+
+    response = client.get("/api/activity/watched/counts", query_string={
+        "user_id": [2, 3], "exclude_user": 1, "since_timestamp": (old + timedelta(days=1)).isoformat(), "top_n": 2
+    })
+
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [{"movie_id": 10, "count": 2}, {"movie_id": 11, "count": 1}]
+    assert client.get("/api/activity/watched/counts", query_string={"user_id": 2, "top_n": 0}).status_code == 400
+    assert client.get(
+        "/api/activity/watched/counts", query_string={"user_id": 2, "since_timestamp": "yesterday"}
+    ).status_code == 400
+
+
+def test_post_watched_membership(client, db_session):
+    """
+    Test checking many (user, movie) pairs at once, including a watch stored after the sets were read.
+    """
+    db_session.add_all([WatchedMovie(user_id=1, movie_id=10), WatchedMovie(user_id=2, movie_id=11)])
+    db_session.commit()
+    headers = {"X-CSRF-Token": client.csrf_token}
+    pairs = [{"user_id": 1, "movie_id": 10}, {"user_id": 1, "movie_id": 11}, {"user_id": 2, "movie_id": 11}]
+
+    response = client.post("/api/activity/watched/membership", json={"pairs": pairs}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json() == {"results": [True, False, True]}
+
+    with patch("src.routes.watched_movie_resource.timeline_worker", TimelineWorker()):
+        client.post("/api/activity/watched/11", headers=headers)
+    response = client.post("/api/activity/watched/membership", json={"pairs": pairs[1:2]}, headers=headers)
+    assert response.get_json() == {"results": [True]}
+
+    assert client.post(
+        "/api/activity/watched/membership", json={"pairs": [{"user_id": 1}]}, headers=headers
+    ).status_code == 400
+    assert client.post("/api/activity/watched/membership", json={}, headers=headers).status_code == 400
+
+
+def test_get_watched_bitmap(client, db_session):
+    """
+    Test getting the movies a user watched as a binary bitmap.
+    """
+    db_session.add_all([WatchedMovie(user_id=2, movie_id=1), WatchedMovie(user_id=2, movie_id=10)])
+    db_session.commit()
+
+    response = client.get("/api/activity/watched/bitmap/2")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/octet-stream"
+    assert response.headers["X-Watched-Count"] == "2"
+    assert int.from_bytes(response.data, "little") == (1 << 1) | (1 << 10)
@@ -0,0 +1,59 @@
+"""catalog_version
+
+Revision ID: 3f6b0d9a2c84
+Revises: e7a90f3c5d21
+Create Date: 2026-10-17 14:02:51.604318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6b0d9a2c84'
+down_revision: Union[str, None] = 'e7a90f3c5d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_COLUMNS = {
+    'movies': 'movie_id, movie_name, rating, runtime, meta_score, plot',
+    'genres': 'genre_id, genre_name',
+    'has_genre': 'movie_id, genre_id',
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        'catalog_version',
+        sa.Column('catalog_version_id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('catalog_version_id')
+    )
+    op.execute("INSERT INTO catalog_version (catalog_version_id, version) VALUES (1, 0)")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE catalog_version SET version = version + 1;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, columns in VERSIONED_COLUMNS.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_catalog_version
+            AFTER INSERT OR UPDATE OF {columns} OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()
+            """
+        )
+
+
+def downgrade() -> None:
+    for table in VERSIONED_COLUMNS:
+        op.execute(f"DROP TRIGGER {table}_catalog_version ON {table}")
+    op.execute("DROP FUNCTION bump_catalog_version()")
+    op.drop_table('catalog_version')
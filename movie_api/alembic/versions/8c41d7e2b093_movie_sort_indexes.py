@@ -0,0 +1,33 @@
+"""movie_sort_indexes
+
+Revision ID: 8c41d7e2b093
+Revises: 5b2e8c1f9a47
+Create Date: 2026-10-17 11:03:54.716208
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41d7e2b093'
+down_revision: Union[str, None] = '5b2e8c1f9a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_movies_rating_movie_id', 'movies',
+                    [sa.text('rating DESC NULLS LAST'), sa.text('movie_id DESC')], unique=False)
+    op.create_index('ix_movies_meta_score_movie_id', 'movies',
+                    [sa.text('meta_score DESC NULLS LAST'), sa.text('movie_id DESC')], unique=False)
+    op.create_index('ix_movies_runtime_movie_id', 'movies',
+                    [sa.text('runtime DESC NULLS LAST'), sa.text('movie_id DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movies_runtime_movie_id', table_name='movies')
+    op.drop_index('ix_movies_meta_score_movie_id', table_name='movies')
+    op.drop_index('ix_movies_rating_movie_id', table_name='movies')
@@ -0,0 +1,37 @@
+"""movie_search_vector
+
+Revision ID: e7a90f3c5d21
+Revises: 8c41d7e2b093
+Create Date: 2026-10-17 11:48:20.135872
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a90f3c5d21'
+down_revision: Union[str, None] = '8c41d7e2b093'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('movies', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', movie_name), 'A') || setweight(to_tsvector('english', plot), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_movies_search_vector', 'movies', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_movies_search_vector', table_name='movies', postgresql_using='gin')
+    op.drop_column('movies', 'search_vector')
@@ -0,0 +1,5 @@
+"""
+Micro-benchmarks of the hot paths of the movie API, run them from the movie_api directory:
+
+    python -m benchmarks.<module>
+"""
@@ -0,0 +1,57 @@
+"""
+Benchmark of the compiled serializer and orjson against marshal and the json module, for 10 to 10,000 movies.
+
+    python -m benchmarks.serializer
+"""
+import json
+import timeit
+
+from flask_restx import marshal
+
+from src.database.models import Movie, Genre
+from src.routes.movies_resource import movie_list_model
+from src.serializer import dumps, serialize
+
+ROW_COUNTS = (10, 100, 1000, 10_000)
+REPEAT = 5
+
+
+def make_movies(amount: int) -> list[Movie]:
+    """
+    Make movies with two genres each, without a database.
+    :param amount: The number of movies.
+    :return: The movies.
+    """
+    genres = [Genre(genre_name=f"Genre {i}") for i in range(4)]
+    for genre_id, genre in enumerate(genres, start=1):
+        genre.genre_id = genre_id
+    movies = []
+    for movie_id in range(1, amount + 1):
+        movie = Movie(movie_name=f"Movie {movie_id}", rating=7.5, runtime=120, meta_score=70, plot="A plot. " * 20)
+        movie.movie_id = movie_id
+        movie.poster_path = "https://image.tmdb.org/t/p/w500/poster.jpg"
+        movie.genres.extend([genres[movie_id % 4], genres[(movie_id + 1) % 4]])
+        movies.append(movie)
+    return movies
+
+
+def main() -> None:
+    """
+    Time both paths from objects to JSON bytes and check that they produce the same JSON.
+    """
+    print(f"{'movies':>8} {'marshal':>12} {'compiled':>12} {'speedup':>8}")
+    for amount in ROW_COUNTS:
+        data = {"results": make_movies(amount), "next": None}
+        assert json.loads(dumps(serialize(data, movie_list_model))) == json.loads(
+            json.dumps(marshal(data, movie_list_model))
+        )
+
+        marshalled = min(timeit.repeat(
+            lambda d=data: json.dumps(marshal(d, movie_list_model)).encode(), number=1, repeat=REPEAT
+        ))
+        compiled = min(timeit.repeat(lambda d=data: dumps(serialize(d, movie_list_model)), number=1, repeat=REPEAT))
+        print(f"{amount:>8} {marshalled * 1000:>9.2f} ms {compiled * 1000:>9.2f} ms {marshalled / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
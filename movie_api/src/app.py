@@ -7,7 +7,6 @@ Disclaimer: This is based on our bachelor eindwerk project setup, which I also l
 """
 import logging
 import os
-import threading
 import sys
 from dotenv import load_dotenv
 from confz import EnvSource
@@ -17,9 +16,10 @@ from flask_jwt_extended import JWTManager
 
 from src.config import APIConfig
 from src.database.database import db
-from src.database.load_movie_data import load_data_in_background
+from src.database.catalog_loader import catalog_loader
+from src.database.catalog_snapshot import start_snapshot_refresher
 from src.routes import register_public_routes
-from src.cache import cache
+from src.cache import cache, get_cache_config
 from src.limiter import limiter
 from src.error_handlers import register_error_handlers
 
@@ -54,6 +54,7 @@ def create_app(api_config: APIConfig) -> Flask:
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = api_config.db.connection_url
     flask_app.config["SECRET_KEY"] = api_config.secret_key
     flask_app.config["DEBUG"] = api_config.debug
+    flask_app.config.update(get_cache_config(api_config.cache))
 
     CORS(flask_app, supports_credentials=True)
     db.init_app(flask_app)
@@ -69,9 +70,11 @@ def create_app(api_config: APIConfig) -> Flask:
     # Register routes
     register_public_routes(flask_app)
 
-    # Initialize the database if it is empty with movie data in the background
+    # Initialize the database if it is empty with movie data in the background, the catalog routes
+    # answer 503 until it is loaded, and keep the catalog snapshot up to date with the catalog version
     if "pytest" not in sys.modules:
-        threading.Thread(target=load_data_in_background, args=(db.session, flask_app)).start()
+        catalog_loader.start(flask_app)
+        start_snapshot_refresher(flask_app)
 
     return flask_app
 
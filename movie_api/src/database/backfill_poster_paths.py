@@ -0,0 +1,44 @@
+"""
+Background job that resolves the poster URLs of all movies that do not have one yet.
+"""
+import logging
+
+from sqlalchemy.orm import Session
+from src.database.models import Movie
+from src.database.models.movie import API_KEY
+
+
+def backfill_poster_paths(db_session: Session, batch_size: int = 100) -> int:
+    """
+    Resolve and store the poster path of every movie that does not have one yet.
+
+    Movies are handled in batches ordered by id, with a commit after every batch, so the progress is
+    kept when the job gets interrupted. Movies whose lookup fails are skipped and retried on the next run.
+    :param db_session: The database session.
+    :param batch_size: The number of movies to resolve per commit.
+    :return: The number of movies that received a poster path.
+    """
+    if not API_KEY:
+        logging.warning("No TMDB API key configured. Skipping poster backfill.")
+        return 0
+
+    resolved = 0
+    last_movie_id = 0
+    while True:
+        movies = (
+            db_session.query(Movie)
+            .filter(Movie.poster_path.is_(None), Movie.movie_id > last_movie_id)
+            .order_by(Movie.movie_id)
+            .limit(batch_size)
+            .all()
+        )
+        if not movies:
+            break
+
+        Movie.resolve_poster_paths(movies)
+        resolved += sum(1 for movie in movies if movie.poster_path is not None)
+        last_movie_id = movies[-1].movie_id
+        db_session.commit()
+
+    logging.info("Backfilled poster paths for %d movies.", resolved)
+    return resolved
@@ -0,0 +1,89 @@
+"""
+This module converts the IMDb CSV into the catalog seed that the service restores on its first start.
+
+It runs once when the image is built, so pandas and the CSV parsing stay out of the request-serving process:
+
+    python -m src.database.build_catalog_seed [--csv PATH] [--out DIRECTORY]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from src.database.catalog_seed import CATALOG_SEED_DIR, SEED_FORMAT, copy_line, seed_file
+from src.database.load_movie_data import MOVIE_DATA_PATH, parse_movie_data
+
+
+def file_sha256(path: str) -> str:
+    """
+    Compute the SHA-256 checksum of a file.
+    :param path: The path to the file.
+    :return: The hexadecimal checksum.
+    """
+    with open(path, "rb") as file:
+        return hashlib.file_digest(file, "sha256").hexdigest()
+
+
+def build_catalog_seed(csv_path: str = MOVIE_DATA_PATH, seed_dir: str = CATALOG_SEED_DIR) -> dict[str, int]:
+    """
+    Convert the IMDb CSV into a catalog seed.
+
+    The movies and genres are numbered from 1 in CSV and name order, the seed replaces an existing one at
+    once so a half written seed is never restored.
+    :param csv_path: The path to the IMDb CSV file.
+    :param seed_dir: The directory to write the seed to.
+    :return: The number of rows per table.
+    """
+    movies = parse_movie_data(
+        pd.read_csv(csv_path, usecols=["Movie Name", "Rating", "Runtime", "Genre", "Metascore", "Plot"])
+    )
+    movies.insert(0, "movie_id", range(1, len(movies) + 1))
+
+    genre_names = sorted(set(movies["genres"].explode().dropna()))
+    genre_ids = {genre_name: genre_id for genre_id, genre_name in enumerate(genre_names, start=1)}
+    links = movies[["movie_id", "genres"]].explode("genres").dropna().drop_duplicates()
+
+    movie_rows = movies[["movie_id", "movie_name", "rating", "runtime", "meta_score", "plot"]].astype(object)
+    tables = {
+        "genres": [(genre_id, genre_name) for genre_name, genre_id in genre_ids.items()],
+        "movies": list(movie_rows.where(movie_rows.notna(), None).itertuples(index=False, name=None)),
+        "has_genre": [(movie_id, genre_ids[genre_name]) for movie_id, genre_name in links.itertuples(index=False)],
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(seed_dir)), exist_ok=True)
+    directory = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(seed_dir)), prefix=".catalog_seed-")
+    for table, rows in tables.items():
+        with gzip.open(seed_file(directory, table), "wt", encoding="utf-8", newline="\n") as seed:
+            seed.writelines(copy_line(row) for row in rows)
+
+    row_counts = {table: len(rows) for table, rows in tables.items()}
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump({"format": SEED_FORMAT, "source_sha256": file_sha256(csv_path), "rows": row_counts}, manifest_file)
+
+    shutil.rmtree(seed_dir, ignore_errors=True)
+    os.replace(directory, seed_dir)
+    logging.info("Wrote the catalog seed of %d movies to %s.", row_counts["movies"], seed_dir)
+    return row_counts
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    This function is used to parse the input variables
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="Convert the IMDb movie catalog into a catalog seed.")
+    parser.add_argument("--csv", dest="csv_path", default=MOVIE_DATA_PATH, help="Path to the IMDb CSV file")
+    parser.add_argument("--out", dest="seed_dir", default=CATALOG_SEED_DIR, help="Directory to write the seed to")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    build_catalog_seed(csv_path=args.csv_path, seed_dir=args.seed_dir)
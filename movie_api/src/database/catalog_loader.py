@@ -0,0 +1,346 @@
+"""
+This module loads the movie catalog when the service starts and keeps track of its progress.
+
+The loader runs in a background thread with its own database session, so it never shares the request
+sessions. Until the catalog is loaded and indexed, the catalog routes answer 503 with a Retry-After header
+and /api/movies/health/ready reports the progress, so load balancers and orchestrators only send traffic to
+instances that can serve it. A failed load is retried with backoff until it succeeds.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from enum import Enum
+from functools import wraps
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database.database import db
+from src.database.catalog_seed import CATALOG_SEED_DIR, read_manifest, restore_catalog_seed
+from src.database.backfill_poster_paths import backfill_poster_paths
+from src.database.catalog_snapshot import refresh_catalog_snapshot
+from src.database.movie_index import rebuild_movie_index
+from src.database.similar_movies import build_similar_movies
+
+CATALOG_LOAD_LOCK = 0x6D6F766965
+"""The Postgres advisory lock that makes instances sharing a database load the catalog one at a time."""
+
+WARM_UP_LOCK = 0x706F73746572
+"""The Postgres advisory lock held by the one process that resolves the posters for all instances."""
+
+LOAD_RETRY_DELAY = 1.0
+"""The number of seconds before the first retry of a failed load, doubled for every next retry."""
+
+LOAD_RETRY_MAX_DELAY = 60.0
+"""The largest number of seconds between two retries of a failed load."""
+
+DEFAULT_RETRY_AFTER = 5
+"""The number of seconds clients are asked to wait while the remaining load time is unknown."""
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+@contextmanager
+def session_advisory_lock(key: int) -> Iterator[bool]:
+    """
+    Try to take a Postgres advisory lock on a connection of its own, held until the block ends.
+
+    Unlike the transaction lock of the load, the lock survives the commits made inside the block.
+    :param key: The key of the lock.
+    :return: Whether the lock was taken, another process holds it otherwise.
+    """
+    with db.engine.connect() as connection:
+        acquired = bool(connection.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key}).scalar())
+        connection.commit()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                connection.commit()
+
+
+class LoaderStatus(Enum):
+    """
+    The stages of loading the catalog.
+    """
+    NOT_STARTED = "not_started"
+    WAITING = "waiting"
+    LOADING = "loading"
+    INDEXING = "indexing"
+    READY = "ready"
+    FAILED = "failed"
+
+
+SERVING_STATUSES = (LoaderStatus.NOT_STARTED, LoaderStatus.READY)
+"""The statuses in which the catalog routes are served, a process that never starts the loader serves right away."""
+
+
+class LoadProgress:
+    """
+    The progress of loading the catalog.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize a LoadProgress object for a load that has not started.
+        """
+        self.status = LoaderStatus.NOT_STARTED
+        self.rows_loaded = 0
+        self.rows_total = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def elapsed(self) -> float:
+        """
+        Get the number of seconds the movies have been loading.
+        :return: The number of seconds, 0 if the load has not started.
+        """
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def rows_per_second(self) -> float:
+        """
+        Get the number of movies inserted per second.
+        :return: The rate, 0 if no movies were inserted yet.
+        """
+        elapsed = self.elapsed()
+        return self.rows_loaded / elapsed if elapsed > 0 else 0.0
+
+    def retry_after(self) -> int:
+        """
+        Estimate the number of seconds until the catalog is loaded.
+        :return: The number of seconds, at least 1.
+        """
+        rate = self.rows_per_second()
+        if self.status != LoaderStatus.LOADING or rate <= 0:
+            return DEFAULT_RETRY_AFTER
+        return max(1, round((self.rows_total - self.rows_loaded) / rate))
+
+
+class CatalogLoader:
+    """
+    Loads the catalog in a background thread and reports its progress.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize a CatalogLoader that has not started.
+        """
+        self._lock = threading.Lock()
+        self._progress = LoadProgress()
+
+    @property
+    def status(self) -> LoaderStatus:
+        """
+        The current stage of the load.
+        """
+        with self._lock:
+            return self._progress.status
+
+    @property
+    def serving(self) -> bool:
+        """
+        Whether the catalog routes can be served.
+        """
+        return self.status in SERVING_STATUSES
+
+    def retry_after(self) -> int:
+        """
+        Estimate the number of seconds until the catalog routes can be served.
+        :return: The number of seconds, at least 1.
+        """
+        with self._lock:
+            return self._progress.retry_after()
+
+    def progress(self) -> dict[str, Any]:
+        """
+        Get the progress of the load.
+        :return: The status, the movies inserted so far, their total and the insert rate.
+        """
+        with self._lock:
+            return {
+                "status": self._progress.status.value,
+                "ready": self._progress.status in SERVING_STATUSES,
+                "rows_loaded": self._progress.rows_loaded,
+                "rows_total": self._progress.rows_total,
+                "rows_per_second": round(self._progress.rows_per_second(), 1),
+                "elapsed_seconds": round(self._progress.elapsed(), 3),
+                "error": self._progress.error,
+            }
+
+    def start(
+        self,
+        flask_app: Flask,
+        seed_dir: str = CATALOG_SEED_DIR,
+        csv_path: Optional[str] = None
+    ) -> threading.Thread:
+        """
+        Start loading the catalog in a background thread.
+        :param flask_app: The Flask app, whose database engine is used.
+        :param seed_dir: The directory of the catalog seed.
+        :param csv_path: The path to the IMDb CSV file if there is no seed, the default path if None.
+        :return: The loader thread.
+        """
+        with self._lock:
+            self._progress = LoadProgress()
+            self._progress.status = LoaderStatus.WAITING
+        thread = threading.Thread(
+            target=self.run, args=(flask_app, seed_dir, csv_path), name="catalog-loader", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def run(
+        self,
+        flask_app: Flask,
+        seed_dir: str = CATALOG_SEED_DIR,
+        csv_path: Optional[str] = None,
+        max_attempts: Optional[int] = None
+    ) -> None:
+        """
+        Load the catalog, build the index the catalog routes need and then warm the optional tables.
+
+        A failed load is retried after LOAD_RETRY_DELAY seconds, doubling the delay up to LOAD_RETRY_MAX_DELAY,
+        so a database that is briefly unavailable at startup does not keep the catalog routes down.
+        :param flask_app: The Flask app, whose database engine is used.
+        :param seed_dir: The directory of the catalog seed.
+        :param csv_path: The path to the IMDb CSV file if there is no seed, the default path if None.
+        :param max_attempts: The number of loads to try before giving up, None to retry until one succeeds.
+        """
+        with flask_app.app_context():
+            attempts = 1
+            delay = LOAD_RETRY_DELAY
+            while not self._load_catalog(seed_dir, csv_path):
+                if max_attempts is not None and attempts >= max_attempts:
+                    return
+                logging.info("Retrying to load the movie catalog in %.0f seconds.", delay)
+                time.sleep(delay)
+                attempts += 1
+                delay = min(delay * 2, LOAD_RETRY_MAX_DELAY)
+            self._set_status(LoaderStatus.READY)
+
+            with Session(db.engine) as db_session:
+                self._warm_up(db_session)
+
+    def _load_catalog(self, seed_dir: str, csv_path: Optional[str]) -> bool:
+        """
+        Load the catalog and build the filter index once.
+        :param seed_dir: The directory of the catalog seed.
+        :param csv_path: The path to the IMDb CSV file if there is no seed, the default path if None.
+        :return: Whether the catalog was loaded, the error is reported in the progress otherwise.
+        """
+        with Session(db.engine) as db_session:
+            try:
+                # Another instance may be loading the same database, the lock is released by the commit
+                db_session.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CATALOG_LOAD_LOCK})
+                self._set_status(LoaderStatus.LOADING)
+                self._load(db_session, seed_dir, csv_path)
+                db_session.commit()
+
+                # The catalog is static from here on, so the filter index only has to be built once
+                self._set_status(LoaderStatus.INDEXING)
+                rebuild_movie_index(db_session=db_session)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                logging.error("Could not load the movie catalog: %s", e)
+                db_session.rollback()
+                with self._lock:
+                    self._progress.status = LoaderStatus.FAILED
+                    self._progress.error = str(e)
+                return False
+        return True
+
+    @staticmethod
+    def _warm_up(db_session: Session) -> None:
+        """
+        Write the files this host serves from and resolve the posters, the routes work without them.
+
+        Resolving the posters does not change the catalog version, so the snapshot is written again afterwards.
+        The other processes switch to a snapshot with the posters at their next refresh.
+        :param db_session: The session of the loader.
+        """
+        try:
+            # Write the catalog snapshot here rather than in the first catalog request
+            refresh_catalog_snapshot(db_session=db_session)
+
+            # The workers of a host share one similar movies table, only the first one builds it
+            build_similar_movies(db_session=db_session, replace=False)
+
+            # The posters are stored in the shared database, so one process resolves them for all instances
+            with session_advisory_lock(WARM_UP_LOCK) as acquired:
+                if acquired:
+                    backfill_poster_paths(db_session=db_session)
+                    refresh_catalog_snapshot(db_session=db_session)
+                else:
+                    logging.info("Another process is resolving the movie posters.")
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The similar movies answer 503 and posters are resolved lazily until this succeeds
+            logging.error("Could not warm up the movie catalog: %s", e)
+            db_session.rollback()
+
+    def _load(self, db_session: Session, seed_dir: str, csv_path: Optional[str]) -> None:
+        """
+        Restore the catalog from the seed, or parse the CSV when the image was built without one.
+        :param db_session: The session of the loader.
+        :param seed_dir: The directory of the catalog seed.
+        :param csv_path: The path to the IMDb CSV file, the default path if None.
+        """
+        if read_manifest(seed_dir) is not None:
+            restore_catalog_seed(db_session=db_session, seed_dir=seed_dir, progress=self._report_rows)
+            return
+
+        logging.warning("No catalog seed in %s, loading the catalog from the CSV instead.", seed_dir)
+        # Only imported here, pandas is not needed to serve the catalog
+        # pylint: disable-next=import-outside-toplevel
+        from src.database.load_movie_data import MOVIE_DATA_PATH, load_movie_data
+        load_movie_data(db_session=db_session, csv_path=csv_path or MOVIE_DATA_PATH, progress=self._report_rows)
+
+    def _set_status(self, status: LoaderStatus) -> None:
+        """
+        Move the load to the next stage.
+        :param status: The new stage.
+        """
+        with self._lock:
+            if status == LoaderStatus.LOADING:
+                self._progress.started_at = time.monotonic()
+            elif self._progress.status == LoaderStatus.LOADING:
+                self._progress.finished_at = time.monotonic()
+            self._progress.status = status
+
+    def _report_rows(self, rows_loaded: int, rows_total: int) -> None:
+        """
+        Record the number of movies inserted so far.
+        :param rows_loaded: The number of movies inserted.
+        :param rows_total: The number of movies to insert.
+        """
+        with self._lock:
+            self._progress.rows_loaded = rows_loaded
+            self._progress.rows_total = rows_total
+
+
+catalog_loader = CatalogLoader()
+"""The catalog loader of this process."""
+
+
+def require_catalog(view: F) -> F:
+    """
+    Answer 503 with a Retry-After header instead of calling the view while the catalog is not loaded.
+    :param view: The view.
+    :return: The guarded view.
+    """
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not catalog_loader.serving:
+            return (
+                {"message": "The movie catalog is still loading.", **catalog_loader.progress()},
+                503,
+                {"Retry-After": str(catalog_loader.retry_after())},
+            )
+        return view(*args, **kwargs)
+
+    return wrapper  # type: ignore[return-value]
@@ -0,0 +1,201 @@
+"""
+This module restores the movie catalog from a prebuilt seed.
+
+A seed is made from the IMDb CSV at build time (src.database.build_catalog_seed) and holds the genres, the
+movies and their genre links as gzipped Postgres COPY text files, next to a manifest with the format and the
+checksum of the CSV it was made from. Restoring it streams the files into the database with COPY, so it needs
+neither pandas nor one INSERT parameter set per movie.
+"""
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from src.database.models import Movie
+
+CATALOG_SEED_DIR = "src/database/movie_data/catalog_seed"
+"""The directory of the seed, relative to the project root."""
+
+SEED_FORMAT = 1
+"""The version of the seed layout, seeds of another version are not restored."""
+
+SEED_TABLES = {
+    "genres": {"genre_id": "integer", "genre_name": "varchar"},
+    "movies": {
+        "movie_id": "integer", "movie_name": "varchar", "rating": "float", "runtime": "integer",
+        "meta_score": "integer", "plot": "varchar",
+    },
+    "has_genre": {"movie_id": "integer", "genre_id": "integer"},
+}
+"""The columns and their types of every seed file, in the order they are written."""
+
+COPY_CHUNK_ROWS = 1000
+"""The number of rows sent to COPY at a time, progress is reported after every chunk."""
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def copy_line(values: Iterable[Any]) -> str:
+    """
+    Format a row as a line of the Postgres COPY text format.
+    :param values: The values of the row, None for NULL.
+    :return: The line, with the newline.
+    """
+    return "\t".join("\\N" if value is None else str(value).translate(COPY_ESCAPES) for value in values) + "\n"
+
+
+def seed_file(seed_dir: str, table: str) -> str:
+    """
+    Get the path of the file of a table in a seed.
+    :param seed_dir: The directory of the seed.
+    :param table: The name of the table.
+    :return: The path.
+    """
+    return os.path.join(seed_dir, f"{table}.copy.gz")
+
+
+def read_manifest(seed_dir: str) -> Optional[dict[str, Any]]:
+    """
+    Read the manifest of a seed.
+    :param seed_dir: The directory of the seed.
+    :return: The manifest, None if there is no seed of the current format in the directory.
+    """
+    try:
+        with open(os.path.join(seed_dir, "manifest.json"), "r", encoding="utf-8") as manifest_file:
+            manifest: dict[str, Any] = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("format") == SEED_FORMAT else None
+
+
+class ChunkReader:
+    """
+    File-like view on an iterator of text chunks, for drivers that read the COPY data from a file.
+    """
+
+    def __init__(self, chunks: Iterator[str]) -> None:
+        """
+        Initialize a ChunkReader object.
+        :param chunks: The chunks of COPY text.
+        """
+        self.chunks = chunks
+
+    def read(self, _: int = -1) -> str:
+        """
+        Read the next chunk, however large it is.
+        :return: The chunk, an empty string at the end.
+        """
+        return next(self.chunks, "")
+
+
+def copy_chunks(rows: Iterable[str], progress: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+    """
+    Join the rows of a seed file into chunks of COPY_CHUNK_ROWS rows.
+    :param rows: The COPY text rows.
+    :param progress: Called with the number of rows copied so far, after every full chunk.
+    :return: Iterator over the chunks.
+    """
+    chunk: list[str] = []
+    copied = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == COPY_CHUNK_ROWS:
+            yield "".join(chunk)
+            copied += len(chunk)
+            chunk = []
+            if progress is not None:
+                progress(copied)
+    if chunk:
+        yield "".join(chunk)
+
+
+def copy_table(
+    cursor: Any,
+    seed_dir: str,
+    table: str,
+    progress: Optional[Callable[[int], None]] = None
+) -> None:
+    """
+    Copy the file of a table in a seed into a temporary seed_<table> table, which is dropped on commit.
+
+    Works with the cursors of both psycopg 3 (cursor.copy) and psycopg2 (cursor.copy_expert).
+    :param cursor: A psycopg or psycopg2 cursor in the transaction of the session.
+    :param seed_dir: The directory of the seed.
+    :param table: The name of the table.
+    :param progress: Called with the number of rows copied so far.
+    """
+    columns = SEED_TABLES[table]
+    cursor.execute(
+        f"CREATE TEMPORARY TABLE seed_{table} "
+        f"({', '.join(f'{column} {column_type}' for column, column_type in columns.items())}) ON COMMIT DROP"
+    )
+    statement = f"COPY seed_{table} ({', '.join(columns)}) FROM STDIN"
+    with gzip.open(seed_file(seed_dir, table), "rt", encoding="utf-8", newline="\n") as rows:
+        chunks = copy_chunks(rows, progress)
+        if hasattr(cursor, "copy"):
+            with cursor.copy(statement) as copy:
+                for chunk in chunks:
+                    copy.write(chunk)
+        else:
+            cursor.copy_expert(statement, ChunkReader(chunks))
+
+
+def restore_catalog_seed(
+    db_session: Session,
+    seed_dir: str = CATALOG_SEED_DIR,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> None:
+    """
+    Restore the catalog from a seed, unless the database already contains movies.
+
+    The files are copied into temporary tables first, so genres that already exist are reused by name.
+    The movies keep the ids of the seed. Everything happens in the transaction of the session, the caller
+    commits.
+    :param db_session: The database session.
+    :param seed_dir: The directory of the seed.
+    :param progress: Called with the number of movies copied so far and the total number of movies.
+    :raises ValueError: If there is no seed of the current format in the directory.
+    """
+    manifest = read_manifest(seed_dir)
+    if manifest is None:
+        raise ValueError(f"No catalog seed of format {SEED_FORMAT} in {seed_dir}")
+
+    if db_session.query(Movie).count() > 0:
+        logging.info("Database already populated. Skipping data load.")
+        return
+
+    start = time.perf_counter()
+    movies_total = int(manifest["rows"]["movies"])
+    connection = db_session.connection().connection.driver_connection
+    if connection is None:
+        raise ValueError("The database connection is closed")
+    with connection.cursor() as cursor:
+        for table in SEED_TABLES:
+            if table == "movies" and progress is not None:
+                copy_table(cursor, seed_dir, table, lambda copied: progress(copied, movies_total))
+            else:
+                copy_table(cursor, seed_dir, table)
+    if progress is not None:
+        progress(movies_total, movies_total)
+
+    for statement in (
+        "INSERT INTO genres (genre_name) SELECT genre_name FROM seed_genres "
+        "WHERE genre_name NOT IN (SELECT genre_name FROM genres) ORDER BY genre_id",
+        "INSERT INTO movies (movie_id, movie_name, rating, runtime, meta_score, plot) "
+        "SELECT movie_id, movie_name, rating, runtime, meta_score, plot FROM seed_movies",
+        "SELECT setval(pg_get_serial_sequence('movies', 'movie_id'), (SELECT max(movie_id) FROM movies))",
+        "INSERT INTO has_genre (movie_id, genre_id) SELECT seed_has_genre.movie_id, genres.genre_id "
+        "FROM seed_has_genre JOIN seed_genres USING (genre_id) JOIN genres USING (genre_name)",
+    ):
+        db_session.execute(text(statement))
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        "Database restored with %d movies from the catalog seed in %.2f seconds (%.0f rows/second).",
+        movies_total, elapsed, movies_total / elapsed if elapsed > 0 else 0.0
+    )
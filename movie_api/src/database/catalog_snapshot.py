@@ -0,0 +1,341 @@
+"""
+Immutable, memory-mapped snapshot of the movie catalog.
+
+The catalog is written once per catalog version as a set of flat arrays: the ids, ratings, runtimes and meta
+scores, a genre bitmask per movie and the names, plots and posters in one UTF-8 buffer with offsets. Every
+gunicorn worker maps the same files, so the operating system keeps a single copy in memory, and the movie
+routes can answer without going through SQLAlchemy or the marshaller.
+
+Resolving a poster does not change the catalog version, so a snapshot also records how many posters it holds,
+and it is written again when more posters were resolved in the database since.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from functools import cached_property
+from typing import Any, Optional
+
+import numpy as np
+import numpy.typing as npt
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from src.database.database import db
+from src.database.models import Movie, Genre
+from src.database.models.movie import movie_genre_association
+from src.database.models.catalog_version import get_catalog_version
+from src.database.movie_index import MovieIndex
+
+CATALOG_SNAPSHOT_DIR = os.getenv("CATALOG_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "movie_catalog"))
+"""The directory the snapshots are stored in, shared by all workers on the host."""
+
+VERSION_CHECK_INTERVAL = 30.0
+"""The number of seconds between two checks of the catalog version by the snapshot refresher."""
+
+MAX_GENRES = 64
+"""The maximum number of genres that fit in the genre bitmask of a movie."""
+
+ARRAYS = ("movie_ids", "ratings", "runtimes", "meta_scores", "genre_bits", "text", "text_offsets")
+
+
+class CatalogSnapshot:
+    """
+    Read-only view on the snapshot files of one catalog version.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        posters: int,
+        arrays: dict[str, npt.NDArray[Any]],
+        genres: list[tuple[int, str]]
+    ) -> None:
+        """
+        Initialize a CatalogSnapshot object.
+        :param version: The catalog version the snapshot was made from.
+        :param posters: The number of resolved posters in the database when the snapshot was made.
+        :param arrays: The snapshot arrays, see CatalogSnapshot.write.
+        :param genres: The (genre id, genre name) of every bit of the genre bitmasks.
+        """
+        self.version = version
+        self.posters = posters
+        self.arrays = arrays
+        self.movie_ids: npt.NDArray[np.int64] = arrays["movie_ids"]
+        self.genres = genres
+
+    def __len__(self) -> int:
+        """
+        The number of movies in the snapshot.
+        """
+        return len(self.movie_ids)
+
+    @staticmethod
+    def write(db_session: Session, directory: str, version: int, posters: int) -> None:
+        """
+        Write a snapshot of the catalog in the database to a directory.
+
+        The text buffer holds the name, plot and poster path of every movie after each other, text_offsets
+        holds the start of every string and the end of the buffer.
+        :param db_session: The database session.
+        :param directory: The directory to write the snapshot files to.
+        :param version: The catalog version the snapshot is made from.
+        :param posters: The number of resolved posters in the database, see count_posters.
+        :raises ValueError: If there are more genres than fit in the genre bitmask.
+        """
+        genres = db_session.query(Genre.genre_id, Genre.genre_name).order_by(Genre.genre_id).all()
+        if len(genres) > MAX_GENRES:
+            raise ValueError(f"The catalog has more than {MAX_GENRES} genres")
+
+        movies = db_session.query(
+            Movie.movie_id, Movie.movie_name, Movie.rating, Movie.runtime, Movie.meta_score, Movie.plot,
+            Movie.poster_path
+        ).order_by(Movie.movie_id).all()
+
+        strings = [
+            string.encode()
+            for movie in movies
+            for string in (movie.movie_name, movie.plot, movie.poster_path or "")
+        ]
+        arrays: dict[str, npt.NDArray[Any]] = {
+            "movie_ids": np.array([movie.movie_id for movie in movies], dtype=np.int64),
+            "ratings": np.array([movie.rating for movie in movies], dtype=np.float64),
+            "runtimes": np.array([movie.runtime for movie in movies], dtype=np.int64),
+            "meta_scores": np.array(
+                [np.nan if movie.meta_score is None else movie.meta_score for movie in movies], dtype=np.float64
+            ),
+            "genre_bits": CatalogSnapshot._genre_bits(
+                db_session, [movie.movie_id for movie in movies], [genre_id for genre_id, _ in genres]
+            ),
+            "text": np.frombuffer(b"".join(strings), dtype=np.uint8),
+            "text_offsets": np.concatenate(([0], np.cumsum([len(string) for string in strings]))).astype(np.int64),
+        }
+
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, "genres.json"), "w", encoding="utf-8") as genres_file:
+            json.dump([list(genre) for genre in genres], genres_file)
+        with open(os.path.join(directory, "version"), "w", encoding="utf-8") as version_file:
+            version_file.write(f"{version} {posters}")
+
+    @staticmethod
+    def _genre_bits(db_session: Session, movie_ids: list[int], genre_ids: list[int]) -> npt.NDArray[np.uint64]:
+        """
+        Build the genre bitmask of every movie.
+        :param db_session: The database session.
+        :param movie_ids: The movie id at every position.
+        :param genre_ids: The genre id of every bit.
+        :return: The genre bitmask at every position.
+        """
+        positions = {movie_id: position for position, movie_id in enumerate(movie_ids)}
+        bits = {genre_id: bit for bit, genre_id in enumerate(genre_ids)}
+        genre_bits = np.zeros(len(movie_ids), dtype=np.uint64)
+        for movie_id, genre_id in db_session.execute(select(movie_genre_association)).all():
+            if movie_id in positions and genre_id in bits:
+                genre_bits[positions[movie_id]] |= np.uint64(1 << bits[genre_id])
+        return genre_bits
+
+    @staticmethod
+    def open(directory: str) -> "CatalogSnapshot":
+        """
+        Memory-map the snapshot files in a directory.
+        :param directory: The directory of the snapshot.
+        :return: The snapshot.
+        """
+        with open(os.path.join(directory, "version"), "r", encoding="utf-8") as version_file:
+            version, posters = map(int, version_file.read().split())
+        with open(os.path.join(directory, "genres.json"), "r", encoding="utf-8") as genres_file:
+            genres = [(int(genre_id), str(genre_name)) for genre_id, genre_name in json.load(genres_file)]
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in ARRAYS}
+        return CatalogSnapshot(version, posters, arrays, genres)
+
+    def position(self, movie_id: int) -> Optional[int]:
+        """
+        Get the position of a movie in the snapshot.
+        :param movie_id: The id of the movie.
+        :return: The position, None if the movie is not in the snapshot.
+        """
+        position = int(np.searchsorted(self.movie_ids, movie_id))
+        if position < len(self.movie_ids) and self.movie_ids[position] == movie_id:
+            return position
+        return None
+
+    def _string(self, position: int, field: int) -> str:
+        """
+        Get a string of a movie from the text buffer.
+        :param position: The position of the movie.
+        :param field: 0 for the name, 1 for the plot and 2 for the poster path.
+        :return: The string.
+        """
+        offsets = self.arrays["text_offsets"]
+        index = position * 3 + field
+        return bytes(self.arrays["text"][offsets[index]:offsets[index + 1]]).decode()
+
+    def get_movie(self, movie_id: int) -> Optional[dict[str, Any]]:
+        """
+        Get a movie in the same format as the movie model of the movie routes.
+        :param movie_id: The id of the movie.
+        :return: The movie, None if the movie is not in the snapshot. The poster path is None if it is not known yet.
+        """
+        position = self.position(movie_id)
+        if position is None:
+            return None
+
+        bits = int(self.arrays["genre_bits"][position])
+        meta_score = self.arrays["meta_scores"][position]
+        return {
+            "movie_id": int(movie_id),
+            "movie_name": self._string(position, 0),
+            "plot": self._string(position, 1),
+            "poster_path": self._string(position, 2) or None,
+            "rating": float(self.arrays["ratings"][position]),
+            "genres": [
+                {"genre_id": genre_id, "genre_name": genre_name}
+                for bit, (genre_id, genre_name) in enumerate(self.genres) if bits >> bit & 1
+            ],
+            "meta_score": None if np.isnan(meta_score) else int(meta_score),
+            "runtime": int(self.arrays["runtimes"][position]),
+        }
+
+    @cached_property
+    def index(self) -> MovieIndex:
+        """
+        The filter index over the movies of the snapshot.
+        """
+        genre_masks = {
+            genre_id: (self.arrays["genre_bits"] >> np.uint64(bit) & np.uint64(1)).astype(np.bool_)
+            for bit, (genre_id, _) in enumerate(self.genres)
+        }
+        columns = {
+            "rating": np.asarray(self.arrays["ratings"], dtype=np.float64),
+            "runtime": np.asarray(self.arrays["runtimes"], dtype=np.float64),
+            "meta_score": np.asarray(self.arrays["meta_scores"], dtype=np.float64),
+        }
+        return MovieIndex(np.asarray(self.movie_ids), columns, genre_masks, dict(self.genres))
+
+
+def count_posters(db_session: Session) -> int:
+    """
+    Count the movies whose poster is resolved, this only grows while the catalog version stays the same.
+    :param db_session: The database session.
+    :return: The number of movies with a poster path.
+    """
+    poster_count = func.count(Movie.poster_path)  # pylint: disable=not-callable
+    return int(db_session.execute(select(poster_count)).scalar() or 0)
+
+
+def open_or_write_snapshot(db_session: Session, version: int, snapshot_dir: str, posters: int = 0) -> CatalogSnapshot:
+    """
+    Open the snapshot of a catalog version and poster count, writing it first if no worker has written it yet.
+
+    Writing happens under a file lock, so only one worker on the host builds each snapshot. Other snapshots
+    are removed, workers that still have them mapped keep reading them until they switch.
+    :param db_session: The database session.
+    :param version: The catalog version.
+    :param snapshot_dir: The directory the snapshots are stored in.
+    :param posters: The number of resolved posters in the database, see count_posters.
+    :return: The snapshot.
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    name = f"catalog-{version}-{posters}"
+    directory = os.path.join(snapshot_dir, name)
+
+    with open(os.path.join(snapshot_dir, ".lock"), "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if not os.path.isdir(directory):
+                start = time.perf_counter()
+                temporary_directory = tempfile.mkdtemp(dir=snapshot_dir, prefix=".catalog-")
+                CatalogSnapshot.write(db_session, temporary_directory, version, posters)
+                os.rename(temporary_directory, directory)
+                logging.info(
+                    "Wrote catalog snapshot %d with %d posters in %.2f seconds.",
+                    version, posters, time.perf_counter() - start
+                )
+
+                for other_name in os.listdir(snapshot_dir):
+                    if other_name.startswith("catalog-") and other_name != name:
+                        shutil.rmtree(os.path.join(snapshot_dir, other_name), ignore_errors=True)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    return CatalogSnapshot.open(directory)
+
+
+_snapshot: Optional[CatalogSnapshot] = None
+_snapshot_lock = threading.Lock()
+
+
+def get_catalog_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    Get the snapshot of the catalog this process currently serves, without touching the database.
+
+    The snapshot is switched by refresh_catalog_snapshot, which runs outside of the request handling.
+    :return: The snapshot, None if the catalog is empty or no snapshot was made yet.
+    """
+    with _snapshot_lock:
+        return _snapshot
+
+
+def refresh_catalog_snapshot(db_session: Session) -> Optional[CatalogSnapshot]:
+    """
+    Check the catalog version and the resolved posters, and switch to the snapshot of both, writing it if needed.
+    :param db_session: The database session, used to check the catalog version and to write a new snapshot.
+    :return: The snapshot, None if the catalog is empty or no snapshot could be made.
+    """
+    global _snapshot  # pylint: disable=global-statement
+    version = get_catalog_version(db_session)
+    posters = count_posters(db_session)
+    snapshot = get_catalog_snapshot()
+    if snapshot is None or snapshot.version != version or snapshot.posters != posters:
+        try:
+            snapshot = open_or_write_snapshot(db_session, version, CATALOG_SNAPSHOT_DIR, posters) if version else None
+        except (OSError, ValueError) as e:
+            logging.error("Could not make a catalog snapshot: %s", e)
+            snapshot = None
+        with _snapshot_lock:
+            _snapshot = snapshot
+    return snapshot
+
+
+def start_snapshot_refresher(flask_app: Flask, interval: float = VERSION_CHECK_INTERVAL) -> threading.Thread:
+    """
+    Refresh the catalog snapshot every interval seconds in a background thread.
+    :param flask_app: The Flask app, whose database engine is used.
+    :param interval: The number of seconds between two checks of the catalog version.
+    :return: The refresher thread.
+    """
+    thread = threading.Thread(
+        target=_refresh_forever, args=(flask_app, interval), name="catalog-snapshot", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def _refresh_forever(flask_app: Flask, interval: float) -> None:
+    """
+    Refresh the catalog snapshot every interval seconds, forever.
+    :param flask_app: The Flask app, whose database engine is used.
+    :param interval: The number of seconds between two checks of the catalog version.
+    """
+    while True:
+        time.sleep(interval)
+        with flask_app.app_context(), Session(db.engine) as db_session:
+            try:
+                refresh_catalog_snapshot(db_session)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # The routes keep serving the current snapshot, the next check tries again
+                logging.error("Could not check the catalog version: %s", e)
+
+
+def reset_catalog_snapshot() -> None:
+    """
+    Forget the current snapshot, the catalog routes read the database until it is refreshed again.
+    """
+    global _snapshot  # pylint: disable=global-statement
+    with _snapshot_lock:
+        _snapshot = None
@@ -1,68 +1,154 @@
+"""
+This module loads the IMDb movie catalog from the CSV file into the database.
+
+The CSV is parsed and cleaned column-wise with pandas and inserted with multi-row INSERT statements in a
+single transaction, so a fresh database is filled in seconds. The service runs it through the catalog
+loader (src.database.catalog_loader), it can also be run on its own:
+
+    python -m src.database.load_movie_data [--csv PATH]
+"""
+import argparse
 import logging
+import time
+from typing import Callable, Optional
 
 import pandas as pd
-from flask import Flask
+from confz import EnvSource
+from sqlalchemy import create_engine, insert
 from sqlalchemy.orm import Session
+from src.config import APIConfig
 from src.database import Movie, Genre
+from src.database.models.movie import movie_genre_association
+
+MOVIE_DATA_PATH = "src/database/movie_data/Top_10000_Movies_IMDb.csv"
+"""The path to the IMDb movie catalog, relative to the project root."""
+
+DEFAULT_RUNTIME = 90
+"""The runtime in minutes used for movies without a runtime."""
+
+DEFAULT_PLOT = "No plot available"
+"""The plot used for movies without a plot."""
+
+INSERT_CHUNK_SIZE = 1000
+"""The number of movies inserted per statement, progress is reported after every chunk."""
 
 
-def load_data_in_background(db_session: Session, flask_app: "Flask") -> None:
+def parse_movie_data(data: pd.DataFrame) -> pd.DataFrame:
     """
-    Load movie data in the background.
+    Clean the raw IMDb columns into the movie columns of the database.
+
+    Missing values get the same defaults as a single Movie would get, rows that would not pass the Movie
+    validation are dropped.
+    :param data: The raw CSV data.
+    :return: A data frame with the movie_name, rating, runtime, meta_score, plot and genres columns.
     """
-    # This function will run the loading task in the background
-    with flask_app.app_context():
-        load_movie_data(db_session=db_session)
+    runtime = pd.to_numeric(data["Runtime"].astype("string").str.replace(" min", "", regex=False), errors="coerce")
+    movies = pd.DataFrame({
+        "movie_name": data["Movie Name"].astype(str).str.strip(),
+        "rating": pd.to_numeric(data["Rating"], errors="coerce").fillna(0.0),
+        "runtime": runtime.mask(data["Runtime"].isna(), DEFAULT_RUNTIME),
+        "meta_score": pd.to_numeric(data["Metascore"], errors="coerce"),
+        "plot": data["Plot"].fillna(DEFAULT_PLOT).astype(str).str.strip(),
+        "genres": data["Genre"].fillna("").astype(str).str.split(",").map(
+            lambda genres: [genre.strip() for genre in genres if genre.strip()]
+        ),
+    })
+
+    valid = (
+        (movies["movie_name"].str.len() > 0)
+        & (movies["plot"].str.len() > 0)
+        & movies["rating"].between(0, 10)
+        & movies["runtime"].between(1, 1000)
+        & (movies["meta_score"].isna() | movies["meta_score"].between(0, 100))
+    )
+    if not valid.all():
+        logging.error("Skipping %d invalid movie rows.", int((~valid).sum()))
+
+    movies = movies[valid].reset_index(drop=True)
+    movies["runtime"] = movies["runtime"].astype(int)
+    movies["meta_score"] = movies["meta_score"].astype("Int64")
+    return movies
 
 
-def load_movie_data(db_session: Session) -> None:
+def load_movie_data(
+    db_session: Session,
+    csv_path: str = MOVIE_DATA_PATH,
+    progress: Optional[Callable[[int, int], None]] = None
+) -> None:
     """
     Load movie data from CSV file into the database.
+
+    Genres, movies and their genre links are each inserted in batches, all in one transaction.
+    :param db_session: The database session.
+    :param csv_path: The path to the IMDb CSV file.
+    :param progress: Called with the number of movies inserted so far and the total number of movies.
     """
     # Check whether the database is empty
     if db_session.query(Movie).count() > 0:
         logging.info("Database already populated. Skipping data load.")
         return
 
-    data = pd.read_csv('src/database/movie_data/Top_10000_Movies_IMDb.csv')
-    data = data[['ID', 'Movie Name', 'Rating', 'Runtime', 'Genre', 'Metascore', 'Plot']]
-
-    for _, row in data.iterrows():
-        try:
-            # Parse and validate fields
-            movie_name = str(row['Movie Name']).strip()
-            rating = float(row['Rating']) if not pd.isna(row['Rating']) else 0.0
-            runtime = int(row['Runtime'].replace(" min", "")) if not pd.isna(row['Runtime']) else 90
-            meta_score_value = row.get("Metascore")
-            meta_score = int(meta_score_value) if pd.notna(meta_score_value) else None
-            plot = str(row['Plot']).strip() if not pd.isna(row['Plot']) else "No plot available"
-
-            # Create Movie instance
-            movie = Movie(
-                movie_name=movie_name,
-                rating=rating,
-                runtime=runtime,
-                meta_score=meta_score,
-                plot=plot
-            )
-            db_session.add(movie)
-
-            # Handle genres (comma-separated)
-            genres_raw = row['Genre']
-            genre_names = [g.strip() for g in genres_raw.split(',')] if pd.notna(genres_raw) else []
-
-            for genre_name in genre_names:
-                # Check if genre already exists
-                genre = db_session.query(Genre).filter(Genre.genre_name == genre_name).first()
-                if not genre:
-                    genre = Genre(genre_name=genre_name)
-                    db_session.add(genre)
-                movie.genres.append(genre)
-
-            db_session.add(movie)
-            db_session.commit()
-
-        except Exception as e:  # pylint: disable=broad-exception-caught
-            logging.error("Error loading movie data: %s", e)
-    logging.info("Database populated.")
+    start = time.perf_counter()
+    data = pd.read_csv(csv_path, usecols=["Movie Name", "Rating", "Runtime", "Genre", "Metascore", "Plot"])
+    movies = parse_movie_data(data)
+
+    # Build the genre lookup once, inserting the genres that do not exist yet
+    genre_ids: dict[str, int] = dict(db_session.query(Genre.genre_name, Genre.genre_id).all())
+    new_genres = sorted(set(movies["genres"].explode().dropna()) - genre_ids.keys())
+    if new_genres:
+        inserted_genres = db_session.execute(
+            insert(Genre).returning(Genre.genre_name, Genre.genre_id),
+            [{"genre_name": genre_name} for genre_name in new_genres]
+        )
+        genre_ids.update(inserted_genres.tuples().all())
+
+    # Insert the movies, the returned ids are in the same order as the rows
+    movie_rows = movies[["movie_name", "rating", "runtime", "meta_score", "plot"]].astype(object)
+    records = movie_rows.where(movie_rows.notna(), None).to_dict("records")
+    movie_ids: list[int] = []
+    for chunk_start in range(0, len(records), INSERT_CHUNK_SIZE):
+        movie_ids.extend(db_session.execute(
+            insert(Movie).returning(Movie.movie_id, sort_by_parameter_order=True),
+            records[chunk_start:chunk_start + INSERT_CHUNK_SIZE]
+        ).scalars().all())
+        if progress is not None:
+            progress(len(movie_ids), len(records))
+
+    # Link every movie to its genres
+    links = pd.DataFrame({"movie_id": movie_ids, "genre_name": movies["genres"]}).explode("genre_name").dropna()
+    links = links.drop_duplicates()
+    if not links.empty:
+        db_session.execute(
+            insert(movie_genre_association),
+            [
+                {"movie_id": int(movie_id), "genre_id": genre_ids[genre_name]}
+                for movie_id, genre_name in zip(links["movie_id"], links["genre_name"])
+            ]
+        )
+
     db_session.commit()
+
+    elapsed = time.perf_counter() - start
+    logging.info(
+        "Database populated with %d movies in %.2f seconds (%.0f rows/second).",
+        len(movie_ids), elapsed, len(movie_ids) / elapsed if elapsed > 0 else 0.0
+    )
+
+
+def parse_args() -> argparse.Namespace:
+    """
+    This function is used to parse the input variables
+    :return:
+    """
+    parser = argparse.ArgumentParser(description="Load the IMDb movie catalog into the database.")
+    parser.add_argument("--csv", dest="csv_path", default=MOVIE_DATA_PATH, help="Path to the IMDb CSV file")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    config = APIConfig(config_sources=EnvSource(allow_all=True, nested_separator="__", file=".env"))
+    logging.basicConfig(level=config.logging.get_level())
+
+    with Session(create_engine(config.db.connection_url)) as session:
+        load_movie_data(db_session=session, csv_path=args.csv_path)
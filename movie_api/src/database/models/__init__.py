@@ -1,2 +1,3 @@
 from .movie import Movie
 from .genre import Genre
+from .catalog_version import get_catalog_version
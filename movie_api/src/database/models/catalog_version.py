@@ -0,0 +1,94 @@
+"""
+This module keeps a version stamp of the movie catalog in the database.
+
+Every statement that changes the catalog columns of the movies, genres or has_genre tables increments the single
+row of the catalog_version table through a trigger, so anything derived from the catalog can check whether it is
+still up to date with a single cheap query. The row is updated inside the writing transaction, so a new version
+only becomes visible together with the changes it stands for, and a rolled back change leaves it as it was.
+"""
+from typing import Any
+
+from sqlalchemy import BigInteger, Column, Connection, Integer, MetaData, Table, event, select, text
+from sqlalchemy.orm import Session
+
+from src.database.base import Base
+from src.database.models.movie import Movie, movie_genre_association
+from src.database.models.genre import Genre
+
+catalog_version_table = Table(
+    "catalog_version",
+    Base.metadata,
+    Column("catalog_version_id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False),
+)
+
+CATALOG_TABLES = (Movie.__table__, Genre.__table__, movie_genre_association)
+"""The tables that make up the catalog."""
+
+UNVERSIONED_COLUMNS = ("poster_path", "search_vector")
+"""
+The columns that do not change the catalog version: the poster paths are resolved lazily and filled in from the
+database when a snapshot lacks them, and the search vector is generated from the other columns.
+"""
+
+BUMP_CATALOG_VERSION_FUNCTION = """
+CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE catalog_version SET version = version + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+BUMP_CATALOG_VERSION_TRIGGER = """
+CREATE TRIGGER {table}_catalog_version
+AFTER INSERT OR UPDATE OF {columns} OR DELETE OR TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version()
+"""
+
+
+def versioned_columns(table: Table) -> list[str]:
+    """
+    Get the columns of a catalog table whose updates change the catalog version.
+    :param table: The catalog table.
+    :return: The column names.
+    """
+    return [column.name for column in table.columns if column.name not in UNVERSIONED_COLUMNS]
+
+
+def create_catalog_version_function(_: MetaData, connection: Connection, **__: Any) -> None:
+    """
+    Create the trigger function when the tables are created (the migrations create it for deployments).
+    """
+    connection.execute(text(BUMP_CATALOG_VERSION_FUNCTION))
+
+
+def insert_catalog_version(table: Table, connection: Connection, **__: Any) -> None:
+    """
+    Insert the version row when the catalog_version table is created (the migrations insert it for deployments).
+    """
+    connection.execute(table.insert().values(catalog_version_id=1, version=0))
+
+
+def create_catalog_version_trigger(table: Table, connection: Connection, **__: Any) -> None:
+    """
+    Create the trigger of a catalog table when it is created (the migrations create it for deployments).
+    """
+    connection.execute(text(BUMP_CATALOG_VERSION_TRIGGER.format(
+        table=table.name, columns=", ".join(versioned_columns(table))
+    )))
+
+
+event.listen(Base.metadata, "before_create", create_catalog_version_function)
+event.listen(catalog_version_table, "after_create", insert_catalog_version)
+for catalog_table in CATALOG_TABLES:
+    event.listen(catalog_table, "after_create", create_catalog_version_trigger)
+
+
+def get_catalog_version(db_session: Session) -> int:
+    """
+    Get the current version stamp of the catalog.
+    :param db_session: The database session.
+    :return: The version stamp, 0 if the catalog has never been changed.
+    """
+    return int(db_session.execute(select(catalog_version_table.c.version)).scalar() or 0)
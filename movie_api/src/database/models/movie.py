@@ -2,11 +2,17 @@
 This module contains the Movie model for the database.
 """
 import os
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Collection, Iterator, Optional, Union
 from collections import Counter
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 import requests
-from sqlalchemy.orm import relationship, mapped_column, Mapped, Session
-from sqlalchemy import Table, Column, ForeignKey
+from requests.adapters import HTTPAdapter
+from sqlalchemy.orm import relationship, mapped_column, Mapped, Session, load_only, selectinload
+from sqlalchemy import (
+    Table, Column, ForeignKey, Index, Computed, Integer, and_, or_, tuple_, func, any_, bindparam, cast, select
+)
+from sqlalchemy.dialects.postgresql import ARRAY, DOUBLE_PRECISION, TSVECTOR
 from src.database.base import Base
 
 API_KEY = os.getenv("API_KEY")
@@ -17,6 +23,25 @@ API_HEADERS = {
     "Accept": "application/json"
 }
 
+TMDB_SEARCH_URL = "https://api.themoviedb.org/3/search/movie"
+TMDB_IMAGE_URL = "https://image.tmdb.org/t/p/w500"
+DEFAULT_POSTER_PATH = f"{TMDB_IMAGE_URL}/dz3AjGWAPV4cK8lRDY0DdaVfGUK.jpg"
+
+SORT_COLUMNS = ("rating", "meta_score", "runtime")
+"""The columns the movie list can be sorted on."""
+
+POSTER_WORKERS = 8
+"""The maximum number of concurrent TMDB poster lookups."""
+
+POSTER_BATCH_TIMEOUT = 1.5
+"""The maximum number of seconds a batch of poster lookups may take before falling back to the default poster."""
+
+# One pooled session keeps the connections to TMDB alive between lookups
+tmdb_session = requests.Session()
+tmdb_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=POSTER_WORKERS))
+
+poster_executor = ThreadPoolExecutor(max_workers=POSTER_WORKERS, thread_name_prefix="tmdb-poster")
+
 if TYPE_CHECKING:
     from src.database.models import Genre, WatchedMovie
 
@@ -55,6 +80,19 @@ class Movie(Base):
     plot: Mapped[str]
     """The plot of the movie."""
 
+    poster_path: Mapped[Optional[str]] = mapped_column(default=None)
+    """The resolved poster URL of the movie, None until it has been looked up on TMDB."""
+
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', movie_name), 'A') || setweight(to_tsvector('english', plot), 'B')",
+            persisted=True
+        ),
+        deferred=True
+    )
+    """The full-text search document of the movie name and plot, generated by the database."""
+
     def __init__(
         self,
         movie_name: str,
@@ -100,6 +138,149 @@ class Movie(Base):
         return (f"<Movie(movie_id={self.movie_id}, movie_name='{self.movie_name}', rating={self.rating}, "
                 f"runtime={self.runtime})>")
 
+    @staticmethod
+    def load_options(field_names: Optional[Collection[str]] = None) -> list[Any]:
+        """
+        Get the loader options of a movie query that only loads the given fields.
+
+        The id is always loaded and the poster path brings the name along for the TMDB lookup. The genres
+        are only loaded, in one extra query, when they are asked for.
+        :param field_names: The names of the columns and relationships to load, all of them if None.
+        :return: The options for the query.
+        """
+        if field_names is None:
+            return [selectinload(Movie.genres)]
+
+        names = {"movie_id", *field_names}
+        if "poster_path" in names:
+            names.add("movie_name")
+        options: list[Any] = [
+            load_only(*(getattr(Movie, name) for name in sorted(names) if name in Movie.__table__.columns))
+        ]
+        if "genres" in names:
+            options.append(selectinload(Movie.genres))
+        return options
+
+    @staticmethod
+    def get_movies_sorted(
+        db_session: Session,
+        sort_by: str = "rating",
+        amount: int = 10,
+        after: Optional[tuple[Optional[Union[int, float]], int]] = None,
+        field_names: Optional[Collection[str]] = None
+    ) -> list["Movie"]:
+        """
+        Get a page of movies sorted from high to low on a column, ties are broken by movie id.
+
+        The ordering and limit are done in the database, backed by the sort indexes on the movies table.
+        Movies without a value for the column come last.
+        :param db_session: The database session.
+        :param sort_by: The column to sort on, one of SORT_COLUMNS.
+        :param amount: The number of movies to return.
+        :param after: The (sort value, movie id) of the last movie of the previous page, None for the first page.
+        :param field_names: The fields to load besides the sort column, all of them if None.
+        :return: List of movies.
+        """
+        assert sort_by in SORT_COLUMNS, f"sort_by must be one of {', '.join(SORT_COLUMNS)}"
+        column = getattr(Movie, sort_by)
+
+        # The sort column is always loaded, the cursor of the next page is made from it
+        query = db_session.query(Movie).options(
+            *Movie.load_options(None if field_names is None else [*field_names, sort_by])
+        )
+        if after is not None:
+            value, movie_id = after
+            if value is None:
+                query = query.filter(and_(column.is_(None), Movie.movie_id < movie_id))
+            else:
+                query = query.filter(or_(tuple_(column, Movie.movie_id) < (value, movie_id), column.is_(None)))
+
+        return query.order_by(column.desc().nullslast(), Movie.movie_id.desc()).limit(amount).all()
+
+    @staticmethod
+    def get_movies_by_ids(
+        db_session: Session,
+        movie_ids: list[int],
+        field_names: Optional[Collection[str]] = None
+    ) -> list["Movie"]:
+        """
+        Get the movies with the given ids, with their genres loaded in one extra query.
+        :param db_session: The database session.
+        :param movie_ids: The ids of the movies.
+        :param field_names: The fields to load, all of them if None.
+        :return: List of the movies that exist, in no particular order.
+        """
+        return (
+            db_session.query(Movie)
+            .options(*Movie.load_options(field_names))
+            .filter(Movie.movie_id.in_(movie_ids))
+            .all()
+        )
+
+    @staticmethod
+    def iter_movies_by_ids(
+        db_session: Session,
+        movie_ids: list[int],
+        chunk_size: int = 500,
+        field_names: Optional[Collection[str]] = None
+    ) -> Iterator[list["Movie"]]:
+        """
+        Stream the movies with the given ids from a server-side cursor, chunk_size movies at a time.
+
+        The ids are sent as a single array parameter, so the list can have any length, and the genres are
+        loaded per chunk. The cursor lives in the current transaction, so do not commit before it is exhausted.
+        :param db_session: The database session.
+        :param movie_ids: The ids of the movies.
+        :param chunk_size: The number of movies fetched from the cursor at a time.
+        :param field_names: The fields to load, all of them if None.
+        :return: Iterator over chunks of the movies that exist, ordered by id.
+        """
+        query = (
+            select(Movie)
+            .options(*Movie.load_options(field_names))
+            .where(Movie.movie_id == any_(bindparam("movie_ids", movie_ids, type_=ARRAY(Integer))))
+            .order_by(Movie.movie_id)
+            .execution_options(yield_per=chunk_size)
+        )
+        for chunk in db_session.execute(query).scalars().partitions():
+            yield list(chunk)
+
+    @staticmethod
+    def search(
+        db_session: Session,
+        text: str,
+        amount: int = 10,
+        after: Optional[tuple[float, int]] = None,
+        field_names: Optional[Collection[str]] = None
+    ) -> list[tuple["Movie", float]]:
+        """
+        Search movies on their name and plot, the best matches first. Matches in the name weigh more.
+
+        The matches are found through the GIN index on the search vector, ties in rank are broken by movie id.
+        :param db_session: The database session.
+        :param text: The search text, in web search syntax (quoted phrases, 'or' and '-' to exclude).
+        :param amount: The number of movies to return.
+        :param after: The (rank, movie id) of the last movie of the previous page, None for the first page.
+        :param field_names: The fields to load, all of them if None.
+        :return: List of (movie, rank) pairs.
+        """
+        ts_query = func.websearch_to_tsquery("english", text)
+        # ts_rank_cd is a real, compare it as the double precision the cursor holds, or ties would be skipped
+        rank = cast(func.ts_rank_cd(Movie.search_vector, ts_query), DOUBLE_PRECISION)
+
+        query = (
+            db_session.query(Movie, rank)
+            .options(*Movie.load_options(field_names))
+            .filter(Movie.search_vector.bool_op("@@")(ts_query))
+        )
+        if after is not None:
+            query = query.filter(tuple_(rank, Movie.movie_id) < after)
+
+        return [
+            (movie, float(movie_rank))
+            for movie, movie_rank in query.order_by(rank.desc(), Movie.movie_id.desc()).limit(amount).all()
+        ]
+
     @staticmethod
     def get_recommended_movies_by_rating(db_session: Session, amount: int = 10) -> list["Movie"]:
         """
@@ -108,65 +289,134 @@ class Movie(Base):
         :param amount: The number of recommended movies to return.
         :return: List of recommended movies.
         """
-        recommended_movies = db_session.query(Movie).order_by(Movie.rating.desc()).limit(amount).all()
+        recommended_movies = (
+            db_session.query(Movie)
+            .options(selectinload(Movie.genres))
+            .order_by(Movie.rating.desc())
+            .limit(amount)
+            .all()
+        )
         return recommended_movies
 
+    @staticmethod
+    def count_friend_movies(friends_watched: dict[int, list[int]], self_watched: list[int]) -> dict[int, int]:
+        """
+        Count how many times friends watched every movie the user has not watched yet.
+        :param friends_watched: A dictionary where keys are friend IDs and values are lists of movie IDs.
+        :param self_watched: A list of movie IDs that the user has already watched.
+        :return: The watch count per unwatched movie id.
+        """
+        movie_counter = Counter(chain.from_iterable(friends_watched.values()))
+        excluded = set(self_watched)
+        return {movie_id: count for movie_id, count in movie_counter.items() if movie_id not in excluded}
+
     @staticmethod
     def get_recommended_movies_by_friends(
         friends_watched: dict[int, list[int]],
         self_watched: list[int],
         db_session: Session,
-        amount: int = 10
+        amount: int = 10,
+        field_names: Optional[Collection[str]] = None
     ) -> list["Movie"]:
         """
         Get recommended movies based on which movies friends have watched.
+
+        The counts are sent to the database as two arrays, which sorts on them and only returns the top movies.
         :param friends_watched: A dictionary where keys are friend IDs and values are lists of movie IDs.
         :param self_watched: A list of movie IDs that the user has already watched.
         :param db_session: The database session.
         :param amount: The number of recommended movies to return.
-        :return: List of recommended movies.
+        :param field_names: The fields to load, all of them if None.
+        :return: List of recommended movies, the most watched first and ties by movie id.
         """
-        # Get movie_ids watched by friends
-        movie_counter: Counter[int] = Counter()
+        counts = Movie.count_friend_movies(friends_watched, self_watched)
+        friend_counts = func.unnest(
+            bindparam("movie_ids", list(counts.keys()), type_=ARRAY(Integer)),
+            bindparam("friend_counts", list(counts.values()), type_=ARRAY(Integer)),
+        ).table_valued("movie_id", "friend_count").render_derived()
 
-        for friend_id in friends_watched.keys():
-            for movie_id in friends_watched[friend_id]:
-                movie_counter.update([movie_id])
+        query = (
+            select(Movie)
+            .join(friend_counts, Movie.movie_id == friend_counts.c.movie_id)
+            .options(*Movie.load_options(field_names))
+            .order_by(friend_counts.c.friend_count.desc(), Movie.movie_id)
+            .limit(max(amount, 0))
+        )
+        return list(db_session.execute(query).scalars().all())
 
-        # Exclude movies already watched by the user
-        candidate_ids = [movie_id for movie_id, _ in movie_counter.most_common() if movie_id not in self_watched]
+    def get_poster_path(self) -> str:
+        """
+        Get the path to the movie poster.
 
-        if not candidate_ids:
-            return []
+        The poster URL is looked up on TMDB the first time and stored on the movie, so every later call
+        is served from the database. Failed lookups fall back to the default poster without storing it,
+        so they are retried on the next call.
+        :return: The path to the movie poster.
+        """
+        if self.poster_path is not None:
+            return self.poster_path
 
-        result_amount = min(amount, len(candidate_ids))
+        try:
+            poster_path = Movie.fetch_poster_path(self.movie_name)
+        except (requests.RequestException, ValueError):
+            return DEFAULT_POSTER_PATH
 
-        # Query top N recommended movies in a single query
-        recommended_movies = (
-            db_session.query(Movie)
-            .filter(Movie.movie_id.in_(candidate_ids))
-            .all()
-        )
+        self.poster_path = poster_path
+        return poster_path
+
+    @staticmethod
+    def resolve_poster_paths(movies: list["Movie"], timeout: float = POSTER_BATCH_TIMEOUT) -> None:
+        """
+        Resolve the poster paths of a list of movies concurrently.
+
+        Movies without a stored poster are looked up on TMDB at the same time through the poster thread pool.
+        The lookups only do HTTP work, the results are stored on the movies in the calling thread.
+        Lookups that fail or are not done within the timeout are left unresolved, so they show the default poster.
+        :param movies: The movies to resolve the poster paths for.
+        :param timeout: The maximum number of seconds to wait for the lookups.
+        """
+        missing: dict[str, list[Movie]] = {}
+        for movie in movies:
+            if movie.poster_path is None:
+                missing.setdefault(movie.movie_name, []).append(movie)
 
-        # Maintain ordering based on friend popularity
-        recommended_movies.sort(key=lambda m: movie_counter[m.movie_id], reverse=True)
+        if not missing:
+            return
 
-        return recommended_movies[:result_amount]
+        futures: dict[Future[str], str] = {
+            poster_executor.submit(Movie.fetch_poster_path, movie_name): movie_name for movie_name in missing
+        }
+        done, _ = wait(futures, timeout=timeout)
 
-    def get_poster_path(self) -> str:
+        for future in done:
+            if future.exception() is not None:
+                continue
+            for movie in missing[futures[future]]:
+                movie.poster_path = future.result()
+
+    @staticmethod
+    def fetch_poster_path(movie_name: str) -> str:
         """
-        Get the path to the movie poster.
-        :return: The path to the movie poster.
+        Look up the poster URL of a movie on TMDB.
+        :param movie_name: The name of the movie to search for.
+        :return: The poster URL, or the default poster if TMDB has no poster for the movie.
+        :raises requests.RequestException: If the TMDB request fails.
         """
-        response = requests.get(
-            'https://api.themoviedb.org/3/search/movie',
-            params={'query': self.movie_name},
+        response = tmdb_session.get(
+            TMDB_SEARCH_URL,
+            params={'query': movie_name},
             headers=API_HEADERS,
             timeout=1
         )
-        data = response.json()
-        results = data.get('results', [])
-        if not results:
-            return "https://image.tmdb.org/t/p/w500/dz3AjGWAPV4cK8lRDY0DdaVfGUK.jpg"
-        poster_path = data['results'][0]['poster_path']
-        return f"https://image.tmdb.org/t/p/w500{poster_path}"
+        response.raise_for_status()
+        results = response.json().get('results', [])
+        if not results or not results[0].get('poster_path'):
+            return DEFAULT_POSTER_PATH
+        return f"{TMDB_IMAGE_URL}{results[0]['poster_path']}"
+
+
+# Indexes matching the ordering of Movie.get_movies_sorted, so every page is an index range scan
+Index("ix_movies_rating_movie_id", Movie.rating.desc().nullslast(), Movie.movie_id.desc())
+Index("ix_movies_meta_score_movie_id", Movie.meta_score.desc().nullslast(), Movie.movie_id.desc())
+Index("ix_movies_runtime_movie_id", Movie.runtime.desc().nullslast(), Movie.movie_id.desc())
+Index("ix_movies_search_vector", Movie.search_vector, postgresql_using="gin")
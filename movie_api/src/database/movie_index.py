@@ -0,0 +1,177 @@
+"""
+In-memory index of the movie catalog for filtered and faceted browsing.
+
+The catalog is static after it is loaded, so the index is built once: one bitmap per genre and one
+pre-sorted order per sort column. A filtered query is then a few vectorized array operations instead of
+joins over the has_genre table.
+"""
+import threading
+from typing import Optional, Union
+
+import numpy as np
+import numpy.typing as npt
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from src.database.models import Movie, Genre
+from src.database.models.movie import movie_genre_association, SORT_COLUMNS
+
+Mask = npt.NDArray[np.bool_]
+
+
+class MovieIndex:
+    """
+    Column arrays of the catalog with a bitmap per genre, positions are shared between all arrays.
+    """
+
+    def __init__(
+        self,
+        movie_ids: npt.NDArray[np.int64],
+        columns: dict[str, npt.NDArray[np.float64]],
+        genre_masks: dict[int, Mask],
+        genre_names: dict[int, str]
+    ) -> None:
+        """
+        Initialize a MovieIndex object.
+        :param movie_ids: The movie id at every position.
+        :param columns: The values of every sort column at every position, NaN when the movie has no value.
+        :param genre_masks: Per genre id, whether the movie at every position has the genre.
+        :param genre_names: The name of every genre id.
+        """
+        self.movie_ids = movie_ids
+        self.columns = columns
+        self.genre_masks = genre_masks
+        self.genre_names = genre_names
+        self.genre_ids_by_name = {genre_name: genre_id for genre_id, genre_name in genre_names.items()}
+
+        # Positions sorted from high to low value, without values last and ties by movie id high to low
+        self.orders = {
+            column: np.lexsort((-movie_ids, np.where(np.isnan(values), np.inf, -values)))
+            for column, values in columns.items()
+        }
+
+    @staticmethod
+    def build(db_session: Session) -> "MovieIndex":
+        """
+        Build the index from the movies in the database.
+        :param db_session: The database session.
+        :return: The index.
+        """
+        rows = db_session.query(Movie.movie_id, *(getattr(Movie, column) for column in SORT_COLUMNS)).all()
+        movie_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        columns = {
+            column: np.array([np.nan if row[i] is None else row[i] for row in rows], dtype=np.float64)
+            for i, column in enumerate(SORT_COLUMNS, start=1)
+        }
+
+        positions = {int(movie_id): position for position, movie_id in enumerate(movie_ids)}
+        genre_names: dict[int, str] = dict(db_session.query(Genre.genre_id, Genre.genre_name).tuples().all())
+        genre_masks = {genre_id: np.zeros(len(movie_ids), dtype=np.bool_) for genre_id in genre_names}
+        for movie_id, genre_id in db_session.execute(select(movie_genre_association)).all():
+            if movie_id in positions and genre_id in genre_masks:
+                genre_masks[genre_id][positions[movie_id]] = True
+
+        return MovieIndex(movie_ids, columns, genre_masks, genre_names)
+
+    def filter(
+        self,
+        genres: Optional[list[str]] = None,
+        match_all_genres: bool = True,
+        min_rating: Optional[float] = None,
+        max_runtime: Optional[int] = None,
+        min_meta_score: Optional[int] = None
+    ) -> Mask:
+        """
+        Get the movies that match all the given filters.
+        :param genres: The genre names to filter on.
+        :param match_all_genres: Whether a movie must have all the genres, or at least one of them.
+        :param min_rating: The minimum rating.
+        :param max_runtime: The maximum runtime in minutes.
+        :param min_meta_score: The minimum meta score, movies without a meta score do not match.
+        :return: Whether the movie at every position matches.
+        """
+        mask = np.ones(len(self.movie_ids), dtype=np.bool_)
+        if genres:
+            empty = np.zeros(len(self.movie_ids), dtype=np.bool_)
+            genre_masks = [self.genre_masks.get(self.genre_ids_by_name.get(name, -1), empty) for name in genres]
+            if match_all_genres:
+                mask &= np.logical_and.reduce(genre_masks)
+            else:
+                mask &= np.logical_or.reduce(genre_masks)
+        # Comparisons with NaN are False, so movies without a value never match a bound
+        if min_rating is not None:
+            mask &= self.columns["rating"] >= min_rating
+        if max_runtime is not None:
+            mask &= self.columns["runtime"] <= max_runtime
+        if min_meta_score is not None:
+            mask &= self.columns["meta_score"] >= min_meta_score
+        return mask
+
+    def facets(self, mask: Mask) -> list[tuple[int, str, int]]:
+        """
+        Count the matching movies per genre.
+        :param mask: The matching movies.
+        :return: List of (genre id, genre name, count) for the genres with at least one match, largest first.
+        """
+        counts = [
+            (genre_id, self.genre_names[genre_id], int(np.count_nonzero(genre_mask & mask)))
+            for genre_id, genre_mask in self.genre_masks.items()
+        ]
+        return sorted((facet for facet in counts if facet[2] > 0), key=lambda facet: (-facet[2], facet[1]))
+
+    def sorted_movie_ids(
+        self,
+        mask: Mask,
+        sort_by: str = "rating",
+        amount: int = 10,
+        after: Optional[tuple[Optional[Union[int, float]], int]] = None
+    ) -> list[int]:
+        """
+        Get a page of the matching movie ids, in the same order as Movie.get_movies_sorted.
+        :param mask: The matching movies.
+        :param sort_by: The column to sort on, one of SORT_COLUMNS.
+        :param amount: The number of movie ids to return.
+        :param after: The (sort value, movie id) of the last movie of the previous page, None for the first page.
+        :return: List of movie ids.
+        """
+        order = self.orders[sort_by]
+        order = order[mask[order]]
+        if after is not None:
+            value, movie_id = after
+            values = self.columns[sort_by][order]
+            ids = self.movie_ids[order]
+            if value is None:
+                keep = np.isnan(values) & (ids < movie_id)
+            else:
+                keep = (values < value) | ((values == value) & (ids < movie_id)) | np.isnan(values)
+            order = order[keep]
+        return [int(movie_id) for movie_id in self.movie_ids[order[:amount]]]
+
+
+_movie_index: Optional[MovieIndex] = None
+_movie_index_lock = threading.Lock()
+
+
+def rebuild_movie_index(db_session: Session) -> MovieIndex:
+    """
+    Build the movie index from the database and use it for all following queries.
+    :param db_session: The database session.
+    :return: The new index.
+    """
+    global _movie_index  # pylint: disable=global-statement
+    index = MovieIndex.build(db_session)
+    with _movie_index_lock:
+        _movie_index = index
+    return index
+
+
+def get_movie_index(db_session: Session) -> MovieIndex:
+    """
+    Get the movie index, building it first if it has not been built yet.
+    :param db_session: The database session, used when the index still has to be built.
+    :return: The index.
+    """
+    with _movie_index_lock:
+        index = _movie_index
+    if index is None:
+        index = rebuild_movie_index(db_session)
+    return index
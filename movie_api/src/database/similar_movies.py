@@ -0,0 +1,355 @@
+"""
+Precomputed content-based nearest neighbours of every movie.
+
+Every movie gets a feature vector of its genres, its rating and runtime and a hashed TF-IDF of its plot.
+The K most similar movies by cosine similarity are computed for the whole catalog at once with NumPy and
+stored as flat arrays, which the workers memory-map, so a similar movies request is an array slice.
+It can also be run on its own:
+
+    python -m src.database.similar_movies
+"""
+import fcntl
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+import numpy.typing as npt
+from confz import EnvSource
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+from src.config import APIConfig
+from src.database.models import Movie
+from src.database.models.movie import movie_genre_association
+
+SIMILAR_MOVIES_DIR = os.getenv("SIMILAR_MOVIES_DIR", os.path.join(tempfile.gettempdir(), "movie_similar"))
+"""The directory the similar movies tables are stored in, shared by all workers on the host."""
+
+TOP_K = 20
+"""The number of similar movies stored per movie."""
+
+PLOT_FEATURES = 1024
+"""The number of hash buckets of the plot TF-IDF vectors."""
+
+GENRE_WEIGHT = 1.0
+PLOT_WEIGHT = 1.0
+NUMERIC_WEIGHT = 0.3
+"""The weights of the feature groups, every group is normalized to unit length before weighting."""
+
+BLOCK_SIZE = 1024
+"""The number of movies whose similarities are computed at a time, to bound the memory use."""
+
+VERSION_CHECK_INTERVAL = 30.0
+"""The number of seconds a table is used before checking for a newer one."""
+
+WORD_PATTERN = re.compile(r"[a-z][a-z']+")
+
+Matrix = npt.NDArray[np.float32]
+
+
+def normalize_rows(matrix: Matrix) -> Matrix:
+    """
+    Scale every row to unit length, rows of zeros stay zero.
+    :param matrix: The matrix.
+    :return: The normalized matrix.
+    """
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    normalized: Matrix = np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+    return normalized
+
+
+def hashed_tfidf(texts: list[str], features: int = PLOT_FEATURES) -> Matrix:
+    """
+    Compute TF-IDF vectors of texts, with the words hashed into a fixed number of buckets.
+    :param texts: The texts.
+    :param features: The number of hash buckets.
+    :return: One unit length row per text.
+    """
+    rows: list[int] = []
+    buckets: list[int] = []
+    for row, text in enumerate(texts):
+        for word in WORD_PATTERN.findall(text.lower()):
+            rows.append(row)
+            buckets.append(zlib.crc32(word.encode()) % features)
+
+    counts = np.bincount(
+        np.array(rows, dtype=np.int64) * features + np.array(buckets, dtype=np.int64),
+        minlength=len(texts) * features
+    ).reshape(len(texts), features).astype(np.float32)
+
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(texts)) / (1 + document_frequency)).astype(np.float32) + 1
+    return normalize_rows(np.log1p(counts) * idf)
+
+
+def build_features(
+    genres: npt.NDArray[np.bool_],
+    ratings: npt.NDArray[np.float64],
+    runtimes: npt.NDArray[np.float64],
+    plots: list[str]
+) -> Matrix:
+    """
+    Build the unit length feature vector of every movie.
+    :param genres: Per movie, whether it has every genre.
+    :param ratings: The rating of every movie.
+    :param runtimes: The runtime of every movie.
+    :param plots: The plot of every movie.
+    :return: One row per movie.
+    """
+    numeric = np.column_stack([ratings, runtimes]).astype(np.float32)
+    std = numeric.std(axis=0)
+    numeric = (numeric - numeric.mean(axis=0)) / np.where(std > 0, std, 1)
+
+    return normalize_rows(np.hstack([
+        GENRE_WEIGHT * normalize_rows(genres.astype(np.float32)),
+        PLOT_WEIGHT * hashed_tfidf(plots),
+        NUMERIC_WEIGHT * normalize_rows(numeric),
+    ]))
+
+
+def top_k_neighbours(features: Matrix, k: int = TOP_K) -> tuple[npt.NDArray[np.int64], Matrix]:
+    """
+    Find the k most similar other rows of every row by cosine similarity.
+    :param features: The unit length feature vectors.
+    :param k: The number of neighbours, at most the number of rows minus one.
+    :return: The positions of the neighbours and their similarities, most similar first and ties by position.
+    """
+    count = len(features)
+    k = min(k, count - 1)
+    positions = np.empty((count, k), dtype=np.int64)
+    scores = np.empty((count, k), dtype=np.float32)
+    if k <= 0:
+        return positions, scores
+
+    for start in range(0, count, BLOCK_SIZE):
+        block = features[start:start + BLOCK_SIZE] @ features.T
+        rows = np.arange(len(block))
+        block[rows, start + rows] = -np.inf
+
+        candidates = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(block, candidates, axis=1)
+        order = np.lexsort((candidates, -candidate_scores), axis=1)
+        positions[start:start + len(block)] = np.take_along_axis(candidates, order, axis=1)
+        scores[start:start + len(block)] = np.take_along_axis(candidate_scores, order, axis=1)
+    return positions, scores
+
+
+class SimilarMovies:
+    """
+    Read-only table of the most similar movies of every movie.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        movie_ids: npt.NDArray[np.int64],
+        neighbour_ids: npt.NDArray[np.int64],
+        scores: Matrix
+    ) -> None:
+        """
+        Initialize a SimilarMovies object.
+        :param version: The name of the build the table was loaded from.
+        :param movie_ids: The sorted movie ids.
+        :param neighbour_ids: The ids of the most similar movies of every movie, most similar first.
+        :param scores: The cosine similarity of every neighbour.
+        """
+        self.version = version
+        self.movie_ids = movie_ids
+        self.neighbour_ids = neighbour_ids
+        self.scores = scores
+
+    @staticmethod
+    def build(db_session: Session, k: int = TOP_K) -> "SimilarMovies":
+        """
+        Compute the table from the movies in the database.
+        :param db_session: The database session.
+        :param k: The number of similar movies per movie.
+        :return: The table.
+        """
+        movies = (
+            db_session.query(Movie.movie_id, Movie.rating, Movie.runtime, Movie.plot).order_by(Movie.movie_id).all()
+        )
+        movie_ids = np.array([movie.movie_id for movie in movies], dtype=np.int64)
+
+        links = np.array(db_session.execute(select(movie_genre_association)).tuples().all(), dtype=np.int64)
+        genre_ids = np.unique(links[:, 1]) if len(links) else np.empty(0, dtype=np.int64)
+        genres = np.zeros((len(movie_ids), len(genre_ids)), dtype=np.bool_)
+        if len(links):
+            genres[np.searchsorted(movie_ids, links[:, 0]), np.searchsorted(genre_ids, links[:, 1])] = True
+
+        features = build_features(
+            genres,
+            np.array([movie.rating for movie in movies], dtype=np.float64),
+            np.array([movie.runtime for movie in movies], dtype=np.float64),
+            [movie.plot for movie in movies],
+        )
+        positions, scores = top_k_neighbours(features, k)
+        return SimilarMovies(str(time.time_ns()), movie_ids, movie_ids[positions], scores)
+
+    def write(self, directory: str) -> None:
+        """
+        Write the table to a directory.
+        :param directory: The directory to write the arrays to.
+        """
+        np.save(os.path.join(directory, "movie_ids.npy"), self.movie_ids)
+        np.save(os.path.join(directory, "neighbour_ids.npy"), self.neighbour_ids)
+        np.save(os.path.join(directory, "scores.npy"), self.scores)
+
+    @staticmethod
+    def open(directory: str) -> "SimilarMovies":
+        """
+        Memory-map the table in a directory.
+        :param directory: The directory of the table.
+        :return: The table.
+        """
+        return SimilarMovies(
+            os.path.basename(directory),
+            np.load(os.path.join(directory, "movie_ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "neighbour_ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "scores.npy"), mmap_mode="r"),
+        )
+
+    def similar(self, movie_id: int, amount: int = TOP_K) -> Optional[list[tuple[int, float]]]:
+        """
+        Get the most similar movies of a movie.
+        :param movie_id: The id of the movie.
+        :param amount: The number of similar movies, at most the K the table was built with.
+        :return: List of (movie id, similarity), most similar first, None if the movie is not in the table.
+        """
+        position = int(np.searchsorted(self.movie_ids, movie_id))
+        if position >= len(self.movie_ids) or self.movie_ids[position] != movie_id:
+            return None
+        return [
+            (int(neighbour_id), float(score))
+            for neighbour_id, score in zip(self.neighbour_ids[position, :amount], self.scores[position, :amount])
+        ]
+
+
+def read_current(similar_dir: str) -> Optional[str]:
+    """
+    Read the name of the current build.
+    :param similar_dir: The directory the tables are stored in.
+    :return: The directory name of the current build, None if nothing was built yet.
+    """
+    try:
+        with open(os.path.join(similar_dir, "CURRENT"), "r", encoding="utf-8") as current_file:
+            return current_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def build_number(name: str) -> int:
+    """
+    Get the number of a build from its directory name, builds that started later have higher numbers.
+    :param name: The directory name of the build, similar-<number>.
+    :return: The number, -1 if the name is not a build.
+    """
+    _, _, number = name.partition("similar-")
+    return int(number) if number.isdigit() else -1
+
+
+def build_similar_movies(
+    db_session: Session,
+    similar_dir: Optional[str] = None,
+    replace: bool = True
+) -> SimilarMovies:
+    """
+    Compute the similar movies table and make it the current one for all workers.
+
+    Every build gets its own directory and the name of the current one is swapped in atomically, so
+    workers never read a half written table. Building and publishing happen under a file lock, a build never
+    replaces a newer current build and only builds older than the published one are removed. Workers that still
+    have those mapped keep reading them until they switch.
+    :param db_session: The database session.
+    :param similar_dir: The directory the tables are stored in, SIMILAR_MOVIES_DIR if None.
+    :param replace: Whether to build a new table when there already is a current one.
+    :return: The new table, or the current one if it is not replaced.
+    """
+    similar_dir = similar_dir or SIMILAR_MOVIES_DIR
+    start = time.perf_counter()
+
+    os.makedirs(similar_dir, exist_ok=True)
+    with open(os.path.join(similar_dir, ".lock"), "w", encoding="utf-8") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            current = read_current(similar_dir)
+            if current is not None and not replace:
+                return SimilarMovies.open(os.path.join(similar_dir, current))
+
+            table = SimilarMovies.build(db_session)
+            name = f"similar-{table.version}"
+            temporary_directory = tempfile.mkdtemp(dir=similar_dir, prefix=".similar-")
+            table.write(temporary_directory)
+            os.rename(temporary_directory, os.path.join(similar_dir, name))
+
+            if current is None or build_number(current) < build_number(name):
+                with tempfile.NamedTemporaryFile(
+                    "w", dir=similar_dir, delete=False, encoding="utf-8"
+                ) as temporary_file:
+                    temporary_file.write(name)
+                os.replace(temporary_file.name, os.path.join(similar_dir, "CURRENT"))
+                current = name
+
+            for other in os.listdir(similar_dir):
+                if 0 <= build_number(other) < build_number(current):
+                    shutil.rmtree(os.path.join(similar_dir, other), ignore_errors=True)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    logging.info("Computed the similar movies of %d movies in %.2f seconds.", len(table.movie_ids),
+                 time.perf_counter() - start)
+    return table
+
+
+_similar_movies: Optional[SimilarMovies] = None
+_checked_at = 0.0
+_similar_movies_lock = threading.Lock()
+
+
+def get_similar_movies(similar_dir: Optional[str] = None) -> Optional[SimilarMovies]:
+    """
+    Get the current similar movies table, memory-mapping it the first time.
+
+    Whether a newer table was built is checked at most once every VERSION_CHECK_INTERVAL seconds.
+    :param similar_dir: The directory the tables are stored in, SIMILAR_MOVIES_DIR if None.
+    :return: The table, None if it has not been built yet.
+    """
+    global _similar_movies, _checked_at  # pylint: disable=global-statement
+    similar_dir = similar_dir or SIMILAR_MOVIES_DIR
+    with _similar_movies_lock:
+        if _similar_movies is not None and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+            return _similar_movies
+
+        try:
+            current = read_current(similar_dir)
+            if current is not None and (_similar_movies is None or _similar_movies.version != current):
+                _similar_movies = SimilarMovies.open(os.path.join(similar_dir, current))
+        except OSError:
+            # Not built yet, or replaced by a newer build while opening it
+            pass
+        _checked_at = time.monotonic()
+        return _similar_movies
+
+
+def reset_similar_movies() -> None:
+    """
+    Forget the current table, so the next call to get_similar_movies looks for the current one again.
+    """
+    global _similar_movies, _checked_at  # pylint: disable=global-statement
+    with _similar_movies_lock:
+        _similar_movies = None
+        _checked_at = 0.0
+
+
+if __name__ == '__main__':
+    config = APIConfig(config_sources=EnvSource(allow_all=True, nested_separator="__", file=".env"))
+    logging.basicConfig(level=config.logging.get_level())
+
+    with Session(create_engine(config.db.connection_url)) as session:
+        build_similar_movies(db_session=session)
@@ -11,6 +11,8 @@ from flask import Blueprint
 from flask_restx import Api
 from flask_restx.apidoc import apidoc
 
+from src.serializer import output_json
+
 
 def register_public_routes(app: Blueprint) -> None:
     """
@@ -31,6 +33,8 @@ def register_public_routes(app: Blueprint) -> None:
         description="API documentation for the Movie Service of the Distributed Systems project",
         doc='/'
     )
+    # Encode the JSON responses with orjson
+    api.representation("application/json")(output_json)
 
     # Get the current package's directory
     package_dir = os.path.dirname(__file__)
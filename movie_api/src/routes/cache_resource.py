@@ -0,0 +1,49 @@
+"""
+This module contains the API endpoint for the response cache statistics.
+"""
+from flask_restx import Namespace, Api, Resource, fields, marshal
+
+from src.cache import get_stats
+
+cache_api = Namespace("cache", description="Response cache operations")
+
+cache_stats_model = cache_api.model(
+    "CacheStats",
+    {
+        "view": fields.String(required=True, description="The cached view"),
+        "hit": fields.Integer(required=True, description="Responses served fresh from the cache"),
+        "stale": fields.Integer(required=True, description="Responses served stale while being refreshed"),
+        "miss": fields.Integer(required=True, description="Responses computed because they were not cached"),
+    },
+)
+
+cache_stats_list_model = cache_api.model(
+    "CacheStatsList",
+    {
+        "results": fields.List(fields.Nested(cache_stats_model)),
+    },
+)
+
+
+@cache_api.route("/stats")
+class CacheStatsResource(Resource):
+    """
+    Resource for the response cache statistics.
+    """
+
+    @cache_api.response(200, "Success", model=cache_stats_list_model)
+    def get(self):
+        """
+        Get the hit, stale and miss counts of every cached view, over all workers sharing the cache.
+        """
+        return marshal({"results": get_stats()}, cache_stats_list_model)
+
+
+def register_routes(api_blueprint: Api) -> None:
+    """
+    Register the cache API routes with the provided Flask application blueprint.
+
+    :param api_blueprint: The Flask application blueprint
+    :return: None
+    """
+    api_blueprint.add_namespace(cache_api)
@@ -0,0 +1,49 @@
+"""
+This module contains the API endpoint that reports whether the service is ready to serve the catalog.
+"""
+from flask_restx import Namespace, Api, Resource, fields, marshal
+
+from src.database.catalog_loader import catalog_loader
+
+health_api = Namespace("health", description="Service health operations")
+
+readiness_model = health_api.model(
+    "Readiness",
+    {
+        "status": fields.String(required=True, description="The stage of loading the catalog"),
+        "ready": fields.Boolean(required=True, description="Whether the catalog routes are served"),
+        "rows_loaded": fields.Integer(required=True, description="The number of movies inserted so far"),
+        "rows_total": fields.Integer(required=True, description="The number of movies to insert"),
+        "rows_per_second": fields.Float(required=True, description="The number of movies inserted per second"),
+        "elapsed_seconds": fields.Float(required=True, description="The number of seconds the movies have loaded"),
+        "error": fields.String(description="Why loading the catalog failed"),
+    },
+)
+
+
+@health_api.route("/ready")
+class ReadinessResource(Resource):
+    """
+    Resource for the readiness of the service.
+    """
+
+    @health_api.response(200, "Ready", model=readiness_model)
+    @health_api.response(503, "The catalog is still loading or could not be loaded", model=readiness_model)
+    def get(self):
+        """
+        Report whether the catalog is loaded, with the progress of the load.
+        """
+        result = marshal(catalog_loader.progress(), readiness_model)
+        if result["ready"]:
+            return result
+        return result, 503, {"Retry-After": str(catalog_loader.retry_after())}
+
+
+def register_routes(api_blueprint: Api) -> None:
+    """
+    Register the health API routes with the provided Flask application blueprint.
+
+    :param api_blueprint: The Flask application blueprint
+    :return: None
+    """
+    api_blueprint.add_namespace(health_api)
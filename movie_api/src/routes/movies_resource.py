@@ -1,15 +1,43 @@
 """
 This module contains the database access class that contains all the access methods
 """
-from flask_restx import Namespace, Api, Resource, fields, marshal
+import base64
+import binascii
+import hashlib
+import json
+from functools import lru_cache, wraps
+from typing import Any, Callable, Iterable, Iterator, Optional, Union
+
+import numpy as np
+from flask import Response, request, stream_with_context
+from flask_restx import Namespace, Api, Model, Resource, fields
 from src.database import db, Movie
-from src.cache import cache
+from src.database.models.movie import DEFAULT_POSTER_PATH, SORT_COLUMNS
+from src.database.movie_index import MovieIndex, get_movie_index
+from src.database.catalog_loader import require_catalog
+from src.database.catalog_snapshot import CatalogSnapshot, get_catalog_snapshot
+from src.database.similar_movies import TOP_K, get_similar_movies
+from src.cache import cached
+from src.serializer import compile_model, dumps, serialize
 from src.limiter import limiter
 
 # pylint: disable=no-member
 
 
-movies_api = Namespace("", description="Movie Operations")
+# The catalog routes answer 503 until the catalog is loaded
+movies_api = Namespace("", description="Movie Operations", decorators=[require_catalog])
+
+MAX_PAGE_SIZE = 20
+"""The maximum number of movies returned per page."""
+
+BATCH_CHUNK_SIZE = 500
+"""The number of movies the batch route fetches from the database cursor and sends at a time."""
+
+CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+"""Lets nginx and browsers reuse movie responses for a minute, after that they revalidate with the ETag."""
+
+UNRESOLVED_POSTERS = "movie_api.unresolved_posters"
+"""The WSGI environ key that marks a request whose response shows the default poster after a failed lookup."""
 
 get_movies_parser = movies_api.parser()
 get_movies_parser.add_argument(
@@ -21,6 +49,25 @@ get_movies_parser.add_argument(
 get_movies_parser.add_argument(
     "movie_ids", type=int, action="append", help="List of movie ids to fetch", required=False
 )
+get_movies_parser.add_argument(
+    "sort_by", type=str, default="rating", choices=SORT_COLUMNS, help="Column to sort the movies on, high to low"
+)
+get_movies_parser.add_argument(
+    "cursor", type=str, required=False, help="The 'next' cursor of the previous page, to fetch the next page"
+)
+get_movies_parser.add_argument(
+    "genre", type=str, action="append", required=False, help="Genre name to filter on, can be repeated"
+)
+get_movies_parser.add_argument(
+    "genre_mode", type=str, default="all", choices=("all", "any"),
+    help="Whether movies need all the given genres or at least one of them"
+)
+get_movies_parser.add_argument("min_rating", type=float, required=False, help="Minimum rating")
+get_movies_parser.add_argument("max_runtime", type=int, required=False, help="Maximum runtime in minutes")
+get_movies_parser.add_argument("min_meta_score", type=int, required=False, help="Minimum meta score")
+
+FILTER_ARGUMENTS = ("genre", "min_rating", "max_runtime", "min_meta_score")
+"""The list arguments that filter the movies, using any of them also returns the genre facets."""
 
 genre_model = movies_api.model(
     "Genre",
@@ -36,7 +83,9 @@ movie_model = movies_api.model(
         "movie_id": fields.Integer(description="Movie ID"),
         "movie_name": fields.String(description="Movie title"),
         "plot": fields.String(description="Movie plot"),
-        "poster_path": fields.String(description="Poster path", attribute=lambda m: m.get_poster_path()),
+        "poster_path": fields.String(
+            description="Poster path", attribute=lambda m: m.poster_path or DEFAULT_POSTER_PATH
+        ),
         "rating": fields.Float(description="Vote average"),
         "genres": fields.List(fields.Nested(genre_model), description="List of genres"),
         "meta_score": fields.Integer(description="Meta score"),
@@ -44,13 +93,70 @@ movie_model = movies_api.model(
     },
 )
 
+facet_model = movies_api.model(
+    "GenreFacet",
+    {
+        "genre_id": fields.Integer(description="Genre ID"),
+        "genre_name": fields.String(description="Genre name"),
+        "count": fields.Integer(description="Number of movies matching the filters with this genre"),
+    },
+)
+
 movie_list_model = movies_api.model(
     "MovieList",
     {
         "results": fields.List(fields.Nested(movie_model), description="List of movies"),
+        "next": fields.String(description="Cursor for the next page, null on the last page"),
+        "facets": fields.List(
+            fields.Nested(facet_model), description="Movie counts per genre for the filters, only when filtering"
+        ),
     }
 )
 
+search_movies_parser = movies_api.parser()
+search_movies_parser.add_argument(
+    "q", type=str, required=True, help="Text to search for in the movie names and plots"
+)
+search_movies_parser.add_argument(
+    "amount", type=int, default=10, help="Number of movies to fetch, minimum 1, maximum 20"
+)
+search_movies_parser.add_argument(
+    "cursor", type=str, required=False, help="The 'next' cursor of the previous page, to fetch the next page"
+)
+
+similar_movies_parser = movies_api.parser()
+similar_movies_parser.add_argument(
+    "amount", type=int, default=10, help=f"Number of similar movies to fetch, minimum 1, maximum {TOP_K}"
+)
+
+movie_batch_model = movies_api.model(
+    "MovieBatch",
+    {
+        "movie_ids": fields.List(fields.Integer, required=True, description="The ids of the movies to fetch"),
+    },
+)
+
+friends_recommendation_model = movies_api.model(
+    "FriendsRecommendation",
+    {
+        "friends_watched": fields.Raw(
+            required=True, description="The ids of the movies every friend watched, keyed by friend id",
+            example={"2": [1, 2], "3": [2, 4]}
+        ),
+        "self_watched": fields.List(fields.Integer, description="The ids of the movies the user watched"),
+        "amount": fields.Integer(
+            default=10, description=f"Number of movies to fetch, minimum 1, maximum {MAX_PAGE_SIZE}"
+        ),
+    },
+)
+
+movie_fields_parser = movies_api.parser()
+for parser in (get_movies_parser, search_movies_parser, similar_movies_parser, movie_fields_parser):
+    parser.add_argument(
+        "fields", type=str, action="split", location="args", required=False,
+        help=f"Comma separated fields to return, out of {', '.join(movie_model)}, all fields if not given"
+    )
+
 score_plot_parser = movies_api.parser()
 score_plot_parser.add_argument(
     "movie_ids",
@@ -68,31 +174,508 @@ is_favorite_model = movies_api.model(
 )
 
 
+def encode_cursor(value: Optional[Union[int, float]], movie_id: int) -> str:
+    """
+    Encode the position of a movie in a sorted list as an opaque cursor.
+    :param value: The value the list is sorted on of the last movie of a page.
+    :param movie_id: The id of the last movie of a page.
+    :return: The cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([value, movie_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[Optional[Union[int, float]], int]:
+    """
+    Decode a cursor into the (sort value, movie id) position it was made from.
+    :param cursor: The cursor.
+    :return: The position of the last movie of the previous page.
+    :raises ValueError: If the cursor is not a valid cursor.
+    """
+    try:
+        value, movie_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(movie_id, int) or not (value is None or isinstance(value, (int, float))):
+        raise ValueError("Invalid cursor")
+    return value, movie_id
+
+
+def parse_fields(args: dict[str, Any]) -> Optional[tuple[str, ...]]:
+    """
+    Read the fields a movie request asks for, answering 400 when one of them does not exist.
+    :param args: The parsed request arguments.
+    :return: The requested fields in the order of the movie model and always with the id, None for all fields.
+    """
+    field_names = {field_name.strip() for field_name in args.get("fields") or [] if field_name.strip()}
+    if not field_names:
+        return None
+    unknown = field_names.difference(movie_model)
+    if unknown:
+        movies_api.abort(400, f"Unknown fields: {', '.join(sorted(unknown))}.")
+    return tuple(field_name for field_name in movie_model if field_name == "movie_id" or field_name in field_names)
+
+
+@lru_cache(maxsize=None)
+def projected_models(field_names: Optional[tuple[str, ...]]) -> tuple[Model, Model]:
+    """
+    Get the movie model and the movie list model with only the requested fields.
+
+    The models are kept for the lifetime of the process, so their compiled serializers are reused.
+    :param field_names: The requested fields, None for all fields.
+    :return: The movie model and the movie list model.
+    """
+    if field_names is None:
+        return movie_model, movie_list_model
+    projection = Model("Movie", {field_name: movie_model[field_name] for field_name in field_names})
+    return projection, Model("MovieList", {**movie_list_model, "results": fields.List(fields.Nested(projection))})
+
+
+def resolve_posters(movie_list: list[Movie], field_names: Optional[tuple[str, ...]]) -> None:
+    """
+    Resolve the poster paths of database movies, unless the request does not ask for them.
+    :param movie_list: The movies.
+    :param field_names: The requested fields, None for all fields.
+    """
+    if field_names is None or "poster_path" in field_names:
+        Movie.resolve_poster_paths(movie_list)
+        mark_unresolved_posters(movie.poster_path for movie in movie_list)
+
+
+def mark_unresolved_posters(poster_paths: Iterable[Optional[str]]) -> None:
+    """
+    Remember for the current request that a poster could not be resolved, so the default poster in its
+    response is neither cached nor sent with an ETag, and the next request tries the lookup again.
+    :param poster_paths: The poster paths of the response after resolving them, None for an unresolved poster.
+    """
+    if any(poster_path is None for poster_path in poster_paths):
+        request.environ[UNRESOLVED_POSTERS] = True
+
+
+def posters_resolved(_: Any = None) -> bool:
+    """
+    Check whether every poster of the current response was resolved, the response filter of the movie views.
+    :return: False if the response shows the default poster because a lookup failed.
+    """
+    return not request.environ.get(UNRESOLVED_POSTERS, False)
+
+
+def catalog_version() -> str:
+    """
+    Get the version of the catalog snapshot, so cached responses of an older catalog are not used.
+    :return: The catalog version, "0" when there is no snapshot.
+    """
+    snapshot = get_catalog_snapshot()
+    return str(snapshot.version if snapshot is not None else 0)
+
+
+def conditional(etag_parts: Callable[..., list[Any]]):
+    """
+    Send a strong ETag and Cache-Control header with the responses of a movie view, and answer a matching
+    If-None-Match with 304 Not Modified without running the view.
+
+    The ETag is derived from the catalog version and the parts of the request that select the movies, so it
+    changes whenever one of the movies could have changed. Without a catalog snapshot no ETag is sent, and
+    neither is it for a response with a poster that could not be resolved, whose body changes once it is.
+    :param etag_parts: Returns the parts of the request that select the movies, called with the view arguments.
+    :return: The decorator.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            snapshot = get_catalog_snapshot()
+            if snapshot is None:
+                return view(*args, **kwargs)
+
+            parts = json.dumps([snapshot.version, *etag_parts(**kwargs)], separators=(",", ":"))
+            etag = hashlib.sha256(parts.encode()).hexdigest()[:32]
+            headers = {"ETag": f'"{etag}"', "Cache-Control": CACHE_CONTROL}
+            if request.if_none_match.contains(etag):
+                return Response(status=304, headers=headers)
+            response = view(*args, **kwargs)
+            if not posters_resolved():
+                return response
+            return response, 200, headers
+
+        return wrapper
+
+    return decorator
+
+
+def filter_index(index: MovieIndex, args: dict[str, Any]) -> tuple[Any, Optional[list[dict[str, Any]]]]:
+    """
+    Apply the filter arguments of a list request to the movie index.
+    :param index: The movie index.
+    :param args: The parsed list arguments.
+    :return: The matching movies and the genre facets, the facets are None when no filter was given.
+    """
+    if all(args.get(argument) is None for argument in FILTER_ARGUMENTS):
+        return index.filter(), None
+
+    mask = index.filter(
+        genres=args.get("genre"),
+        match_all_genres=args.get("genre_mode") != "any",
+        min_rating=args.get("min_rating"),
+        max_runtime=args.get("max_runtime"),
+        min_meta_score=args.get("min_meta_score"),
+    )
+    facets = [
+        {"genre_id": genre_id, "genre_name": genre_name, "count": count}
+        for genre_id, genre_name, count in index.facets(mask)
+    ]
+    return mask, facets
+
+
+def fill_missing_posters(movies: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """
+    Fill in the poster paths of catalog snapshot movies whose poster was not known when the snapshot was made.
+    :param movies: The movies from the catalog snapshot.
+    :return: The same movies, all with a poster path.
+    """
+    missing_ids = [movie["movie_id"] for movie in movies if movie["poster_path"] is None]
+    poster_paths = {}
+    if missing_ids:
+        movie_list = db.session.query(Movie).filter(Movie.movie_id.in_(missing_ids)).all()
+        Movie.resolve_poster_paths(movie_list)
+        poster_paths = {movie.movie_id: movie.poster_path for movie in movie_list}
+        mark_unresolved_posters(poster_paths.get(movie_id) for movie_id in missing_ids)
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+
+    for movie in movies:
+        if movie["poster_path"] is None:
+            movie["poster_path"] = poster_paths.get(movie["movie_id"]) or DEFAULT_POSTER_PATH
+    return movies
+
+
+def project_snapshot_movies(
+    movies: list[dict[str, Any]],
+    field_names: Optional[tuple[str, ...]]
+) -> list[dict[str, Any]]:
+    """
+    Limit catalog snapshot movies to the requested fields, filling in their missing posters when asked for.
+    :param movies: The movies from the catalog snapshot.
+    :param field_names: The requested fields, None for all fields.
+    :return: The movies with only the requested fields.
+    """
+    if field_names is None:
+        return fill_missing_posters(movies)
+    if "poster_path" in field_names:
+        movies = fill_missing_posters(movies)
+    return [{field_name: movie[field_name] for field_name in field_names} for movie in movies]
+
+
+def snapshot_page(
+    snapshot: CatalogSnapshot,
+    args: dict[str, Any],
+    sort_by: str,
+    amount: int,
+    after: Optional[tuple[Optional[Union[int, float]], int]],
+    field_names: Optional[tuple[str, ...]] = None
+) -> dict[str, Any]:
+    """
+    Serve a page of the movie list straight from the catalog snapshot.
+    :param snapshot: The catalog snapshot.
+    :param args: The parsed list arguments.
+    :param sort_by: The column to sort on.
+    :param amount: The page size.
+    :param after: The decoded cursor, None for the first page.
+    :param field_names: The requested fields, None for all fields.
+    :return: The page in the movie list model format.
+    """
+    # Fetch one movie extra to know whether there is a next page
+    mask, facets = filter_index(snapshot.index, args)
+    page_ids = snapshot.index.sorted_movie_ids(mask, sort_by=sort_by, amount=amount + 1, after=after)
+    movies = [movie for movie in map(snapshot.get_movie, page_ids) if movie is not None]
+    next_cursor = None
+    if len(movies) > amount:
+        next_cursor = encode_cursor(movies[amount - 1][sort_by], movies[amount - 1]["movie_id"])
+    return {"results": project_snapshot_movies(movies[:amount], field_names), "next": next_cursor, "facets": facets}
+
+
+def parse_batch_ids() -> list[int]:
+    """
+    Read the movie ids of a batch request.
+
+    The body is either JSON, a list of ids or {"movie_ids": [...]}, or application/octet-stream with the ids
+    as little-endian 64-bit integers.
+    :return: The movie ids.
+    :raises ValueError: If the body is not a valid list of movie ids.
+    """
+    if request.mimetype == "application/octet-stream":
+        data = request.get_data()
+        if len(data) % 8 != 0:
+            raise ValueError("The binary id list must be a multiple of 8 bytes")
+        return [int(movie_id) for movie_id in np.frombuffer(data, dtype="<i8")]
+
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get("movie_ids")
+    if not isinstance(body, list) or not all(
+        isinstance(movie_id, int) and not isinstance(movie_id, bool) for movie_id in body
+    ):
+        raise ValueError("The id list must be a list of integers")
+    return body
+
+
+def stream_movies(movie_ids: list[int], field_names: Optional[tuple[str, ...]] = None) -> Iterator[bytes]:
+    """
+    Stream the movies with the given ids as NDJSON, one chunk of the database cursor at a time.
+
+    Every line is a movie in the movie model format, ordered by id. The last line is {"not_found": [...]}
+    with the requested ids that do not exist.
+    :param movie_ids: The ids of the movies.
+    :param field_names: The requested fields, None for all fields.
+    :return: Iterator over the NDJSON chunks.
+    """
+    serialize_movie = compile_model(projected_models(field_names)[0])
+    missing = set(movie_ids)
+    for movies in Movie.iter_movies_by_ids(
+        db.session, sorted(missing), chunk_size=BATCH_CHUNK_SIZE, field_names=field_names
+    ):
+        resolve_posters(movies, field_names)
+        missing.difference_update(movie.movie_id for movie in movies)
+        yield b"".join(dumps(serialize_movie(movie)) + b"\n" for movie in movies)
+
+    # Store the poster paths that were resolved for this response, now that the cursor is done
+    db.session.commit()
+    yield dumps({"not_found": sorted(missing)}) + b"\n"
+
+
 @movies_api.route('/list', methods=['GET'])
 class PopularMoviesResource(Resource):
     @movies_api.expect(get_movies_parser)
-    @cache.cached(query_string=True)
+    @conditional(lambda: sorted(request.args.items(multi=True)))
+    @cached(query_string=True, vary=catalog_version, response_filter=posters_resolved)
     @limiter.limit("500 per hour")
     @limiter.limit("1000 per day")
     @limiter.limit("10000 per month")
     @movies_api.response(200, "Success", model=movie_list_model)
+    @movies_api.response(304, "Not modified since the version in If-None-Match")
     def get(self):
         """
         Get a list of movies automatically sorted by rating.
+
+        The list can be sorted on another column with sort_by, and paged through with the returned
+        'next' cursor. Fetching movies by id returns them unpaged.
+        When filtering on genres, rating, runtime or meta score, the movie counts per genre for the
+        filters are returned as facets. With 'fields' only those fields of the movies are loaded and returned.
         """
         args = get_movies_parser.parse_args()
+        field_names = parse_fields(args)
+        snapshot = get_catalog_snapshot()
+
         if args.get("movie_ids", None):
-            movie_ids = args.get("movie_ids")
-            movie_list = db.session.query(Movie).filter(Movie.movie_id.in_(movie_ids)).all()
-            if not movie_list:
+            return self.get_movies_by_id(snapshot, args.get("movie_ids"), field_names)
+
+        amount = min(max(args.get("amount") or 1, 1), MAX_PAGE_SIZE)
+        sort_by = args.get("sort_by") or "rating"
+
+        after = None
+        if args.get("cursor"):
+            try:
+                after = decode_cursor(args["cursor"])
+            except ValueError:
+                movies_api.abort(400, "Invalid cursor.")
+
+        if snapshot is not None:
+            return snapshot_page(snapshot, args, sort_by, amount, after, field_names)
+
+        facets = None
+        if any(args.get(argument) is not None for argument in FILTER_ARGUMENTS):
+            # Filter on the in-memory index and only load the movies of the page
+            index = get_movie_index(db.session)
+            mask, facets = filter_index(index, args)
+            page_ids = index.sorted_movie_ids(mask, sort_by=sort_by, amount=amount + 1, after=after)
+            movies_by_id = {
+                movie.movie_id: movie for movie in Movie.get_movies_by_ids(db.session, page_ids, field_names)
+            }
+            movie_list = [movies_by_id[movie_id] for movie_id in page_ids if movie_id in movies_by_id]
+        else:
+            # Fetch one movie extra to know whether there is a next page
+            movie_list = Movie.get_movies_sorted(
+                db.session, sort_by=sort_by, amount=amount + 1, after=after, field_names=field_names
+            )
+        next_cursor = None
+        if len(movie_list) > amount:
+            next_cursor = encode_cursor(getattr(movie_list[amount - 1], sort_by), movie_list[amount - 1].movie_id)
+        movie_list = movie_list[:amount]
+
+        resolve_posters(movie_list, field_names)
+        result = serialize(
+            {"results": movie_list, "next": next_cursor, "facets": facets}, projected_models(field_names)[1]
+        )
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+        return result
+
+    @staticmethod
+    def get_movies_by_id(
+        snapshot: Optional[CatalogSnapshot],
+        movie_ids: list[int],
+        field_names: Optional[tuple[str, ...]] = None
+    ) -> dict[str, Any]:
+        """
+        Get the movies with the given ids, unpaged.
+        :param snapshot: The catalog snapshot, None to read the movies from the database.
+        :param movie_ids: The ids of the movies.
+        :param field_names: The requested fields, None for all fields.
+        :return: The movies in the movie list model format.
+        """
+        if snapshot is not None:
+            movies = [movie for movie in map(snapshot.get_movie, dict.fromkeys(movie_ids)) if movie is not None]
+            if not movies:
                 movies_api.abort(404, "Movies not found.")
-            return marshal({"results": movie_list}, movie_list_model)
+            return {"results": project_snapshot_movies(movies, field_names), "next": None, "facets": None}
+
+        movie_list = Movie.get_movies_by_ids(db.session, movie_ids, field_names)
+        if not movie_list:
+            movies_api.abort(404, "Movies not found.")
+        resolve_posters(movie_list, field_names)
+        result = serialize({"results": movie_list}, projected_models(field_names)[1])
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+        return result
+
+
+@movies_api.route('/batch', methods=['POST'])
+class MovieBatchResource(Resource):
+    """
+    Resource for fetching many movies by id at once.
+    """
 
-        amount = args.get("amount", 1)
+    @movies_api.expect(movie_batch_model, movie_fields_parser)
+    @limiter.limit("500 per hour")
+    @limiter.limit("1000 per day")
+    @movies_api.response(200, "One movie per line as NDJSON, then a line with the ids that were not found")
+    @movies_api.response(400, "Invalid movie id list")
+    def post(self):
+        """
+        Fetch movies by id, streamed as NDJSON.
 
-        movie_list = db.session.query(Movie).all()[:amount]
+        Takes any number of ids as JSON or as a binary list of little-endian 64-bit integers, so large
+        lists do not run into URL length limits. The movies are streamed while they are read from the
+        database, the last line lists the ids that were not found.
+        """
+        field_names = parse_fields(movie_fields_parser.parse_args())
+        try:
+            movie_ids = parse_batch_ids()
+        except ValueError as e:
+            movies_api.abort(400, f"Invalid movie id list: {e}.")
+
+        return Response(
+            stream_with_context(stream_movies(movie_ids, field_names)), mimetype="application/x-ndjson"
+        )
 
-        return marshal({"results": movie_list}, movie_list_model)
+
+def parse_friends_watched(payload: Any) -> tuple[dict[int, list[int]], list[int]]:
+    """
+    Parse the watched movies of the friends and of the user from a request body.
+    :param payload: The JSON body.
+    :return: The movie ids per friend id and the movie ids the user watched.
+    :raises ValueError: If the body is not a valid friends recommendation request.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("friends_watched"), dict):
+        raise ValueError("expected an object with a friends_watched object")
+    movie_lists = [*payload["friends_watched"].values(), payload.get("self_watched") or []]
+    if not all(isinstance(movie_ids, list) for movie_ids in movie_lists) or not all(
+        isinstance(movie_id, int) and not isinstance(movie_id, bool)
+        for movie_ids in movie_lists for movie_id in movie_ids
+    ):
+        raise ValueError("expected lists of integer movie ids")
+    try:
+        friends_watched = {int(friend_id): movie_ids for friend_id, movie_ids in payload["friends_watched"].items()}
+    except ValueError as e:
+        raise ValueError("expected integer friend ids") from e
+    return friends_watched, payload.get("self_watched") or []
+
+
+@movies_api.route('/recommended/friends', methods=['POST'])
+class FriendsRecommendationResource(Resource):
+    """
+    Resource for recommending the movies friends watched most.
+    """
+
+    @movies_api.expect(friends_recommendation_model, movie_fields_parser)
+    @limiter.limit("500 per hour")
+    @limiter.limit("1000 per day")
+    @movies_api.response(200, "Success", model=movie_list_model)
+    @movies_api.response(400, "Invalid watched movies")
+    def post(self):
+        """
+        Get the movies the user has not watched yet that most friends watched, the most watched first.
+        """
+        field_names = parse_fields(movie_fields_parser.parse_args())
+        payload = request.get_json(silent=True)
+        try:
+            friends_watched, self_watched = parse_friends_watched(payload)
+        except ValueError as e:
+            movies_api.abort(400, f"Invalid watched movies: {e}.")
+        amount = payload.get("amount") or 10
+        if not isinstance(amount, int):
+            movies_api.abort(400, "Invalid watched movies: expected an integer amount.")
+        amount = min(max(amount, 1), MAX_PAGE_SIZE)
+
+        movie_list = Movie.get_recommended_movies_by_friends(
+            friends_watched, self_watched, db.session, amount, field_names
+        )
+        resolve_posters(movie_list, field_names)
+        result = serialize({"results": movie_list}, projected_models(field_names)[1])
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+        return result
+
+
+@movies_api.route('/search', methods=['GET'])
+class SearchMoviesResource(Resource):
+    """
+    Resource for searching movies.
+    """
+
+    @movies_api.expect(search_movies_parser)
+    @cached(query_string=True, vary=catalog_version, response_filter=posters_resolved)
+    @limiter.limit("500 per hour")
+    @limiter.limit("1000 per day")
+    @movies_api.response(200, "Success", model=movie_list_model)
+    @movies_api.response(400, "Invalid cursor")
+    def get(self):
+        """
+        Search movies by name and plot, the best matches first.
+
+        Supports web search syntax: "quoted phrases", 'or' between words and '-' to exclude a word.
+        Page through the results with the returned 'next' cursor.
+        """
+        args = search_movies_parser.parse_args()
+        field_names = parse_fields(args)
+        amount = min(max(args.get("amount") or 1, 1), MAX_PAGE_SIZE)
+
+        after = None
+        if args.get("cursor"):
+            try:
+                rank, movie_id = decode_cursor(args["cursor"])
+            except ValueError:
+                movies_api.abort(400, "Invalid cursor.")
+            if rank is None:
+                movies_api.abort(400, "Invalid cursor.")
+            after = (rank, movie_id)
+
+        # Fetch one movie extra to know whether there is a next page
+        matches = Movie.search(db.session, args["q"], amount=amount + 1, after=after, field_names=field_names)
+        next_cursor = None
+        if len(matches) > amount:
+            last_movie, last_rank = matches[amount - 1]
+            next_cursor = encode_cursor(last_rank, last_movie.movie_id)
+        movie_list = [movie for movie, _ in matches[:amount]]
+
+        resolve_posters(movie_list, field_names)
+        result = serialize({"results": movie_list, "next": next_cursor}, projected_models(field_names)[1])
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+        return result
 
 
 @movies_api.route('/<int:movie_id>', methods=['GET'])
@@ -101,18 +684,88 @@ class MovieResource(Resource):
     Resource for fetching movie details.
     """
 
+    @movies_api.expect(movie_fields_parser)
     @movies_api.response(200, "Success", model=movie_model)
+    @movies_api.response(304, "Not modified since the version in If-None-Match")
+    @movies_api.response(400, "Unknown field")
     @movies_api.response(404, "Movie not found")
     @movies_api.doc(params={"movie_id": "The ID of the movie to fetch."})
-    @cache.cached()
+    @conditional(lambda movie_id: [movie_id, request.args.getlist("fields")])
+    @cached(query_string=True, vary=catalog_version, response_filter=posters_resolved)
     def get(self, movie_id):
         """
         Get movie details by ID.
 
         Returns the details of a movie from the TMDB API.
+        The movie is served from the catalog snapshot when there is one.
+        """
+        field_names = parse_fields(movie_fields_parser.parse_args())
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None and (snapshot_movie := snapshot.get_movie(movie_id)) is not None:
+            return project_snapshot_movies([snapshot_movie], field_names)[0]
+
+        movie: Movie = (
+            db.session.query(Movie)
+            .options(*Movie.load_options(field_names))
+            .filter(Movie.movie_id == movie_id)
+            .first()
+        )
+        if movie is None:
+            movies_api.abort(404, "Movie not found.")
+        resolve_posters([movie], field_names)
+        result = serialize(movie, projected_models(field_names)[0])
+
+        # Store the poster path if it was resolved for this response
+        db.session.commit()
+        return result
+
+
+@movies_api.route('/<int:movie_id>/similar', methods=['GET'])
+class SimilarMoviesResource(Resource):
+    """
+    Resource for fetching the movies most similar to a movie.
+    """
+
+    @movies_api.expect(similar_movies_parser)
+    @limiter.limit("500 per hour")
+    @limiter.limit("1000 per day")
+    @movies_api.response(200, "Success", model=movie_list_model)
+    @movies_api.response(404, "Movie not found")
+    @movies_api.response(503, "The similar movies have not been computed yet")
+    def get(self, movie_id):
         """
-        movie: Movie = db.session.query(Movie).filter(Movie.movie_id == movie_id).first()
-        return marshal(movie, movie_model)
+        Get the movies most similar to a movie, the most similar first.
+
+        Similarity is based on the genres, rating, runtime and plot of the movies, and is precomputed for
+        the whole catalog.
+        """
+        args = similar_movies_parser.parse_args()
+        field_names = parse_fields(args)
+        amount = min(max(args.get("amount") or 1, 1), TOP_K)
+
+        similar_movies = get_similar_movies()
+        if similar_movies is None:
+            movies_api.abort(503, "The similar movies have not been computed yet.")
+        similar = similar_movies.similar(movie_id, amount)
+        if similar is None:
+            movies_api.abort(404, "Movie not found.")
+        similar_ids = [similar_id for similar_id, _ in similar]
+
+        snapshot = get_catalog_snapshot()
+        if snapshot is not None:
+            movies = [movie for movie in map(snapshot.get_movie, similar_ids) if movie is not None]
+            return {"results": project_snapshot_movies(movies, field_names)}
+
+        movies_by_id = {
+            movie.movie_id: movie for movie in Movie.get_movies_by_ids(db.session, similar_ids, field_names)
+        }
+        movie_list = [movies_by_id[similar_id] for similar_id in similar_ids if similar_id in movies_by_id]
+        resolve_posters(movie_list, field_names)
+        result = serialize({"results": movie_list}, projected_models(field_names)[1])
+
+        # Store the poster paths that were resolved for this response
+        db.session.commit()
+        return result
 
 
 def register_routes(api_blueprint: Api) -> None:
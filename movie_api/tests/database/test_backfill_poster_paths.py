@@ -0,0 +1,45 @@
+"""
+Test cases for the poster path backfill job.
+"""
+from unittest.mock import MagicMock, patch
+
+from src.database.models import Movie
+from src.database.backfill_poster_paths import backfill_poster_paths
+
+
+@patch("src.database.backfill_poster_paths.API_KEY", "test-key")
+@patch("src.database.models.movie.tmdb_session.get")
+def test_backfill_poster_paths_resolves_missing_posters(mock_get, db_session):
+    """
+    Test that the backfill resolves every movie without a poster and leaves the others alone.
+    """
+    for i in range(5):
+        db_session.add(Movie(movie_name=f"Movie {i}", rating=8.0, runtime=100, meta_score=75, plot="Good movie"))
+    stored = Movie(movie_name="Stored", rating=8.0, runtime=100, meta_score=75, plot="Good movie")
+    stored.poster_path = "https://image.tmdb.org/t/p/w500/stored.jpg"
+    db_session.add(stored)
+    db_session.commit()
+
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"results": [{"poster_path": "/poster.jpg"}]}
+    mock_get.return_value = mock_response
+
+    resolved = backfill_poster_paths(db_session, batch_size=2)
+
+    assert resolved == 5
+    assert mock_get.call_count == 5
+    assert db_session.query(Movie).filter(Movie.poster_path.is_(None)).count() == 0
+    assert stored.poster_path == "https://image.tmdb.org/t/p/w500/stored.jpg"
+
+
+@patch("src.database.backfill_poster_paths.API_KEY", None)
+@patch("src.database.models.movie.tmdb_session.get")
+def test_backfill_poster_paths_skips_without_api_key(mock_get, db_session):
+    """
+    Test that the backfill does nothing when no TMDB API key is configured.
+    """
+    db_session.add(Movie(movie_name="Movie", rating=8.0, runtime=100, meta_score=75, plot="Good movie"))
+    db_session.commit()
+
+    assert backfill_poster_paths(db_session) == 0
+    mock_get.assert_not_called()
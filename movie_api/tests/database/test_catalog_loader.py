@@ -0,0 +1,110 @@
+"""
+Test cases for loading the catalog in the background and reporting its progress.
+"""
+from unittest.mock import patch
+
+from src.database.models import Movie
+from src.database.build_catalog_seed import build_catalog_seed
+from src.database.catalog_loader import WARM_UP_LOCK, CatalogLoader, LoaderStatus, session_advisory_lock
+from src.database.catalog_snapshot import get_catalog_snapshot
+from tests.database.test_load_movie_data import CSV_HEADER
+
+
+def write_movies_csv(tmp_path, amount: int) -> str:
+    """
+    Write a CSV with the given number of movies.
+    """
+    csv_path = tmp_path / "movies.csv"
+    csv_path.write_text(
+        CSV_HEADER + "".join(f"{i},Movie {i},7.5,100 min,Drama,70,A plot.\n" for i in range(amount)),
+        encoding="utf-8"
+    )
+    return str(csv_path)
+
+
+@patch("src.database.load_movie_data.INSERT_CHUNK_SIZE", 2)
+@patch("src.database.catalog_loader.backfill_poster_paths")
+def test_loader_reports_progress_until_ready(_, app, db_session, tmp_path):
+    """
+    Test that the loader inserts the catalog with its own session and reports every chunk.
+    """
+    loader = CatalogLoader()
+    assert loader.serving
+
+    loader.start(app, seed_dir=str(tmp_path / "no_seed"), csv_path=write_movies_csv(tmp_path, 5)).join(timeout=30)
+
+    progress = loader.progress()
+    assert loader.status == LoaderStatus.READY
+    assert (progress["ready"], progress["rows_loaded"], progress["rows_total"]) == (True, 5, 5)
+    assert progress["rows_per_second"] > 0
+    assert db_session.query(Movie).count() == 5
+
+    # The snapshot is written by the loader, not by the first catalog request
+    snapshot = get_catalog_snapshot()
+    assert snapshot is not None and len(snapshot) == 5
+
+
+def test_loader_failure_keeps_catalog_unavailable(app, db_session, tmp_path):  # pylint: disable=unused-argument
+    """
+    Test that a failed load is reported and keeps the catalog routes unavailable.
+    """
+    loader = CatalogLoader()
+
+    loader.run(app, seed_dir=str(tmp_path / "no_seed"), csv_path=str(tmp_path / "missing.csv"), max_attempts=1)
+
+    assert loader.status == LoaderStatus.FAILED
+    assert not loader.serving
+    assert "missing.csv" in loader.progress()["error"]
+    assert loader.retry_after() >= 1
+
+
+@patch("src.database.catalog_seed.COPY_CHUNK_ROWS", 2)
+@patch("src.database.catalog_loader.backfill_poster_paths")
+def test_loader_restores_seed_without_the_csv(_, app, db_session, tmp_path):
+    """
+    Test that the loader restores the catalog from the seed when there is one.
+    """
+    seed_dir = str(tmp_path / "seed")
+    build_catalog_seed(write_movies_csv(tmp_path, 5), seed_dir)
+    loader = CatalogLoader()
+
+    loader.run(app, seed_dir=seed_dir, csv_path=str(tmp_path / "missing.csv"))
+
+    assert loader.status == LoaderStatus.READY
+    assert (loader.progress()["rows_loaded"], loader.progress()["rows_total"]) == (5, 5)
+    assert db_session.query(Movie).count() == 5
+
+
+@patch("src.database.catalog_loader.LOAD_RETRY_DELAY", 0)
+@patch("src.database.catalog_loader.backfill_poster_paths")
+def test_loader_retries_a_failed_load(_, app, db_session, tmp_path):  # pylint: disable=unused-argument
+    """
+    Test that a load that fails once, like on a database that is still starting, is retried until it succeeds.
+    """
+    loader = CatalogLoader()
+
+    with patch.object(loader, "_load", side_effect=[RuntimeError("connection refused"), None]) as load:
+        loader.run(app, seed_dir=str(tmp_path / "no_seed"))
+
+    assert load.call_count == 2
+    assert loader.status == LoaderStatus.READY
+    assert loader.serving
+
+
+@patch("src.database.catalog_loader.backfill_poster_paths")
+def test_loader_leaves_the_warm_up_to_the_lock_holder(backfill_poster_paths, app, db_session, tmp_path):
+    """
+    Test that only the process holding the warm-up lock resolves the posters.
+    """
+    loader = CatalogLoader()
+    csv_path = write_movies_csv(tmp_path, 3)
+
+    with session_advisory_lock(WARM_UP_LOCK) as acquired:
+        assert acquired
+        loader.run(app, seed_dir=str(tmp_path / "no_seed"), csv_path=csv_path)
+    backfill_poster_paths.assert_not_called()
+
+    loader.run(app, seed_dir=str(tmp_path / "no_seed"), csv_path=csv_path)
+    backfill_poster_paths.assert_called_once()
+    assert loader.status == LoaderStatus.READY
+    assert db_session.query(Movie).count() == 3
@@ -0,0 +1,96 @@
+"""
+Test cases for building and restoring the catalog seed.
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from src.database import db
+from src.database.models import Movie, Genre
+from src.database.build_catalog_seed import build_catalog_seed
+from src.database.catalog_seed import SEED_FORMAT, copy_line, read_manifest, restore_catalog_seed
+from tests.database.test_load_movie_data import CSV_HEADER
+
+
+def test_copy_line_escapes_special_characters():
+    """
+    Test that values are escaped the way COPY reads them back.
+    """
+    assert copy_line([1, "Tab\there", None, "Back\\slash\nnew line"]) == \
+        "1\tTab\\there\t\\N\tBack\\\\slash\\nnew line\n"
+
+
+def test_seed_round_trip(db_session, tmp_path):
+    """
+    Test that a restored seed holds the same movies and genres as the CSV, reusing existing genres.
+    """
+    csv_path = tmp_path / "movies.csv"
+    csv_path.write_text(
+        CSV_HEADER
+        + '1,Inception,8.8,148 min,"Action, Sci-Fi",74,"A dream\theist, with \\\\ in it."\n'
+        + '2,Whiplash,8.5,106 min,"Drama, Music",,A drummer.\n'
+        + "3,Untitled,,,,,\n",
+        encoding="utf-8"
+    )
+
+    db_session.add(Genre(genre_name="Drama"))
+    db_session.commit()
+
+    seed_dir = str(tmp_path / "seed")
+    assert build_catalog_seed(str(csv_path), seed_dir) == {"genres": 4, "movies": 3, "has_genre": 4}
+    assert read_manifest(seed_dir)["format"] == SEED_FORMAT
+
+    restore_catalog_seed(db_session, seed_dir)
+    db_session.commit()
+
+    movies = {movie.movie_name: movie for movie in db_session.query(Movie).all()}
+    assert set(movies) == {"Inception", "Whiplash", "Untitled"}
+    assert movies["Inception"].plot == "A dream\theist, with \\\\ in it."
+    assert sorted(genre.genre_name for genre in movies["Inception"].genres) == ["Action", "Sci-Fi"]
+    assert sorted(genre.genre_name for genre in movies["Whiplash"].genres) == ["Drama", "Music"]
+    assert movies["Whiplash"].meta_score is None
+    assert db_session.query(Genre).filter_by(genre_name="Drama").count() == 1
+
+    # New movies continue after the restored ids
+    movie = Movie(movie_name="New", rating=7.0, runtime=100, meta_score=None, plot="Plot")
+    db_session.add(movie)
+    db_session.commit()
+    assert movie.movie_id == 4
+
+
+def test_restore_rejects_other_seed_formats(db_session, tmp_path):
+    """
+    Test that a seed of another format is not restored.
+    """
+    (tmp_path / "manifest.json").write_text(json.dumps({"format": SEED_FORMAT + 1}), encoding="utf-8")
+
+    with pytest.raises(ValueError):
+        restore_catalog_seed(db_session, str(tmp_path))
+
+
+@patch("src.database.catalog_seed.COPY_CHUNK_ROWS", 2)
+def test_seed_restores_through_psycopg2(db_session, tmp_path):
+    """
+    Test restoring the seed through psycopg2, the driver of the deployed database URL.
+    """
+    csv_path = tmp_path / "movies.csv"
+    csv_path.write_text(
+        CSV_HEADER + "".join(f"{i},Movie {i},7.5,100 min,Drama,70,A plot.\n" for i in range(5)), encoding="utf-8"
+    )
+    seed_dir = str(tmp_path / "seed")
+    build_catalog_seed(str(csv_path), seed_dir)
+    engine = create_engine(db.engine.url.set(drivername="postgresql+psycopg2"))
+    copied = []
+
+    try:
+        with Session(engine) as session:
+            restore_catalog_seed(session, seed_dir, progress=lambda rows, _: copied.append(rows))
+            session.commit()
+    finally:
+        engine.dispose()
+
+    assert db_session.query(Movie).count() == 5
+    assert copied == [2, 4, 5]
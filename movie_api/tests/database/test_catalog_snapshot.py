@@ -0,0 +1,142 @@
+"""
+Test cases for the catalog version and the memory-mapped catalog snapshot.
+"""
+import os
+
+from sqlalchemy.orm import Session
+
+from src.database import db
+from src.database.models import Movie, Genre, get_catalog_version
+from src.database.movie_index import MovieIndex
+from src.database.catalog_snapshot import open_or_write_snapshot, refresh_catalog_snapshot
+from tests.database.test_movie_index import add_movies
+
+
+def test_catalog_version_advances_on_changes(db_session):
+    """
+    Test that every change to the catalog advances the catalog version.
+    """
+    version = get_catalog_version(db_session)
+
+    db_session.add(Genre(genre_name="Action"))
+    db_session.commit()
+    after_insert = get_catalog_version(db_session)
+
+    db_session.query(Genre).update({Genre.genre_name: "Drama"})
+    db_session.commit()
+
+    assert version < after_insert < get_catalog_version(db_session)
+
+
+def test_catalog_version_ignores_poster_paths(db_session):
+    """
+    Test that storing a resolved poster path does not advance the catalog version.
+    """
+    add_movies(db_session)
+    version = get_catalog_version(db_session)
+
+    db_session.query(Movie).update({Movie.poster_path: "https://image.tmdb.org/t/p/w500/poster.jpg"})
+    db_session.commit()
+    assert get_catalog_version(db_session) == version
+
+    db_session.query(Movie).update({Movie.rating: 5.0})
+    db_session.commit()
+    assert get_catalog_version(db_session) == version + 1
+
+
+def test_catalog_version_follows_the_transaction(app, db_session):  # pylint: disable=unused-argument
+    """
+    Test that a change only advances the catalog version for others once it commits, and not when rolled back.
+    """
+    version = get_catalog_version(db_session)
+
+    with Session(db.engine) as writer:
+        writer.add(Genre(genre_name="Action"))
+        writer.flush()
+        assert get_catalog_version(writer) == version + 1
+        assert get_catalog_version(db_session) == version
+        writer.rollback()
+
+    assert get_catalog_version(db_session) == version
+
+
+def test_snapshot_round_trip(db_session, tmp_path):
+    """
+    Test that a movie read from the snapshot matches the movie in the database.
+    """
+    add_movies(db_session)
+    movie = db_session.query(Movie).filter(Movie.movie_id == 2).one()
+    movie.poster_path = "https://image.tmdb.org/t/p/w500/poster.jpg"
+    db_session.commit()
+
+    snapshot = open_or_write_snapshot(db_session, get_catalog_version(db_session), str(tmp_path))
+
+    assert len(snapshot) == 4
+    assert snapshot.get_movie(2) == {
+        "movie_id": 2,
+        "movie_name": "Movie 2",
+        "plot": "Plot",
+        "poster_path": "https://image.tmdb.org/t/p/w500/poster.jpg",
+        "rating": 7.0,
+        "genres": [{"genre_id": 1, "genre_name": "Action"}],
+        "meta_score": None,
+        "runtime": 90,
+    }
+    assert snapshot.get_movie(1)["poster_path"] is None
+    assert snapshot.get_movie(5) is None
+
+
+def test_snapshot_index_matches_database_index(db_session, tmp_path):
+    """
+    Test that the index of the snapshot filters and sorts like the index built from the database.
+    """
+    add_movies(db_session)
+    snapshot = open_or_write_snapshot(db_session, get_catalog_version(db_session), str(tmp_path))
+    index = MovieIndex.build(db_session)
+
+    for sort_by in ("rating", "runtime", "meta_score"):
+        assert snapshot.index.sorted_movie_ids(snapshot.index.filter(), sort_by=sort_by) == \
+            index.sorted_movie_ids(index.filter(), sort_by=sort_by)
+    assert snapshot.index.facets(snapshot.index.filter(genres=["Drama"])) == \
+        index.facets(index.filter(genres=["Drama"]))
+
+
+def test_snapshot_is_written_once_per_version(db_session, tmp_path):
+    """
+    Test that an existing snapshot is reused and that older versions are removed.
+    """
+    add_movies(db_session)
+    version = get_catalog_version(db_session)
+    open_or_write_snapshot(db_session, version, str(tmp_path))
+    written_at = os.path.getmtime(tmp_path / f"catalog-{version}-0" / "movie_ids.npy")
+
+    open_or_write_snapshot(db_session, version, str(tmp_path))
+    assert os.path.getmtime(tmp_path / f"catalog-{version}-0" / "movie_ids.npy") == written_at
+
+    db_session.add(Genre(genre_name="Horror"))
+    db_session.commit()
+    new_version = get_catalog_version(db_session)
+    open_or_write_snapshot(db_session, new_version, str(tmp_path))
+
+    assert sorted(name for name in os.listdir(tmp_path) if name.startswith("catalog-")) == \
+        [f"catalog-{new_version}-0"]
+
+
+def test_snapshot_is_written_again_when_posters_are_resolved(db_session):
+    """
+    Test that resolving posters, which keeps the catalog version, makes the refresh switch to a snapshot with them.
+    """
+    add_movies(db_session)
+    snapshot = refresh_catalog_snapshot(db_session)
+    assert snapshot is not None and snapshot.get_movie(1)["poster_path"] is None
+
+    db_session.query(Movie).filter(Movie.movie_id == 1).update(
+        {Movie.poster_path: "https://image.tmdb.org/t/p/w500/poster.jpg"}
+    )
+    db_session.commit()
+    refreshed = refresh_catalog_snapshot(db_session)
+
+    assert refreshed is not None and refreshed.version == snapshot.version
+    assert refreshed.posters == snapshot.posters + 1
+    assert refreshed.get_movie(1)["poster_path"] == "https://image.tmdb.org/t/p/w500/poster.jpg"
+    assert refresh_catalog_snapshot(db_session) is refreshed
@@ -0,0 +1,76 @@
+"""
+Test cases for loading the IMDb movie catalog into the database.
+"""
+import pandas as pd
+
+from src.database.models import Movie, Genre
+from src.database.load_movie_data import load_movie_data, parse_movie_data, DEFAULT_RUNTIME, DEFAULT_PLOT
+
+CSV_HEADER = "ID,Movie Name,Rating,Runtime,Genre,Metascore,Plot\n"
+
+
+def test_parse_movie_data_applies_defaults_and_drops_invalid_rows():
+    """
+    Test that missing values get their defaults and rows that fail the Movie validation are dropped.
+    """
+    data = pd.DataFrame({
+        "Movie Name": [" Inception ", "Too Long", "No Extras"],
+        "Rating": [8.8, 7.0, None],
+        "Runtime": ["148 min", "1200 min", None],
+        "Genre": ["Action, Sci-Fi", "Drama", None],
+        "Metascore": [74.0, 50.0, None],
+        "Plot": ["A dream heist.", "A long movie.", None],
+    })
+
+    movies = parse_movie_data(data)
+
+    assert list(movies["movie_name"]) == ["Inception", "No Extras"]
+    assert list(movies["runtime"]) == [148, DEFAULT_RUNTIME]
+    assert list(movies["rating"]) == [8.8, 0.0]
+    assert movies["meta_score"][0] == 74
+    assert pd.isna(movies["meta_score"][1])
+    assert list(movies["plot"]) == ["A dream heist.", DEFAULT_PLOT]
+    assert list(movies["genres"]) == [["Action", "Sci-Fi"], []]
+
+
+def test_load_movie_data_inserts_movies_and_genres(db_session, tmp_path):
+    """
+    Test that the loader inserts every movie with its genres and reuses genres that already exist.
+    """
+    db_session.add(Genre(genre_name="Drama"))
+    db_session.commit()
+
+    csv_path = tmp_path / "movies.csv"
+    csv_path.write_text(
+        CSV_HEADER
+        + '1,Inception,8.8,148 min,"Action, Sci-Fi",74,A dream heist.\n'
+        + '2,Whiplash,8.5,106 min,"Drama, Music",,A drummer.\n'
+        + "3,Untitled,,,,,\n",
+        encoding="utf-8"
+    )
+
+    load_movie_data(db_session, csv_path=str(csv_path))
+
+    movies = {movie.movie_name: movie for movie in db_session.query(Movie).all()}
+    assert set(movies) == {"Inception", "Whiplash", "Untitled"}
+    assert sorted(genre.genre_name for genre in movies["Inception"].genres) == ["Action", "Sci-Fi"]
+    assert sorted(genre.genre_name for genre in movies["Whiplash"].genres) == ["Drama", "Music"]
+    assert movies["Whiplash"].meta_score is None
+    assert movies["Untitled"].runtime == DEFAULT_RUNTIME
+    assert movies["Untitled"].genres == []
+    assert db_session.query(Genre).filter_by(genre_name="Drama").count() == 1
+
+
+def test_load_movie_data_skips_populated_database(db_session, tmp_path):
+    """
+    Test that the loader does nothing when the database already contains movies.
+    """
+    db_session.add(Movie(movie_name="Existing", rating=8.0, runtime=100, meta_score=75, plot="Plot"))
+    db_session.commit()
+
+    csv_path = tmp_path / "movies.csv"
+    csv_path.write_text(CSV_HEADER + "1,Inception,8.8,148 min,Action,74,A dream heist.\n", encoding="utf-8")
+
+    load_movie_data(db_session, csv_path=str(csv_path))
+
+    assert db_session.query(Movie).count() == 1
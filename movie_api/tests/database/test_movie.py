@@ -1,11 +1,16 @@
 """
 This file contains tests for the Movie model in the database.
 """
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
+from sqlalchemy import inspect
 
 from src.database.models import Movie, Genre
+from src.database.models.movie import DEFAULT_POSTER_PATH
+from tests.query_count import assert_max_queries
 
 
 def test_create_valid_movie():
@@ -206,10 +211,53 @@ def test_get_recommended_movies_by_friends_returns_empty_if_all_watched(db_sessi
     )
 
     # Assert
-    assert result == []
+    assert result == []  # pylint: disable=use-implicit-booleaness-not-comparison
 
 
-@patch("src.database.models.movie.requests.get")
+def test_get_recommended_movies_by_friends_loads_genres_in_bulk(db_session):
+    """
+    Test that the genres of the recommended movies are loaded together with the movies.
+    """
+    drama = Genre(genre_name="Drama")
+    for i in range(5):
+        movie = Movie(rating=7.0, movie_name=f"Movie {i}", runtime=100, meta_score=70, plot="Plot")
+        movie.genres.append(drama)
+        db_session.add(movie)
+    db_session.commit()
+    db_session.expunge_all()
+
+    with assert_max_queries(2):
+        result = Movie.get_recommended_movies_by_friends({1: [1, 2, 3], 2: [4, 5]}, [], db_session, amount=5)
+        assert all(movie.genres[0].genre_name == "Drama" for movie in result)
+
+
+def test_get_movies_sorted_loads_only_requested_fields(db_session):
+    """
+    Test that a projected query leaves the other columns and the genres unloaded.
+    """
+    for i in range(3):
+        db_session.add(Movie(rating=7.0 + i, movie_name=f"Movie {i}", runtime=100, meta_score=70, plot="Plot"))
+    db_session.commit()
+    db_session.expunge_all()
+
+    with assert_max_queries(1):
+        result = Movie.get_movies_sorted(db_session, sort_by="runtime", amount=3, field_names=["poster_path"])
+
+    assert len(result) == 3
+    assert {"plot", "rating", "meta_score", "genres"} <= inspect(result[0]).unloaded
+    assert {"movie_id", "movie_name", "runtime", "poster_path"}.isdisjoint(inspect(result[0]).unloaded)
+
+
+def test_count_friend_movies_skips_watched_movies():
+    """
+    Test that the friends' movies are counted once per friend that watched them, without the watched movies.
+    """
+    counts = Movie.count_friend_movies({1: [1, 2, 3], 2: [2, 3, 4], 3: [2, 5]}, [3, 4])
+
+    assert counts == {1: 1, 2: 3, 5: 1}
+
+
+@patch("src.database.models.movie.tmdb_session.get")
 def test_get_poster_path_returns_correct_url(mock_get):
     """
     Test that get_poster_path returns the correct poster URL using mocked API response.
@@ -234,3 +282,72 @@ def test_get_poster_path_returns_correct_url(mock_get):
     # Assert
     assert result == "https://image.tmdb.org/t/p/w500/inception.jpg"
     mock_get.assert_called_once()
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_poster_path_is_stored_after_first_lookup(mock_get, db_session):
+    """
+    Test that get_poster_path only calls TMDB once and serves the stored poster afterwards.
+    """
+    movie = Movie(movie_name="Inception", rating=8.8, runtime=148, meta_score=74, plot="A plot.")
+    db_session.add(movie)
+    db_session.commit()
+
+    mock_response = MagicMock()
+    mock_response.json.return_value = {"results": [{"poster_path": "/inception.jpg"}]}
+    mock_get.return_value = mock_response
+
+    assert movie.get_poster_path() == "https://image.tmdb.org/t/p/w500/inception.jpg"
+    db_session.commit()
+
+    stored = db_session.query(Movie).filter_by(movie_id=movie.movie_id).first()
+    assert stored.poster_path == "https://image.tmdb.org/t/p/w500/inception.jpg"
+    assert stored.get_poster_path() == "https://image.tmdb.org/t/p/w500/inception.jpg"
+    mock_get.assert_called_once()
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_poster_path_failure_falls_back_to_default(mock_get):
+    """
+    Test that a failing TMDB lookup returns the default poster without storing it.
+    """
+    movie = Movie(movie_name="Inception", rating=8.8, runtime=148, meta_score=74, plot="A plot.")
+    mock_get.side_effect = requests.Timeout()
+
+    assert movie.get_poster_path() == DEFAULT_POSTER_PATH
+    assert movie.poster_path is None
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_resolve_poster_paths_falls_back_for_slow_and_failing_lookups(mock_get):
+    """
+    Test that resolve_poster_paths stores the posters that resolved in time and leaves the others unresolved.
+    """
+    release = threading.Event()
+
+    def side_effect(_, params, **__):
+        """
+        Mock TMDB: one lookup hangs, one fails and the others succeed.
+        """
+        if params["query"] == "Slow":
+            release.wait(5)
+        if params["query"] == "Broken":
+            raise requests.ConnectionError()
+        mock_response = MagicMock()
+        mock_response.json.return_value = {"results": [{"poster_path": f"/{params['query']}.jpg"}]}
+        return mock_response
+
+    mock_get.side_effect = side_effect
+    movies = [
+        Movie(movie_name=name, rating=8.0, runtime=100, meta_score=75, plot="Plot")
+        for name in ["Fast", "Slow", "Broken", "Fast"]
+    ]
+
+    Movie.resolve_poster_paths(movies, timeout=0.5)
+    release.set()
+
+    assert movies[0].poster_path == "https://image.tmdb.org/t/p/w500/Fast.jpg"
+    assert movies[3].poster_path == "https://image.tmdb.org/t/p/w500/Fast.jpg"
+    assert movies[1].poster_path is None
+    assert movies[2].poster_path is None
+    assert mock_get.call_count == 3  # Duplicate names are only looked up once
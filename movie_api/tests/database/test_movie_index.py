@@ -0,0 +1,76 @@
+"""
+Test cases for the in-memory movie index.
+"""
+from src.database.models import Movie, Genre
+from src.database.movie_index import MovieIndex
+
+
+def add_movies(db_session) -> None:
+    """
+    Add a small catalog with genres to the database.
+    """
+    action = Genre(genre_name="Action")
+    drama = Genre(genre_name="Drama")
+    comedy = Genre(genre_name="Comedy")
+    movies = [
+        (Movie(movie_name="Movie 1", rating=9.0, runtime=150, meta_score=90, plot="Plot"), [action, drama]),
+        (Movie(movie_name="Movie 2", rating=7.0, runtime=90, meta_score=None, plot="Plot"), [action]),
+        (Movie(movie_name="Movie 3", rating=8.0, runtime=100, meta_score=60, plot="Plot"), [drama]),
+        (Movie(movie_name="Movie 4", rating=8.0, runtime=120, meta_score=70, plot="Plot"), [comedy, drama]),
+    ]
+    for movie, genres in movies:
+        movie.genres.extend(genres)
+        db_session.add(movie)
+    db_session.commit()
+
+
+def test_filter_on_genres(db_session):
+    """
+    Test that genre filters match all or any of the genres.
+    """
+    add_movies(db_session)
+    index = MovieIndex.build(db_session)
+
+    assert index.sorted_movie_ids(index.filter(genres=["Action", "Drama"])) == [1]
+    assert index.sorted_movie_ids(index.filter(genres=["Action", "Comedy"], match_all_genres=False)) == [1, 4, 2]
+    assert index.sorted_movie_ids(index.filter(genres=["Horror"])) == []
+
+
+def test_filter_on_numeric_columns(db_session):
+    """
+    Test that the numeric filters are combined and skip movies without a value.
+    """
+    add_movies(db_session)
+    index = MovieIndex.build(db_session)
+
+    assert index.sorted_movie_ids(index.filter(min_rating=8.0, max_runtime=120)) == [4, 3]
+    assert index.sorted_movie_ids(index.filter(min_meta_score=0)) == [1, 4, 3]
+
+
+def test_facets_count_matching_movies_per_genre(db_session):
+    """
+    Test that the facets count the matching movies per genre.
+    """
+    add_movies(db_session)
+    index = MovieIndex.build(db_session)
+
+    facets = index.facets(index.filter(min_rating=8.0))
+
+    assert facets == [(2, "Drama", 3), (1, "Action", 1), (3, "Comedy", 1)]
+
+
+def test_sorted_movie_ids_pages_like_the_database(db_session):
+    """
+    Test that paging through the index gives the same order as sorting in the database.
+    """
+    add_movies(db_session)
+    index = MovieIndex.build(db_session)
+    mask = index.filter()
+
+    expected = [movie.movie_id for movie in Movie.get_movies_sorted(db_session, sort_by="meta_score", amount=10)]
+    first_page = index.sorted_movie_ids(mask, sort_by="meta_score", amount=2)
+    last = db_session.get(Movie, first_page[-1])
+    second_page = index.sorted_movie_ids(mask, sort_by="meta_score", amount=2,
+                                         after=(last.meta_score, last.movie_id))
+
+    assert first_page + second_page == expected
@@ -0,0 +1,124 @@
+"""
+Test cases for the precomputed similar movies.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.database import db
+from src.database.models import Movie, Genre
+from src.database.similar_movies import (
+    SimilarMovies, build_similar_movies, get_similar_movies, hashed_tfidf, top_k_neighbours
+)
+
+
+def add_movies(db_session) -> None:
+    """
+    Add two pairs of movies that are alike, a space pair and a cooking pair.
+    """
+    science_fiction = Genre(genre_name="Science Fiction")
+    comedy = Genre(genre_name="Comedy")
+    movies = [
+        (Movie(movie_name="Star Voyage", rating=8.0, runtime=140, meta_score=80,
+               plot="Astronauts travel through space to a distant planet"), science_fiction),
+        (Movie(movie_name="Chef Life", rating=6.5, runtime=95, meta_score=60,
+               plot="A chef opens a small restaurant and cooks for the town"), comedy),
+        (Movie(movie_name="Planet Nine", rating=7.8, runtime=135, meta_score=75,
+               plot="A crew of astronauts explores a planet deep in space"), science_fiction),
+        (Movie(movie_name="Kitchen Chaos", rating=6.0, runtime=90, meta_score=55,
+               plot="A young chef cooks in a chaotic restaurant kitchen"), comedy),
+    ]
+    for movie, genre in movies:
+        movie.genres.append(genre)
+        db_session.add(movie)
+    db_session.commit()
+
+
+def test_hashed_tfidf_rows_are_unit_length():
+    """
+    Test that the plot vectors are unit length and that shared words make plots similar.
+    """
+    vectors = hashed_tfidf(["space travel", "space planet", "a chef cooks"])
+
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+
+def test_top_k_neighbours_excludes_self():
+    """
+    Test that every row gets its most similar other rows, most similar first.
+    """
+    features = np.array([[1, 0], [0.9, 0.1], [0, 1], [0.1, 0.9]], dtype=np.float32)
+    features /= np.linalg.norm(features, axis=1, keepdims=True)
+
+    positions, scores = top_k_neighbours(features, k=2)
+
+    assert positions[:, 0].tolist() == [1, 0, 3, 2]
+    assert (scores[:, 0] >= scores[:, 1]).all()
+
+
+def test_build_finds_similar_movies(db_session, tmp_path):
+    """
+    Test that the most similar movie shares the genre and plot of the movie.
+    """
+    add_movies(db_session)
+
+    build_similar_movies(db_session, str(tmp_path))
+    table = get_similar_movies(str(tmp_path))
+
+    assert [movie_id for movie_id, _ in table.similar(1)][0] == 3
+    assert sorted(movie_id for movie_id, _ in table.similar(1)) == [2, 3, 4]
+    assert [movie_id for movie_id, _ in table.similar(2, amount=1)] == [4]
+    assert table.similar(42) is None
+
+
+def test_build_replaces_previous_table(db_session, tmp_path):
+    """
+    Test that a new build becomes the current table and removes the old one.
+    """
+    add_movies(db_session)
+    build_similar_movies(db_session, str(tmp_path))
+    table = build_similar_movies(db_session, str(tmp_path))
+
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.startswith(".")) == \
+        ["CURRENT", f"similar-{table.version}"]
+    assert SimilarMovies.open(str(tmp_path / f"similar-{table.version}")).similar(3)[0][0] == 1
+
+
+def test_build_keeps_a_newer_current_table(db_session, tmp_path):
+    """
+    Test that a build that finishes after a newer one does not replace or remove the newer table.
+    """
+    add_movies(db_session)
+    newer = build_similar_movies(db_session, str(tmp_path))
+    older = SimilarMovies.build(db_session)
+    older.version = str(int(newer.version) - 1)
+
+    with patch("src.database.similar_movies.SimilarMovies.build", return_value=older):
+        build_similar_movies(db_session, str(tmp_path))
+
+    assert (tmp_path / "CURRENT").read_text(encoding="utf-8") == f"similar-{newer.version}"
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.startswith(".")) == \
+        ["CURRENT", f"similar-{newer.version}"]
+
+
+def test_concurrent_builds_publish_one_table(db_session, tmp_path):
+    """
+    Test that builds running at the same time do not remove each other's tables while they are written.
+    """
+    add_movies(db_session)
+    engine = db.engine
+
+    def build() -> None:
+        with Session(engine) as session:
+            build_similar_movies(session, str(tmp_path))
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        for future in [executor.submit(build) for _ in range(4)]:
+            future.result()
+
+    current = (tmp_path / "CURRENT").read_text(encoding="utf-8")
+    assert sorted(path.name for path in tmp_path.iterdir() if not path.name.startswith(".")) == ["CURRENT", current]
+    assert SimilarMovies.open(str(tmp_path / current)).similar(1)[0][0] == 3
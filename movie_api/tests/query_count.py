@@ -0,0 +1,35 @@
+"""
+Helper to assert how many SQL statements a block of code sends to the database.
+"""
+from contextlib import contextmanager
+from typing import Iterator
+
+from sqlalchemy import event
+
+from src.database import db
+
+
+@contextmanager
+def assert_max_queries(budget: int) -> Iterator[list[str]]:
+    """
+    Fail if the block sends more than budget statements to the database.
+
+    Usage:
+        with assert_max_queries(2):
+            client.get("/api/movies/list?amount=20")
+    :param budget: The maximum number of statements.
+    :return: The statements sent so far, for inspection inside the block.
+    """
+    statements: list[str] = []
+
+    def count_statement(_connection, _cursor, statement, _parameters, _context, _executemany) -> None:
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", count_statement)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count_statement)
+
+    assert len(statements) <= budget, \
+        f"{len(statements)} queries over a budget of {budget}:\n" + "\n".join(statements)
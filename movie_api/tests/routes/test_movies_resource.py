@@ -1,9 +1,20 @@
 """
 This module contains the test cases for the movies resource.
 """
+import json
+import struct
 from unittest.mock import patch, MagicMock
 
-from src.database import Movie
+import requests
+from flask import current_app
+
+from src.database import Movie, Genre
+from src.database.models.movie import DEFAULT_POSTER_PATH
+from src.database.catalog_loader import CatalogLoader
+from src.database.movie_index import rebuild_movie_index
+from src.database.catalog_snapshot import refresh_catalog_snapshot
+from src.database.similar_movies import build_similar_movies
+from tests.query_count import assert_max_queries
 
 
 def mock_movie_picture(mock_object: MagicMock) -> str:
@@ -16,7 +27,7 @@ def mock_movie_picture(mock_object: MagicMock) -> str:
     mock_object.return_value = mock_response
 
 
-@patch("src.database.models.movie.requests.get")
+@patch("src.database.models.movie.tmdb_session.get")
 def test_get_popular_movies_returns_limited_list(mock_get, client, db_session):
     """
     Test that the get_popular_movies endpoint returns a limited number of movies.
@@ -35,7 +46,7 @@ def test_get_popular_movies_returns_limited_list(mock_get, client, db_session):
     assert len(data["results"]) == 3
 
 
-@patch("src.database.models.movie.requests.get")
+@patch("src.database.models.movie.tmdb_session.get")
 def test_get_movie_details_returns_correct_movie(mock_get, client, db_session):
     """
     Test that the get_movie_details endpoint returns the correct movie details.
@@ -50,3 +61,462 @@ def test_get_movie_details_returns_correct_movie(mock_get, client, db_session):
     assert response.status_code == 200
     data = response.get_json()
     assert data["movie_name"] == "Inception"
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_popular_movies_sorted_by_rating(mock_get, client, db_session):
+    """
+    Test that the list endpoint returns the movies from the highest to the lowest rating.
+    """
+    for rating in [6.0, 9.0, 7.5]:
+        db_session.add(Movie(movie_name=f"Movie {rating}", rating=rating, runtime=100, meta_score=75, plot="Plot"))
+    db_session.commit()
+
+    mock_movie_picture(mock_get)
+
+    response = client.get("/api/movies/list?amount=3")
+
+    assert response.status_code == 200
+    assert [movie["rating"] for movie in response.get_json()["results"]] == [9.0, 7.5, 6.0]
+    assert response.get_json()["next"] is None
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_popular_movies_pages_through_catalog_with_cursor(mock_get, client, db_session):
+    """
+    Test that following the cursors returns every movie exactly once, including movies without a meta score.
+    """
+    for i in range(7):
+        db_session.add(Movie(movie_name=f"Movie {i}", rating=8.0, runtime=100,
+                             meta_score=None if i % 3 == 0 else 50 + i % 2, plot="Plot"))
+    db_session.commit()
+
+    mock_movie_picture(mock_get)
+
+    seen = []
+    url = "/api/movies/list?amount=2&sort_by=meta_score"
+    cursor = None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(data["results"])
+        cursor = data["next"]
+        if cursor is None:
+            break
+
+    assert sorted(movie["movie_id"] for movie in seen) == list(range(1, 8))
+    meta_scores = [movie["meta_score"] for movie in seen]
+    assert meta_scores == [51, 51, 50, 50, None, None, None]
+
+
+def test_get_popular_movies_invalid_cursor(client, db_session):  # pylint: disable=unused-argument
+    """
+    Test that an invalid cursor is rejected.
+    """
+    response = client.get("/api/movies/list?cursor=not-a-cursor")
+
+    assert response.status_code == 400
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_search_movies_ranks_name_matches_first(mock_get, client, db_session):
+    """
+    Test that the search finds movies on name and plot, with name matches ranked first.
+    """
+    db_session.add(Movie(movie_name="A Quiet Place", rating=7.5, runtime=90, meta_score=82,
+                         plot="A family hides from creatures that hunt by sound."))
+    db_session.add(Movie(movie_name="Alien", rating=8.5, runtime=117, meta_score=89,
+                         plot="The crew of a spaceship meets deadly creatures."))
+    db_session.add(Movie(movie_name="Creatures of the Deep", rating=5.0, runtime=95, meta_score=40,
+                         plot="Divers discover something."))
+    db_session.commit()
+
+    mock_movie_picture(mock_get)
+
+    response = client.get("/api/movies/search?q=creatures")
+
+    assert response.status_code == 200
+    names = [movie["movie_name"] for movie in response.get_json()["results"]]
+    assert names[0] == "Creatures of the Deep"
+    assert sorted(names[1:]) == ["A Quiet Place", "Alien"]
+
+    response = client.get("/api/movies/search?q=spaceship -family")
+    assert [movie["movie_name"] for movie in response.get_json()["results"]] == ["Alien"]
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_search_movies_follows_the_catalog(mock_get, client, db_session):
+    """
+    Test that a cached search is not served anymore once the catalog changes.
+    """
+    db_session.add(Movie(movie_name="Heist 1", rating=7.0, runtime=100, meta_score=70, plot="A robbery."))
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+    mock_movie_picture(mock_get)
+    assert len(client.get("/api/movies/search?q=heist").get_json()["results"]) == 1
+
+    db_session.add(Movie(movie_name="Heist 2", rating=7.0, runtime=100, meta_score=70, plot="A robbery."))
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+
+    assert len(client.get("/api/movies/search?q=heist").get_json()["results"]) == 2
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_search_movies_pages_with_cursor(mock_get, client, db_session):
+    """
+    Test that following the search cursors returns every match exactly once.
+    """
+    for i in range(5):
+        db_session.add(Movie(movie_name=f"Heist {i}", rating=7.0, runtime=100, meta_score=70, plot="A robbery."))
+    db_session.add(Movie(movie_name="Unrelated", rating=7.0, runtime=100, meta_score=70, plot="Nothing."))
+    db_session.commit()
+
+    mock_movie_picture(mock_get)
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get("/api/movies/search?q=heist&amount=2" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(movie["movie_id"] for movie in data["results"])
+        cursor = data["next"]
+        if cursor is None:
+            break
+
+    assert sorted(seen) == [1, 2, 3, 4, 5]
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_search_movies_pages_through_rank_ties(mock_get, client, db_session):
+    """
+    Test that the search cursor does not skip plot matches tied on a rank that is not exact in floating point.
+    """
+    for i in range(5):
+        db_session.add(Movie(movie_name=f"Movie {i}", rating=7.0, runtime=100, meta_score=70,
+                             plot="A daring heist."))
+    db_session.commit()
+
+    mock_movie_picture(mock_get)
+
+    seen = []
+    cursor = None
+    while True:
+        response = client.get("/api/movies/search?q=heist&amount=2" + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(movie["movie_id"] for movie in data["results"])
+        cursor = data["next"]
+        if cursor is None:
+            break
+
+    assert seen == [5, 4, 3, 2, 1]
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_popular_movies_filtered_with_facets(mock_get, client, db_session):
+    """
+    Test that the list endpoint filters on genre and rating and returns the genre facets.
+    """
+    action = Genre(genre_name="Action")
+    drama = Genre(genre_name="Drama")
+    for i, genres in enumerate([[action], [action, drama], [drama], [action]]):
+        movie = Movie(movie_name=f"Movie {i}", rating=6.0 + i, runtime=100, meta_score=75, plot="Plot")
+        movie.genres.extend(genres)
+        db_session.add(movie)
+    db_session.commit()
+    rebuild_movie_index(db_session)
+
+    mock_movie_picture(mock_get)
+
+    response = client.get("/api/movies/list?amount=5&genre=Action&min_rating=7")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [movie["movie_name"] for movie in data["results"]] == ["Movie 3", "Movie 1"]
+    assert data["facets"] == [
+        {"genre_id": 1, "genre_name": "Action", "count": 2},
+        {"genre_id": 2, "genre_name": "Drama", "count": 1},
+    ]
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_get_movie_details_not_modified(mock_get, client, db_session):
+    """
+    Test that a request with the ETag of the current catalog gets a 304 without building the movie again.
+    """
+    movie = Movie(movie_name="Inception", rating=9.0, runtime=148, meta_score=90, plot="Dreams within dreams")
+    db_session.add(movie)
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+    mock_movie_picture(mock_get)
+
+    response = client.get(f"/api/movies/{movie.movie_id}")
+    etag = response.headers["ETag"]
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"].startswith("public")
+
+    with patch("src.routes.movies_resource.fill_missing_posters") as fill_missing_posters, \
+            patch("src.routes.movies_resource.serialize") as serialize:
+        response = client.get(f"/api/movies/{movie.movie_id}", headers={"If-None-Match": etag})
+        fill_missing_posters.assert_not_called()
+        serialize.assert_not_called()
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert response.data == b""
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_movie_etags_change_with_catalog(mock_get, client, db_session):
+    """
+    Test that the ETags differ per movie and per list query, and change when the catalog changes.
+    """
+    for i in range(3):
+        db_session.add(Movie(movie_name=f"Movie {i}", rating=8.0 - i, runtime=100, meta_score=75, plot="Plot"))
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+    mock_movie_picture(mock_get)
+
+    first_page = client.get("/api/movies/list?amount=2")
+    assert client.get("/api/movies/list?amount=2", headers={"If-None-Match": first_page.headers["ETag"]}) \
+        .status_code == 304
+    assert client.get("/api/movies/list?amount=3").headers["ETag"] != first_page.headers["ETag"]
+    assert client.get("/api/movies/1").headers["ETag"] != client.get("/api/movies/2").headers["ETag"]
+
+    db_session.add(Movie(movie_name="Movie 3", rating=9.0, runtime=100, meta_score=75, plot="Plot"))
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+
+    response = client.get("/api/movies/list?amount=2", headers={"If-None-Match": first_page.headers["ETag"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first_page.headers["ETag"]
+    assert response.get_json()["results"][0]["movie_name"] == "Movie 3"
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_unresolved_poster_is_not_cached(mock_get, client, db_session):
+    """
+    Test that a response showing the default poster after a failed lookup gets no ETag and is not cached,
+    so the next request shows the poster once the lookup succeeds.
+    """
+    movie = Movie(movie_name="Inception", rating=9.0, runtime=148, meta_score=90, plot="Dreams within dreams")
+    db_session.add(movie)
+    db_session.commit()
+    refresh_catalog_snapshot(db_session)
+    mock_get.side_effect = requests.Timeout()
+
+    response = client.get(f"/api/movies/{movie.movie_id}")
+    assert response.status_code == 200
+    assert response.get_json()["poster_path"] == DEFAULT_POSTER_PATH
+    assert "ETag" not in response.headers
+    assert "Cache-Control" not in response.headers
+
+    mock_get.side_effect = None
+    mock_movie_picture(mock_get)
+    response = client.get(f"/api/movies/{movie.movie_id}")
+    assert response.get_json()["poster_path"] == "https://image.tmdb.org/t/p/w500/inception.jpg"
+    assert "ETag" in response.headers
+
+
+def test_get_movie_details_not_found(client, db_session):  # pylint: disable=unused-argument
+    """
+    Test that an unknown movie id gives a 404 without an ETag.
+    """
+    response = client.get("/api/movies/42")
+
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+
+
+def add_movies_with_genres(db_session, amount: int) -> None:
+    """
+    Add movies with two genres each and a known poster, so no TMDB lookups are needed.
+    """
+    genres = [Genre(genre_name=f"Genre {i}") for i in range(4)]
+    for i in range(amount):
+        movie = Movie(movie_name=f"Movie {i}", rating=5.0 + i / 10, runtime=100, meta_score=75, plot="Plot")
+        movie.poster_path = "/poster.jpg"
+        movie.genres.extend([genres[i % 4], genres[(i + 1) % 4]])
+        db_session.add(movie)
+    db_session.commit()
+    db_session.expunge_all()
+
+
+@patch("src.routes.movies_resource.get_catalog_snapshot", return_value=None)
+def test_movie_routes_load_genres_in_bulk(_, client, db_session):
+    """
+    Test that the database paths of the movie routes load the genres of all movies in one query.
+    """
+    add_movies_with_genres(db_session, 20)
+    rebuild_movie_index(db_session)
+
+    with assert_max_queries(2):
+        response = client.get("/api/movies/list?amount=20")
+    assert all(len(movie["genres"]) == 2 for movie in response.get_json()["results"])
+
+    with assert_max_queries(2):
+        response = client.get("/api/movies/list?amount=20&min_rating=5.5")
+    assert len(response.get_json()["results"]) == 15
+
+    with assert_max_queries(2):
+        response = client.get("/api/movies/list?" + "&".join(f"movie_ids={i}" for i in range(1, 21)))
+    assert len(response.get_json()["results"]) == 20
+
+    with assert_max_queries(2):
+        assert len(client.get("/api/movies/1").get_json()["genres"]) == 2
+
+
+@patch("src.routes.movies_resource.BATCH_CHUNK_SIZE", 2)
+def test_batch_streams_movies_as_ndjson(client, db_session):
+    """
+    Test that the batch route streams the requested movies in id order and reports the unknown ids.
+    """
+    add_movies_with_genres(db_session, 5)
+
+    with assert_max_queries(6):
+        response = client.post("/api/movies/batch", json={"movie_ids": [5, 1, 3, 42, 1, 4, 2]})
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [movie["movie_id"] for movie in lines[:-1]] == [1, 2, 3, 4, 5]
+    assert all(len(movie["genres"]) == 2 for movie in lines[:-1])
+    assert lines[-1] == {"not_found": [42]}
+
+
+def test_batch_accepts_binary_id_list(client, db_session):
+    """
+    Test that the batch route accepts the ids as little-endian 64-bit integers.
+    """
+    add_movies_with_genres(db_session, 3)
+
+    response = client.post(
+        "/api/movies/batch",
+        data=struct.pack("<3q", 3, 7, 1),
+        content_type="application/octet-stream",
+    )
+
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert [movie["movie_id"] for movie in lines[:-1]] == [1, 3]
+    assert lines[-1] == {"not_found": [7]}
+
+
+def test_batch_rejects_invalid_id_list(client, db_session):  # pylint: disable=unused-argument
+    """
+    Test that the batch route rejects bodies that are not a list of ids.
+    """
+    assert client.post("/api/movies/batch", json={"movie_ids": ["a"]}).status_code == 400
+    assert client.post("/api/movies/batch", json={"ids": [1]}).status_code == 400
+    assert client.post(
+        "/api/movies/batch", data=b"\x01\x02\x03", content_type="application/octet-stream"
+    ).status_code == 400
+
+
+def test_get_similar_movies(client, db_session):
+    """
+    Test that the similar movies route returns the precomputed neighbours of a movie.
+    """
+    add_movies_with_genres(db_session, 6)
+    build_similar_movies(db_session)
+
+    response = client.get("/api/movies/1/similar?amount=2")
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert len(results) == 2
+    assert 1 not in [movie["movie_id"] for movie in results]
+    assert client.get("/api/movies/42/similar").status_code == 404
+
+
+def test_recommend_movies_watched_by_friends(client, db_session):
+    """
+    Test that the friends recommendation route returns the unwatched movies most friends watched.
+    """
+    add_movies_with_genres(db_session, 5)
+
+    with assert_max_queries(2):
+        response = client.post("/api/movies/recommended/friends", json={
+            "friends_watched": {"10": [1, 2, 3], "11": [2, 3, 4], "12": [2, 5]},
+            "self_watched": [3],
+            "amount": 3,
+        })
+
+    assert response.status_code == 200
+    assert [movie["movie_id"] for movie in response.get_json()["results"]] == [2, 1, 4]
+    assert client.post("/api/movies/recommended/friends", json={"friends_watched": {"a": [1]}}).status_code == 400
+    assert client.post("/api/movies/recommended/friends", json={"friends_watched": [1]}).status_code == 400
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+@patch("src.routes.movies_resource.get_catalog_snapshot", return_value=None)
+def test_movie_routes_return_only_requested_fields(_, mock_get, client, db_session):
+    """
+    Test that the database paths only load the requested fields, without poster lookups or a genre query.
+    """
+    for i in range(3):
+        db_session.add(Movie(movie_name=f"Movie {i}", rating=7.0 + i, runtime=100, meta_score=75, plot="Plot"))
+    db_session.commit()
+    db_session.expunge_all()
+
+    with assert_max_queries(1):
+        response = client.get("/api/movies/list?amount=2&fields=movie_name,rating")
+    assert response.get_json()["results"] == [
+        {"movie_id": 3, "movie_name": "Movie 2", "rating": 9.0},
+        {"movie_id": 2, "movie_name": "Movie 1", "rating": 8.0},
+    ]
+    assert response.get_json()["next"] is not None
+
+    with assert_max_queries(1):
+        assert client.get("/api/movies/1?fields=runtime").get_json() == {"movie_id": 1, "runtime": 100}
+
+    with assert_max_queries(1):
+        response = client.post("/api/movies/batch?fields=movie_name", json={"movie_ids": [2, 1]})
+    assert [json.loads(line) for line in response.data.decode().splitlines()] == [
+        {"movie_id": 1, "movie_name": "Movie 0"}, {"movie_id": 2, "movie_name": "Movie 1"}, {"not_found": []}
+    ]
+    mock_get.assert_not_called()
+
+    assert client.get("/api/movies/list?fields=movie_name,budget").status_code == 400
+    assert client.get("/api/movies/1?fields=search_vector").status_code == 400
+
+
+def test_snapshot_routes_return_only_requested_fields(client, db_session):
+    """
+    Test that movies served from the catalog snapshot are limited to the requested fields too.
+    """
+    add_movies_with_genres(db_session, 3)
+    refresh_catalog_snapshot(db_session)
+
+    response = client.get("/api/movies/list?amount=3&fields=genres,poster_path")
+
+    assert response.status_code == 200
+    results = response.get_json()["results"]
+    assert [set(movie) for movie in results] == [{"movie_id", "poster_path", "genres"}] * 3
+    assert all(movie["poster_path"] == "/poster.jpg" and len(movie["genres"]) == 2 for movie in results)
+
+
+def test_catalog_routes_unavailable_until_loaded(client, db_session, tmp_path):
+    """
+    Test that the catalog routes and the readiness check answer 503 with Retry-After while the catalog is not loaded.
+    """
+    loader = CatalogLoader()
+    loader.run(
+        current_app, seed_dir=str(tmp_path / "no_seed"), csv_path=str(tmp_path / "missing.csv"), max_attempts=1
+    )
+    add_movies_with_genres(db_session, 1)
+
+    with patch("src.database.catalog_loader.catalog_loader", loader), \
+            patch("src.routes.health_resource.catalog_loader", loader):
+        response = client.get("/api/movies/1")
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+
+        ready = client.get("/api/movies/health/ready")
+        assert ready.status_code == 503
+        assert ready.get_json()["status"] == "failed"
+
+    assert client.get("/api/movies/1").status_code == 200
+    assert client.get("/api/movies/health/ready").get_json()["ready"]
@@ -0,0 +1,125 @@
+"""
+Test cases for the shared response cache.
+"""
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+from fakeredis import TcpFakeServer
+from flask import Flask
+
+from src.cache import cache, cached, get_cache_config, get_stats, make_key, make_view_key
+from src.database.models import Movie
+from src.config import CacheConfig, CacheBackend
+from tests.routes.test_movies_resource import mock_movie_picture
+
+# pylint: disable=redefined-outer-name
+
+
+@pytest.fixture(scope="module")
+def redis_url():
+    """
+    Run a local Redis stand-in that speaks the Redis protocol.
+    """
+    server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+def create_cached_app(cache_config: CacheConfig) -> tuple[Flask, list[int]]:
+    """
+    Create an app with one cached view that counts how often it is computed.
+    """
+    app = Flask(__name__)
+    app.config.update(get_cache_config(cache_config))
+    cache.init_app(app)
+    calls: list[int] = []
+
+    @app.route("/counter")
+    @cached(timeout=0, query_string=True)
+    def counter():
+        calls.append(len(calls) + 1)
+        return {"calls": len(calls)}
+
+    return app, calls
+
+
+def wait_for_refresh(app: Flask, url: str) -> None:
+    """
+    Wait until no worker is refreshing the response of a URL anymore.
+    """
+    with app.test_request_context(url):
+        refresh_key = f"{make_view_key('create_cached_app.<locals>.counter', query_string=True)}:refresh"
+        deadline = time.monotonic() + 5
+        while cache.get(refresh_key) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+def test_cache_config_per_backend(tmp_path):
+    """
+    Test that every backend maps to its Flask-Caching configuration.
+    """
+    assert get_cache_config(CacheConfig(backend=CacheBackend.SIMPLE))["CACHE_TYPE"] == "SimpleCache"
+    filesystem = get_cache_config(CacheConfig(backend=CacheBackend.FILESYSTEM, directory=str(tmp_path)))
+    assert (filesystem["CACHE_TYPE"], filesystem["CACHE_DIR"]) == ("FileSystemCache", str(tmp_path))
+    redis = get_cache_config(CacheConfig(backend=CacheBackend.REDIS, redis_url="redis://cache:6379/1"))
+    assert (redis["CACHE_TYPE"], redis["CACHE_REDIS_URL"]) == ("RedisCache", "redis://cache:6379/1")
+
+
+def test_keys_start_with_the_service_name():
+    """
+    Test that the cache keys of every service follow the same naming.
+    """
+    assert make_key("view", "MovieResource.get", "/api/movies/1") == "movie_api:view:MovieResource.get:/api/movies/1"
+
+
+@pytest.mark.parametrize("backend", [CacheBackend.FILESYSTEM, CacheBackend.REDIS])
+def test_stale_response_is_served_while_refreshed(backend, tmp_path, redis_url):
+    """
+    Test that a stale response is returned right away and replaced by a refreshed one in the background.
+    """
+    app, calls = create_cached_app(CacheConfig(backend=backend, directory=str(tmp_path), redis_url=redis_url))
+    with app.app_context():
+        cache.clear()
+
+    with app.test_client() as client:
+        assert client.get("/counter?page=1").json == {"calls": 1}
+        # Another query string is another response
+        assert client.get("/counter?page=2").json == {"calls": 2}
+
+        # The response went stale right away, so it is served once more while it is refreshed
+        assert client.get("/counter?page=1").json == {"calls": 1}
+        wait_for_refresh(app, "/counter?page=1")
+        assert client.get("/counter?page=1").json == {"calls": 3}
+        wait_for_refresh(app, "/counter?page=1")
+
+    assert calls == [1, 2, 3, 4]
+    with app.app_context():
+        stats = {view["view"]: view for view in get_stats()}
+    assert stats["create_cached_app.<locals>.counter"] == {
+        "view": "create_cached_app.<locals>.counter", "hit": 0, "stale": 2, "miss": 2
+    }
+
+
+@patch("src.database.models.movie.tmdb_session.get")
+def test_stats_route_counts_hits_and_misses(mock_get, client, db_session):
+    """
+    Test that the stats route reports the outcomes per cached view.
+    """
+    mock_movie_picture(mock_get)
+    db_session.add(Movie(movie_name="Movie 1", rating=8.0, runtime=120, meta_score=70, plot="Plot"))
+    db_session.commit()
+
+    client.get("/api/movies/1")
+    client.get("/api/movies/1")
+
+    response = client.get("/api/movies/cache/stats")
+
+    assert response.status_code == 200
+    stats = {view["view"]: view for view in response.json["results"]}
+    assert stats["MovieResource.get"]["miss"] == 1
+    assert stats["MovieResource.get"]["hit"] == 1
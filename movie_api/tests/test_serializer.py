@@ -0,0 +1,61 @@
+"""
+Test cases for the precompiled model serializers.
+"""
+import json
+from datetime import datetime
+
+from flask_restx import Model, fields, marshal
+
+from src.database.models import Movie, Genre
+from src.routes.movies_resource import movie_list_model
+from src.serializer import dumps, serialize
+
+genre_model = Model("TestGenre", {"genre_id": fields.Integer, "genre_name": fields.String(default="Unknown")})
+
+event_model = Model(
+    "TestEvent",
+    {
+        "id": fields.Integer(attribute="event_id"),
+        "label": fields.String(attribute=lambda event: f"Event {event['event_id']}"),
+        "genre_name": fields.String(attribute="genre.genre_name"),
+        "score": fields.Float,
+        "seen": fields.Boolean(default=False),
+        "at": fields.DateTime,
+        "genre": fields.Nested(genre_model),
+        "optional_genre": fields.Nested(genre_model, allow_null=True),
+        "genres": fields.List(fields.Nested(genre_model)),
+        "counts": fields.List(fields.Integer),
+        "extra": fields.Raw,
+        "link": fields.FormattedString("/events/{event_id}"),
+    },
+)
+
+
+def test_serialize_matches_marshal():
+    """
+    Test that the compiled serializer outputs every kind of field like marshal, for present and missing values.
+    """
+    events = [
+        {
+            "event_id": 1, "score": 7, "seen": 1, "at": datetime(2025, 1, 2, 3, 4, 5, 6),
+            "genre": {"genre_id": "2", "genre_name": "Drama"}, "optional_genre": None,
+            "genres": [{"genre_id": 3}, None], "counts": [1, "2", None], "extra": {"any": [1]},
+        },
+        {"event_id": 2, "genres": {"genre_id": 4}},
+    ]
+
+    assert serialize(events, event_model) == marshal(events, event_model)
+
+
+def test_serialize_reads_objects_like_marshal():
+    """
+    Test that database objects serialize like marshal, including the callable poster path attribute.
+    """
+    movie = Movie(movie_name="Movie", rating=7.5, runtime=100, meta_score=None, plot="Plot")
+    movie.movie_id = 1
+    movie.genres.append(Genre(genre_name="Drama"))
+    data = {"results": [movie], "next": None}
+
+    assert serialize(data, movie_list_model) == marshal(data, movie_list_model)
+    assert json.loads(dumps(serialize(data, movie_list_model))) == \
+        json.loads(json.dumps(marshal(data, movie_list_model)))
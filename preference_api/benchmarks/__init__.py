@@ -0,0 +1,5 @@
+"""
+Benchmarks of the preference API, run them from the preference_api directory:
+
+    python -m benchmarks.<module>
+"""
@@ -0,0 +1,67 @@
+"""
+Benchmark of training the rating factors on a million synthetic ratings, and of scoring and folding in a user.
+
+    python -m benchmarks.matrix_factorization
+"""
+import time
+import timeit
+
+import numpy as np
+
+from src.database.matrix_factorization import FACTORS, ITERATIONS, RatingFactors
+
+USERS = 50_000
+MOVIES = 10_000
+RATINGS = 1_000_000
+RANK = 8
+MAX_TRAIN_SECONDS = 300
+REPEAT = 100
+
+
+def synthetic_ratings(seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sample distinct (user, movie) pairs and rate them with a low rank model plus noise, on the 1-10 scale.
+    :param seed: The seed of the generator.
+    :return: The user ids, movie ids and ratings.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = np.unique(rng.integers(0, USERS * MOVIES, int(RATINGS * 1.01)))
+    pairs = rng.permutation(pairs)[:RATINGS]
+    users, movies = pairs // MOVIES, pairs % MOVIES
+    user_tastes = rng.normal(0, 0.5, (USERS, RANK))
+    movie_traits = rng.normal(0, 1, (MOVIES, RANK))
+    ratings = 5.5 + np.einsum("ij,ij->i", user_tastes[users], movie_traits[movies]) + rng.normal(0, 0.5, len(pairs))
+    return users + 1, movies + 1, np.clip(ratings, 1, 10).astype(np.float32)
+
+
+def main() -> None:
+    """
+    Train on 90% of the ratings, then report the time and the error on the training and held out ratings.
+    """
+    users, movies, ratings = synthetic_ratings()
+    train = np.arange(len(ratings)) % 10 != 0
+    test = ~train & np.isin(users, users[train]) & np.isin(movies, movies[train])
+
+    start = time.perf_counter()
+    factors = RatingFactors.train(users[train], movies[train], ratings[train])
+    elapsed = time.perf_counter() - start
+    print(f"trained {int(train.sum()):,} ratings, {FACTORS} factors, {ITERATIONS} iterations in {elapsed:.1f} s "
+          f"({elapsed / ITERATIONS:.2f} s per iteration)")
+    print(f"training RMSE {factors.rmse(users[train], movies[train], ratings[train]):.3f}, "
+          f"held out RMSE {factors.rmse(users[test], movies[test], ratings[test]):.3f}, "
+          f"rating standard deviation {ratings.std():.3f}")
+
+    user_ratings = {int(movie_id): float(rating) for movie_id, rating in zip(movies[users == 1], ratings[users == 1])}
+    vector = factors.fold_in(user_ratings)
+    assert vector is not None
+    fold_in = min(timeit.repeat(lambda: factors.fold_in(user_ratings), number=1, repeat=REPEAT))
+    score = min(timeit.repeat(
+        lambda: factors.recommend(vector, amount=20, exclude=list(user_ratings)), number=1, repeat=REPEAT
+    ))
+    print(f"fold-in of a user with {len(user_ratings)} ratings {fold_in * 1000:.2f} ms, "
+          f"top 20 of {MOVIES:,} movies {score * 1000:.2f} ms")
+    assert elapsed < MAX_TRAIN_SECONDS, f"training took {elapsed:.0f} s, over {MAX_TRAIN_SECONDS} s"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Client for the watched sets of the activity API.
+"""
+from typing import Iterator, Sequence
+
+import numpy as np
+
+from src.service_client import read_json, service_session
+
+ACTIVITY_MEMBERSHIP_URL = "http://activity_api:5000/api/activity/watched/membership"
+"""The activity API route that checks many (user, movie) pairs at once."""
+
+ACTIVITY_BITMAP_URL = "http://activity_api:5000/api/activity/watched/bitmap/{user_id}"
+"""The activity API route that returns the movies a user watched as a bitmap."""
+
+
+class WatchedMovies:
+    """
+    The movies a user watched, decoded from the bitmap of the activity API.
+    """
+
+    def __init__(self, bitmap: bytes = b"") -> None:
+        """
+        Initialize a WatchedMovies object.
+        :param bitmap: The little-endian bitmap, bit i of byte i // 8 is set if the user watched movie i.
+        """
+        self.bits = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), bitorder="little").astype(bool)
+
+    def __contains__(self, movie_id: object) -> bool:
+        """
+        Check whether the user watched a movie.
+        :param movie_id: The id of the movie.
+        :return: Whether the user watched it.
+        """
+        return isinstance(movie_id, int) and 0 <= movie_id < len(self.bits) and bool(self.bits[movie_id])
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Iterate over the watched movies.
+        :return: The movie ids, in increasing order.
+        """
+        return iter(np.flatnonzero(self.bits).tolist())
+
+    def __len__(self) -> int:
+        """
+        Get the number of watched movies.
+        :return: The number of movies.
+        """
+        return int(self.bits.sum())
+
+
+def fetch_watched_movies(user_id: int, cookies: dict[str, str], timeout: float = 5) -> WatchedMovies:
+    """
+    Fetch all the movies a user watched, as a bitmap of at most a few kilobytes.
+    :param user_id: The id of the user.
+    :param cookies: The cookies to send along, like the access token.
+    :param timeout: The number of seconds to wait for the activity API.
+    :return: The watched movies.
+    :raises requests.RequestException: If the activity API cannot be reached or answers with an error.
+    """
+    response = service_session.get(ACTIVITY_BITMAP_URL.format(user_id=user_id), cookies=cookies, timeout=timeout)
+    response.raise_for_status()
+    return WatchedMovies(response.content)
+
+
+def check_watched(
+    pairs: Sequence[tuple[int, int]],
+    cookies: dict[str, str],
+    csrf_token: str,
+    timeout: float = 5
+) -> list[bool]:
+    """
+    Check for many (user, movie) pairs whether the user watched the movie, with one call.
+    :param pairs: The (user id, movie id) pairs.
+    :param cookies: The cookies to send along, like the access token.
+    :param csrf_token: The CSRF token of the access token, the activity API checks it on POST.
+    :param timeout: The number of seconds to wait for the activity API.
+    :return: Whether the user watched the movie, for every pair in order.
+    :raises ServiceError: If the activity API answers with an error.
+    :raises requests.RequestException: If the activity API cannot be reached.
+    """
+    response = service_session.post(
+        ACTIVITY_MEMBERSHIP_URL,
+        json={"pairs": [{"user_id": user_id, "movie_id": movie_id} for user_id, movie_id in pairs]},
+        cookies=cookies,
+        headers={"X-CSRF-Token": csrf_token},
+        timeout=timeout,
+    )
+    results: list[bool] = read_json(response, "error while getting watched movies")["results"]
+    return results
@@ -7,6 +7,7 @@ Disclaimer: This is based on our bachelor eindwerk project setup, which I also l
 """
 import logging
 import os
+import sys
 from dotenv import load_dotenv
 from confz import EnvSource
 from flask import Flask
@@ -15,8 +16,10 @@ from flask_jwt_extended import JWTManager
 
 from src.config import APIConfig
 from src.database.database import db
+from src.database.item_similarity import item_recommender
+from src.database.matrix_factorization import start_training
 from src.routes import register_public_routes
-from src.cache import cache
+from src.cache import cache, get_cache_config
 from src.limiter import limiter
 from src.error_handlers import register_error_handlers
 
@@ -51,6 +54,7 @@ def create_app(api_config: APIConfig) -> Flask:
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = api_config.db.connection_url
     flask_app.config["SECRET_KEY"] = api_config.secret_key
     flask_app.config["DEBUG"] = api_config.debug
+    flask_app.config.update(get_cache_config(api_config.cache))
 
     CORS(flask_app, supports_credentials=True)
     db.init_app(flask_app)
@@ -66,6 +70,12 @@ def create_app(api_config: APIConfig) -> Flask:
     # Register routes
     register_public_routes(flask_app)
 
+    # Compute the item similarities in the background and keep them up to date with the ratings
+    # and train the rating factors periodically
+    if "pytest" not in sys.modules:
+        item_recommender.start(flask_app)
+        start_training(flask_app)
+
     return flask_app
 
 
@@ -1,12 +1,190 @@
 """
 Cache configuration for Flask application.
 
-This module sets up the Flask-Caching for the application.
-The default configuration is a simple cache with a timeout of 300 seconds (5 minutes).
+This module sets up the Flask-Caching for the application. The cache is shared by all gunicorn workers:
+the "filesystem" backend keeps it in a directory on the host, the "redis" backend on a Redis server (or
+anything else that speaks the Redis protocol) that several hosts can share. The "simple" backend keeps a
+cache per worker.
+
+All keys start with the name of the service, so the services can share one Redis:
+"<service>:view:<view>:<path>[:<query hash>][:<vary>]" for responses and "<service>:stats:<view>:<outcome>" for the
+hit and miss counters.
 """
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Optional, TypeVar
+
+from flask import copy_current_request_context, current_app, request
 from flask_caching import Cache
+from flask_caching.backends import RedisCache
+
+from src.config import CacheBackend, CacheConfig
+
+SERVICE_NAME = "preference_api"
+"""The name of the service, the first part of every cache key."""
+
+OUTCOMES = ("hit", "stale", "miss")
+"""The outcomes that are counted per cached view."""
+
+REFRESH_TIMEOUT = 30
+"""The number of seconds a worker has to refresh a stale response before another worker may try."""
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+cache = Cache()
+
+cached_views: list[str] = []
+"""The names of the views that are cached, in the order they were decorated."""
+
+refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="cache-refresh")
+_counter_lock = threading.Lock()
+
+
+def get_cache_config(cache_config: CacheConfig) -> dict[str, Any]:
+    """
+    Get the Flask-Caching configuration for the configured backend.
+    :param cache_config: The cache configuration.
+    :return: The Flask configuration values.
+    """
+    config: dict[str, Any] = {
+        "CACHE_DEFAULT_TIMEOUT": cache_config.default_timeout,
+        "CACHE_STALE_TIMEOUT": cache_config.stale_timeout,
+        # The keys are prefixed by make_key, the same for every backend
+        "CACHE_KEY_PREFIX": "",
+    }
+    if cache_config.backend == CacheBackend.REDIS:
+        config.update({"CACHE_TYPE": "RedisCache", "CACHE_REDIS_URL": cache_config.redis_url})
+    elif cache_config.backend == CacheBackend.FILESYSTEM:
+        directory = cache_config.directory or os.path.join(tempfile.gettempdir(), f"{SERVICE_NAME}_cache")
+        config.update({"CACHE_TYPE": "FileSystemCache", "CACHE_DIR": directory})
+    else:
+        config.update({"CACHE_TYPE": "SimpleCache"})
+    return config
+
+
+def make_key(*parts: str) -> str:
+    """
+    Make a cache key of this service.
+    :param parts: The parts of the key.
+    :return: The key.
+    """
+    return ":".join((SERVICE_NAME, *parts))
+
+
+def make_view_key(view_name: str, query_string: bool, vary: Optional[Callable[[], str]] = None) -> str:
+    """
+    Make the cache key of the current request to a view.
+    :param view_name: The name of the view.
+    :param query_string: Whether the query string is part of the key.
+    :param vary: Returns an extra part of the key for the current request, None for no extra part.
+    :return: The key.
+    """
+    parts = ["view", view_name, request.path]
+    if query_string:
+        query = "&".join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+        parts.append(hashlib.md5(query.encode()).hexdigest())
+    if vary is not None:
+        parts.append(vary())
+    return make_key(*parts)
+
+
+def count(view_name: str, outcome: str) -> None:
+    """
+    Count a cache outcome of a view.
+
+    Redis increments atomically, the other backends increment under a lock per worker, so concurrent
+    workers can lose an increment now and then.
+    :param view_name: The name of the view.
+    :param outcome: One of OUTCOMES.
+    """
+    key = make_key("stats", view_name, outcome)
+    if isinstance(cache.cache, RedisCache):
+        cache.cache.inc(key)
+        return
+    with _counter_lock:
+        cache.set(key, int(cache.get(key) or 0) + 1, timeout=0)
+
+
+def get_stats() -> list[dict[str, Any]]:
+    """
+    Get the cache outcome counters of every cached view.
+    :return: List of {"view": name, "hit": count, "stale": count, "miss": count}.
+    """
+    stats = []
+    for view_name in cached_views:
+        counts = {outcome: int(cache.get(make_key("stats", view_name, outcome)) or 0) for outcome in OUTCOMES}
+        stats.append({"view": view_name, **counts})
+    return stats
+
+
+def store(key: str, response: Any, timeout: int) -> Any:
+    """
+    Store a response together with the moment it goes stale.
+    :param key: The cache key.
+    :param response: The response of the view.
+    :param timeout: The number of seconds the response is fresh.
+    :return: The response.
+    """
+    stale_timeout = int(current_app.config.get("CACHE_STALE_TIMEOUT", 0))
+    cache.set(key, (response, time.time() + timeout), timeout=timeout + stale_timeout)
+    return response
+
+
+def cached(
+    timeout: Optional[int] = None,
+    query_string: bool = False,
+    vary: Optional[Callable[[], str]] = None
+) -> Callable[[F], F]:
+    """
+    Cache the responses of a view, like Cache.cached, and serve them stale while they are refreshed.
+
+    A response is fresh for timeout seconds. After that it is served for another CACHE_STALE_TIMEOUT
+    seconds, while one worker computes the new response in the background.
+    :param timeout: The number of seconds a response is fresh, the default timeout of the cache if None.
+    :param query_string: Whether the query string is part of the key.
+    :param vary: Returns an extra part of the key for the current request, like a data version.
+    :return: The decorator.
+    """
+    def decorator(view: F) -> F:
+        view_name = view.__qualname__
+        cached_views.append(view_name)
+
+        @wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            key = make_view_key(view_name, query_string, vary)
+            fresh_timeout = timeout if timeout is not None else int(current_app.config["CACHE_DEFAULT_TIMEOUT"])
+
+            entry = cache.get(key)
+            if entry is None:
+                count(view_name, "miss")
+                return store(key, view(*args, **kwargs), fresh_timeout)
+
+            response, fresh_until = entry
+            if time.time() < fresh_until:
+                count(view_name, "hit")
+                return response
+
+            count(view_name, "stale")
+            # Only the worker that claims the refresh recomputes the response
+            if cache.add(f"{key}:refresh", True, timeout=REFRESH_TIMEOUT):
+                @copy_current_request_context
+                def refresh() -> None:
+                    try:
+                        store(key, view(*args, **kwargs), fresh_timeout)
+                    except Exception as e:  # pylint: disable=broad-exception-caught
+                        logging.error("Could not refresh %s: %s", key, e)
+                    finally:
+                        cache.delete(f"{key}:refresh")
+
+                refresh_executor.submit(refresh)
+            return response
+
+        return wrapper  # type: ignore[return-value]
 
-cache = Cache(config={
-    'CACHE_TYPE': 'SimpleCache',
-    'CACHE_DEFAULT_TIMEOUT': 300
-})
+    return decorator
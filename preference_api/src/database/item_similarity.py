@@ -0,0 +1,324 @@
+"""
+Item-item collaborative filtering over the ratings.
+
+A periodic job turns the ratings into a sparse user x movie matrix and computes the cosine similarity of every
+two movies rated by the same users with SciPy, keeping only the TOP_K most similar movies of every movie.
+The recommendations of a user are the movies most similar to the movies they rated, weighted by their ratings.
+They are kept in memory, and a new rating is folded into them right away instead of waiting for the next build.
+"""
+import heapq
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Container, Optional
+
+import numpy as np
+import numpy.typing as npt
+from flask import Flask
+from scipy import sparse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.database.database import db
+from src.database.models import Rating
+
+TOP_K = 50
+"""The number of most similar movies kept per movie."""
+
+BLOCK_SIZE = 1024
+"""The number of movies whose similarities are computed at a time, to bound the memory use."""
+
+REBUILD_INTERVAL = float(os.getenv("ITEM_SIMILARITY_REBUILD_INTERVAL", "600"))
+"""The number of seconds between two builds of the similarities."""
+
+MAX_CACHED_USERS = 10000
+"""The number of users whose recommendations are kept in memory, the least recently used are dropped first."""
+
+MIN_SCORE = 1e-6
+"""Scores at or below this are left out, so movies whose ratings were all removed again are not recommended."""
+
+
+def rating_matrix(db_session: Session) -> tuple[npt.NDArray[np.int64], sparse.csc_matrix]:
+    """
+    Read the ratings into a sparse user x movie matrix whose columns have unit length.
+    :param db_session: The database session.
+    :return: The sorted ids of the rated movies and the matrix, with a column per movie in that order.
+    """
+    rows = db_session.execute(select(Rating.user_id, Rating.movie_id, Rating.rating)).tuples().all()
+    user_ids, user_positions = np.unique(np.array([row[0] for row in rows], dtype=np.int64), return_inverse=True)
+    movie_ids, movie_positions = np.unique(np.array([row[1] for row in rows], dtype=np.int64), return_inverse=True)
+    matrix = sparse.csc_matrix(
+        (np.array([row[2] for row in rows], dtype=np.float32), (user_positions, movie_positions)),
+        shape=(len(user_ids), len(movie_ids))
+    )
+
+    # Scaled to unit length, the dot product of two columns is the cosine similarity of the movies
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0), dtype=np.float32).ravel())
+    return movie_ids, (matrix @ sparse.diags(1 / np.where(norms > 0, norms, 1))).tocsc()
+
+
+def top_k_similar(
+    positions: npt.NDArray[np.int32],
+    scores: npt.NDArray[np.float32],
+    own_position: int,
+    k: int
+) -> tuple[npt.NDArray[np.int32], npt.NDArray[np.float32]]:
+    """
+    Prune the similarities of a movie to the k most similar other movies.
+    :param positions: The positions of the movies that share a user with the movie.
+    :param scores: The similarity to every one of them.
+    :param own_position: The position of the movie itself, which is left out.
+    :param k: The number of movies to keep.
+    :return: The positions and similarities of the kept movies, most similar first and ties by position.
+    """
+    keep = (positions != own_position) & (scores > 0)
+    positions, scores = positions[keep], scores[keep]
+    if len(positions) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        positions, scores = positions[top], scores[top]
+    order = np.lexsort((positions, -scores))
+    return positions[order], scores[order].astype(np.float32)
+
+
+class ItemSimilarity:
+    """
+    Read-only table of the most similar movies of every rated movie.
+    """
+
+    def __init__(
+        self,
+        movie_ids: npt.NDArray[np.int64],
+        offsets: npt.NDArray[np.int64],
+        neighbour_ids: npt.NDArray[np.int64],
+        similarities: npt.NDArray[np.float32]
+    ) -> None:
+        """
+        Initialize an ItemSimilarity object.
+        :param movie_ids: The sorted ids of the rated movies.
+        :param offsets: Where the neighbours of every movie start in the neighbour arrays, with the end at the end.
+        :param neighbour_ids: The ids of the most similar movies of every movie, most similar first.
+        :param similarities: The cosine similarity of every neighbour.
+        """
+        self.movie_ids = movie_ids
+        self.offsets = offsets
+        self.neighbour_ids = neighbour_ids
+        self.similarities = similarities
+
+    @staticmethod
+    def build(db_session: Session, k: int = TOP_K) -> "ItemSimilarity":
+        """
+        Compute the table from the ratings in the database.
+        :param db_session: The database session.
+        :param k: The number of similar movies kept per movie.
+        :return: The table.
+        """
+        movie_ids, matrix = rating_matrix(db_session)
+        transposed = matrix.T.tocsr()
+
+        offsets = [0]
+        neighbours: list[npt.NDArray[np.int64]] = []
+        similarities: list[npt.NDArray[np.float32]] = []
+        for start in range(0, len(movie_ids), BLOCK_SIZE):
+            block = (transposed[start:start + BLOCK_SIZE] @ matrix).tocsr()
+            for row in range(block.shape[0]):
+                positions, scores = top_k_similar(
+                    block.indices[block.indptr[row]:block.indptr[row + 1]],
+                    block.data[block.indptr[row]:block.indptr[row + 1]],
+                    start + row,
+                    k
+                )
+                neighbours.append(movie_ids[positions])
+                similarities.append(scores)
+                offsets.append(offsets[-1] + len(positions))
+
+        return ItemSimilarity(
+            movie_ids,
+            np.array(offsets, dtype=np.int64),
+            np.concatenate(neighbours) if neighbours else np.empty(0, dtype=np.int64),
+            np.concatenate(similarities) if similarities else np.empty(0, dtype=np.float32),
+        )
+
+    def neighbours(self, movie_id: int) -> list[tuple[int, float]]:
+        """
+        Get the most similar movies of a movie.
+        :param movie_id: The id of the movie.
+        :return: List of (movie id, similarity), most similar first, empty if nobody rated the movie at build time.
+        """
+        position = int(np.searchsorted(self.movie_ids, movie_id))
+        if position >= len(self.movie_ids) or self.movie_ids[position] != movie_id:
+            return []
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return list(zip(self.neighbour_ids[start:end].tolist(), self.similarities[start:end].tolist()))
+
+
+class UserRecommendations:
+    """
+    The ratings of a user and the scores of the movies similar to them.
+
+    The score of a movie is the sum of its similarity to every movie the user rated times that rating.
+    """
+
+    def __init__(self, similarity: ItemSimilarity, ratings: dict[int, float]) -> None:
+        """
+        Initialize a UserRecommendations object.
+        :param similarity: The similarity table the scores are computed with.
+        :param ratings: The rating of the user per movie id.
+        """
+        self.similarity = similarity
+        self.ratings: dict[int, float] = {}
+        self.scores: dict[int, float] = {}
+        for movie_id, rating in ratings.items():
+            self.rate(movie_id, rating)
+
+    def rate(self, movie_id: int, rating: Optional[float]) -> None:
+        """
+        Fold a new, changed or removed rating into the scores.
+        :param movie_id: The id of the rated movie.
+        :param rating: The new rating, None if the rating was removed.
+        """
+        change = (rating or 0.0) - self.ratings.pop(movie_id, 0.0)
+        if rating is not None:
+            self.ratings[movie_id] = rating
+        if change == 0:
+            return
+        for neighbour_id, similarity in self.similarity.neighbours(movie_id):
+            self.scores[neighbour_id] = self.scores.get(neighbour_id, 0.0) + similarity * change
+
+    def top(self, amount: int, exclude: Container[int] = ()) -> list[tuple[int, float]]:
+        """
+        Get the best scoring movies the user has not rated.
+        :param amount: The number of movies.
+        :param exclude: The ids of other movies to leave out, like the movies the user watched.
+        :return: List of (movie id, score), the best first and ties by movie id.
+        """
+        return heapq.nsmallest(
+            amount,
+            (
+                (movie_id, score) for movie_id, score in self.scores.items()
+                if score > MIN_SCORE and movie_id not in self.ratings and movie_id not in exclude
+            ),
+            key=lambda item: (-item[1], item[0])
+        )
+
+
+class ItemRecommender:
+    """
+    Serves the recommendations of the users from memory and rebuilds the similarities periodically.
+    """
+
+    def __init__(self, max_users: int = MAX_CACHED_USERS) -> None:
+        """
+        Initialize an ItemRecommender without similarities.
+        :param max_users: The number of users whose recommendations are kept in memory.
+        """
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._similarity: Optional[ItemSimilarity] = None
+        self._users: OrderedDict[int, UserRecommendations] = OrderedDict()
+
+    @property
+    def similarity(self) -> Optional[ItemSimilarity]:
+        """
+        The current similarity table, None until the first build.
+        """
+        with self._lock:
+            return self._similarity
+
+    def rebuild(self, db_session: Session) -> ItemSimilarity:
+        """
+        Compute the similarities from the current ratings and start serving them.
+        :param db_session: The database session.
+        :return: The new similarity table.
+        """
+        start = time.perf_counter()
+        similarity = ItemSimilarity.build(db_session)
+        with self._lock:
+            self._similarity = similarity
+            # The recommendations in memory were scored with the old table
+            self._users.clear()
+        logging.info("Computed the item similarities of %d movies in %.2f seconds.", len(similarity.movie_ids),
+                     time.perf_counter() - start)
+        return similarity
+
+    def recommend(
+        self,
+        db_session: Session,
+        user_id: int,
+        amount: int = 10,
+        exclude: Container[int] = ()
+    ) -> list[tuple[int, float]]:
+        """
+        Get the recommended movies of a user, reading their ratings the first time.
+        :param db_session: The database session.
+        :param user_id: The id of the user.
+        :param amount: The number of movies.
+        :param exclude: The ids of movies to leave out besides the rated ones, like the movies the user watched.
+        :return: List of (movie id, score), the best first, empty before the first build or without ratings.
+        """
+        with self._lock:
+            similarity = self._similarity
+            user = self._users.get(user_id)
+            if user is not None:
+                self._users.move_to_end(user_id)
+                return user.top(amount, exclude)
+        if similarity is None:
+            return []
+
+        ratings = db_session.execute(
+            select(Rating.movie_id, Rating.rating).where(Rating.user_id == user_id)
+        ).tuples().all()
+        user = UserRecommendations(similarity, dict(ratings))
+        with self._lock:
+            if self._similarity is similarity:
+                self._users[user_id] = user
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            return user.top(amount, exclude)
+
+    def fold_in(self, user_id: int, movie_id: int, rating: Optional[float]) -> None:
+        """
+        Update the recommendations of a user in memory after they rated a movie.
+
+        Users that are not in memory read their ratings again on their next request.
+        :param user_id: The id of the user.
+        :param movie_id: The id of the rated movie.
+        :param rating: The new rating, None if the rating was removed.
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                user.rate(movie_id, rating)
+
+    def start(self, flask_app: Flask, interval: float = REBUILD_INTERVAL) -> threading.Thread:
+        """
+        Rebuild the similarities every interval seconds in a background thread, starting right away.
+        :param flask_app: The Flask app, whose database engine is used.
+        :param interval: The number of seconds between two builds.
+        :return: The rebuild thread.
+        """
+        thread = threading.Thread(
+            target=self._run, args=(flask_app, interval), name="item-similarity", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def _run(self, flask_app: Flask, interval: float) -> None:
+        """
+        Rebuild the similarities forever.
+        :param flask_app: The Flask app, whose database engine is used.
+        :param interval: The number of seconds between two builds.
+        """
+        while True:
+            with flask_app.app_context(), Session(db.engine) as db_session:
+                try:
+                    self.rebuild(db_session)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # The previous similarities are served until the next build succeeds
+                    logging.error("Could not compute the item similarities: %s", e)
+            time.sleep(interval)
+
+
+item_recommender = ItemRecommender()
+"""The recommender of this process."""
@@ -0,0 +1,449 @@
+"""
+Matrix factorization of the ratings, trained with alternating least squares.
+
+A background job factors the user x movie rating matrix into user and movie factor matrices. Every training
+run is written to its own directory of .npy files with a manifest holding its version, and the name of the
+current run is swapped in atomically, so the workers memory-map it and a recommendation is one matrix-vector
+product. Users who rated movies after the last run are folded in from their ratings on the fly.
+It can also be run on its own:
+
+    python -m src.database.matrix_factorization
+"""
+import json
+import logging
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Optional
+
+import numpy as np
+import numpy.typing as npt
+from confz import EnvSource
+from flask import Flask
+from scipy import sparse
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+
+from src.config import APIConfig
+from src.database.database import db
+from src.database.models import Rating
+
+FACTORS_DIR = os.getenv("RATING_FACTORS_DIR", os.path.join(tempfile.gettempdir(), "rating_factors"))
+"""The directory the factor matrices are stored in, shared by all workers on the host."""
+
+FACTORS = 32
+"""The number of latent factors per user and movie."""
+
+ITERATIONS = 10
+"""The number of alternating least squares iterations."""
+
+REGULARIZATION = 0.1
+"""The regularization of the factors, scaled by the number of ratings of every user and movie."""
+
+CG_STEPS = 3
+"""The number of conjugate gradient steps per solve, warm started from the factors of the previous iteration."""
+
+TRAIN_INTERVAL = float(os.getenv("RATING_FACTORS_TRAIN_INTERVAL", "3600"))
+"""The number of seconds between two training runs."""
+
+TRAIN_LOCK = 0x616C73
+"""The Postgres advisory lock that makes only one process per host train per run, together with the host key."""
+
+VERSION_CHECK_INTERVAL = 30.0
+"""The number of seconds a run is used before checking for a newer one."""
+
+Matrix = npt.NDArray[np.float32]
+
+
+def find_positions(
+    sorted_ids: npt.NDArray[np.int64],
+    ids: npt.NDArray[np.int64]
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.bool_]]:
+    """
+    Find ids in a sorted id array.
+    :param sorted_ids: The sorted ids.
+    :param ids: The ids to look up.
+    :return: The position of every id and whether it was found, positions of ids not found are meaningless.
+    """
+    positions = np.minimum(np.searchsorted(sorted_ids, ids), max(len(sorted_ids) - 1, 0))
+    found = sorted_ids[positions] == ids if len(sorted_ids) else np.zeros(len(ids), dtype=np.bool_)
+    return positions, found
+
+
+def row_dot(left: Matrix, right: Matrix) -> Matrix:
+    """
+    Compute the dot product of every row of two matrices.
+    :param left: The first matrix.
+    :param right: The second matrix, of the same shape.
+    :return: The dot products.
+    """
+    dots: Matrix = np.einsum("ij,ij->i", left, right)
+    return dots
+
+
+def conjugate_gradient(
+    apply: Callable[[Matrix], Matrix],
+    target: Matrix,
+    start: Matrix,
+    steps: int
+) -> Matrix:
+    """
+    Take conjugate gradient steps towards the solutions of many symmetric positive definite systems at once.
+    :param apply: Multiplies every row of a matrix with the system of that row.
+    :param target: The right-hand side of every system.
+    :param start: The starting point of every system.
+    :param steps: The number of steps.
+    :return: The approximate solution of every system.
+    """
+    solution = start.copy()
+    residual = target - apply(solution)
+    direction = residual.copy()
+    residual_norm = row_dot(residual, residual)
+    for _ in range(steps):
+        applied = apply(direction)
+        curvature = row_dot(direction, applied)
+        step = np.divide(residual_norm, curvature, out=np.zeros_like(curvature), where=curvature > 0)[:, None]
+        solution += step * direction
+        residual -= step * applied
+        new_norm = row_dot(residual, residual)
+        ratio = np.divide(new_norm, residual_norm, out=np.zeros_like(new_norm), where=residual_norm > 0)
+        direction = residual + ratio[:, None] * direction
+        residual_norm = new_norm
+    return solution
+
+
+def solve_factors(
+    matrix: sparse.csr_matrix,
+    fixed: Matrix,
+    current: Matrix,
+    regularization: float = REGULARIZATION,
+    steps: int = CG_STEPS
+) -> Matrix:
+    """
+    Solve the regularized least squares factors of every row of a sparse matrix, given the column factors.
+
+    Instead of building and inverting the normal equations of every row, all rows take a few conjugate
+    gradient steps at once, starting from their current factors. Every step is one pass over the ratings.
+    :param matrix: The ratings, a row per user or movie that is solved and a column per fixed user or movie.
+    :param fixed: The factors of the columns.
+    :param current: The current factors of the rows, the starting point.
+    :param regularization: The regularization, scaled by the number of values in a row.
+    :param steps: The number of conjugate gradient steps.
+    :return: The factors of every row.
+    """
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    columns = fixed[matrix.indices]
+    damping = (regularization * np.diff(matrix.indptr)).astype(np.float32)[:, None]
+
+    def apply(factors: Matrix) -> Matrix:
+        # The left-hand side of the normal equations of every row, without building them
+        products = sparse.csr_matrix((row_dot(columns, factors[rows]), matrix.indices, matrix.indptr), matrix.shape)
+        result: Matrix = products @ fixed + damping * factors
+        return result
+
+    return conjugate_gradient(apply, matrix @ fixed, current, steps)
+
+
+class RatingFactors:
+    """
+    Read-only user and movie factor matrices of one training run.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        mean: float,
+        user_ids: npt.NDArray[np.int64],
+        user_factors: Matrix,
+        movie_ids: npt.NDArray[np.int64],
+        movie_factors: Matrix
+    ) -> None:
+        """
+        Initialize a RatingFactors object.
+        :param version: The version stamp of the training run.
+        :param mean: The mean rating, the factors model the difference with it.
+        :param user_ids: The sorted ids of the users.
+        :param user_factors: The factors of every user.
+        :param movie_ids: The sorted ids of the movies.
+        :param movie_factors: The factors of every movie.
+        """
+        self.version = version
+        self.mean = mean
+        self.user_ids = user_ids
+        self.user_factors = user_factors
+        self.movie_ids = movie_ids
+        self.movie_factors = movie_factors
+
+    @staticmethod
+    def train(
+        user_ids: npt.NDArray[np.int64],
+        movie_ids: npt.NDArray[np.int64],
+        ratings: npt.NDArray[np.float32],
+        factors: int = FACTORS,
+        iterations: int = ITERATIONS,
+        seed: int = 0
+    ) -> "RatingFactors":
+        """
+        Factor the ratings with alternating least squares.
+        :param user_ids: The user of every rating.
+        :param movie_ids: The movie of every rating.
+        :param ratings: The ratings.
+        :param factors: The number of latent factors.
+        :param iterations: The number of iterations, each solves the users and then the movies.
+        :param seed: The seed of the initial movie factors.
+        :return: The factors.
+        """
+        users, user_positions = np.unique(user_ids, return_inverse=True)
+        movies, movie_positions = np.unique(movie_ids, return_inverse=True)
+        mean = float(ratings.mean()) if len(ratings) else 0.0
+        by_user = sparse.csr_matrix(
+            (ratings.astype(np.float32) - mean, (user_positions, movie_positions)), shape=(len(users), len(movies))
+        )
+        by_movie = by_user.T.tocsr()
+
+        movie_factors = np.random.default_rng(seed).normal(0, 0.1, (len(movies), factors)).astype(np.float32)
+        user_factors = np.zeros((len(users), factors), dtype=np.float32)
+        for _ in range(iterations):
+            user_factors = solve_factors(by_user, movie_factors, user_factors)
+            movie_factors = solve_factors(by_movie, user_factors, movie_factors)
+        return RatingFactors(str(time.time_ns()), mean, users, user_factors, movies, movie_factors)
+
+    def rmse(self, user_ids: npt.NDArray[np.int64], movie_ids: npt.NDArray[np.int64], ratings: Matrix) -> float:
+        """
+        Compute the root mean squared error of the predicted ratings.
+        :param user_ids: The user of every rating, all known to the factors.
+        :param movie_ids: The movie of every rating, all known to the factors.
+        :param ratings: The ratings.
+        :return: The error.
+        """
+        predicted = self.mean + np.einsum(
+            "ij,ij->i",
+            self.user_factors[np.searchsorted(self.user_ids, user_ids)],
+            self.movie_factors[np.searchsorted(self.movie_ids, movie_ids)],
+        )
+        return float(np.sqrt(np.mean((predicted - ratings) ** 2)))
+
+    def write(self, directory: str) -> None:
+        """
+        Write the factors to a directory.
+        :param directory: The directory to write the arrays and the manifest to.
+        """
+        np.save(os.path.join(directory, "user_ids.npy"), self.user_ids)
+        np.save(os.path.join(directory, "user_factors.npy"), self.user_factors)
+        np.save(os.path.join(directory, "movie_ids.npy"), self.movie_ids)
+        np.save(os.path.join(directory, "movie_factors.npy"), self.movie_factors)
+        with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+            json.dump({
+                "version": self.version, "mean": self.mean, "factors": int(self.movie_factors.shape[1]),
+                "users": len(self.user_ids), "movies": len(self.movie_ids),
+            }, manifest_file)
+
+    @staticmethod
+    def open(directory: str) -> "RatingFactors":
+        """
+        Memory-map the factors in a directory.
+        :param directory: The directory of a training run.
+        :return: The factors.
+        """
+        with open(os.path.join(directory, "manifest.json"), "r", encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        return RatingFactors(
+            manifest["version"],
+            float(manifest["mean"]),
+            np.load(os.path.join(directory, "user_ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "user_factors.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "movie_ids.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "movie_factors.npy"), mmap_mode="r"),
+        )
+
+    def user_vector(self, user_id: int) -> Optional[Matrix]:
+        """
+        Get the factors of a user that was part of the training run.
+        :param user_id: The id of the user.
+        :return: The factors, None if the user had no ratings at training time.
+        """
+        positions, found = find_positions(self.user_ids, np.array([user_id], dtype=np.int64))
+        return np.asarray(self.user_factors[positions[0]]) if found[0] else None
+
+    def fold_in(self, ratings: dict[int, float], regularization: float = REGULARIZATION) -> Optional[Matrix]:
+        """
+        Compute the factors of a user from their ratings, with the movie factors fixed.
+        :param ratings: The rating of the user per movie id.
+        :param regularization: The regularization, scaled by the number of ratings.
+        :return: The factors, None if none of the rated movies were part of the training run.
+        """
+        positions, known = find_positions(self.movie_ids, np.array(list(ratings), dtype=np.int64))
+        if not known.any():
+            return None
+
+        movie_factors = np.asarray(self.movie_factors[positions[known]])
+        values = np.array(list(ratings.values()), dtype=np.float32)[known] - self.mean
+        gram = movie_factors.T @ movie_factors + regularization * int(known.sum()) * np.eye(
+            movie_factors.shape[1], dtype=np.float32
+        )
+        vector: Matrix = np.linalg.solve(gram, movie_factors.T @ values).astype(np.float32)
+        return vector
+
+    def recommend(
+        self,
+        vector: Matrix,
+        amount: int = 10,
+        exclude: Optional[list[int]] = None
+    ) -> list[tuple[int, float]]:
+        """
+        Get the movies with the highest predicted rating for a user.
+        :param vector: The factors of the user.
+        :param amount: The number of movies.
+        :param exclude: The ids of movies to leave out, like the movies the user rated.
+        :return: List of (movie id, predicted rating), the best first.
+        """
+        scores = self.movie_factors @ vector + self.mean
+        if exclude:
+            positions, found = find_positions(self.movie_ids, np.array(exclude, dtype=np.int64))
+            scores[positions[found]] = -np.inf
+        amount = min(amount, int(np.isfinite(scores).sum()))
+        if amount <= 0:
+            return []
+        top = np.argpartition(-scores, amount - 1)[:amount]
+        top = top[np.lexsort((self.movie_ids[top], -scores[top]))]
+        return [(int(self.movie_ids[position]), float(scores[position])) for position in top]
+
+
+def train_rating_factors(db_session: Session, factors_dir: Optional[str] = None) -> RatingFactors:
+    """
+    Train the factors on all ratings and make them the current ones for all workers.
+
+    Every run gets its own directory and the name of the current one is swapped in atomically, so workers
+    never read a half written run. Older runs are removed, workers that still have them mapped keep reading
+    them until they switch.
+    :param db_session: The database session.
+    :param factors_dir: The directory the runs are stored in, FACTORS_DIR if None.
+    :return: The new factors.
+    """
+    factors_dir = factors_dir or FACTORS_DIR
+    start = time.perf_counter()
+    rows = db_session.execute(select(Rating.user_id, Rating.movie_id, Rating.rating)).tuples().all()
+    user_ids = np.array([row[0] for row in rows], dtype=np.int64)
+    movie_ids = np.array([row[1] for row in rows], dtype=np.int64)
+    ratings = np.array([row[2] for row in rows], dtype=np.float32)
+    rating_factors = RatingFactors.train(user_ids, movie_ids, ratings)
+
+    os.makedirs(factors_dir, exist_ok=True)
+    directory = os.path.join(factors_dir, f"factors-{rating_factors.version}")
+    os.makedirs(directory)
+    rating_factors.write(directory)
+
+    current_file = os.path.join(factors_dir, "CURRENT")
+    with tempfile.NamedTemporaryFile("w", dir=factors_dir, delete=False, encoding="utf-8") as temporary_file:
+        temporary_file.write(os.path.basename(directory))
+    os.replace(temporary_file.name, current_file)
+
+    for name in os.listdir(factors_dir):
+        if name.startswith("factors-") and name != os.path.basename(directory):
+            shutil.rmtree(os.path.join(factors_dir, name), ignore_errors=True)
+
+    logging.info(
+        "Trained the factors of %d ratings in %.2f seconds, training RMSE %.3f.", len(ratings),
+        time.perf_counter() - start, rating_factors.rmse(user_ids, movie_ids, ratings) if len(ratings) else 0.0
+    )
+    return rating_factors
+
+
+_rating_factors: Optional[RatingFactors] = None
+_checked_at = 0.0
+_rating_factors_lock = threading.Lock()
+
+
+def get_rating_factors(factors_dir: Optional[str] = None) -> Optional[RatingFactors]:
+    """
+    Get the current factors, memory-mapping them the first time.
+
+    Whether a newer run was trained is checked at most once every VERSION_CHECK_INTERVAL seconds.
+    :param factors_dir: The directory the runs are stored in, FACTORS_DIR if None.
+    :return: The factors, None if they have not been trained yet.
+    """
+    global _rating_factors, _checked_at  # pylint: disable=global-statement
+    factors_dir = factors_dir or FACTORS_DIR
+    with _rating_factors_lock:
+        if _rating_factors is not None and time.monotonic() - _checked_at < VERSION_CHECK_INTERVAL:
+            return _rating_factors
+
+        try:
+            with open(os.path.join(factors_dir, "CURRENT"), "r", encoding="utf-8") as current_file:
+                current = current_file.read().strip()
+            if _rating_factors is None or f"factors-{_rating_factors.version}" != current:
+                _rating_factors = RatingFactors.open(os.path.join(factors_dir, current))
+        except OSError:
+            # Not trained yet, or replaced by a newer run while opening it
+            pass
+        _checked_at = time.monotonic()
+        return _rating_factors
+
+
+def reset_rating_factors() -> None:
+    """
+    Forget the current factors, so the next call to get_rating_factors looks for the current run again.
+    """
+    global _rating_factors, _checked_at  # pylint: disable=global-statement
+    with _rating_factors_lock:
+        _rating_factors = None
+        _checked_at = 0.0
+
+
+def host_lock_key(host_name: Optional[str] = None) -> int:
+    """
+    Get the second key of the training lock, the same for every process of a host.
+    :param host_name: The name of the host, the name of this host if None.
+    :return: A signed 32-bit key derived from the host name.
+    """
+    return zlib.crc32((host_name or socket.gethostname()).encode()) - 2 ** 31
+
+
+def try_train_lock(db_session: Session) -> bool:
+    """
+    Take the training lock of this host until the end of the transaction, unless another process holds it.
+    :param db_session: The database session.
+    :return: Whether the lock was taken.
+    """
+    lock = text("SELECT pg_try_advisory_xact_lock(CAST(:key AS integer), CAST(:host AS integer))")
+    return bool(db_session.execute(lock, {"key": TRAIN_LOCK, "host": host_lock_key()}).scalar())
+
+
+def start_training(flask_app: Flask, interval: float = TRAIN_INTERVAL) -> threading.Thread:
+    """
+    Train the factors every interval seconds in a background thread, starting right away.
+
+    The factors are stored in FACTORS_DIR on the host, so every host trains its own. The processes of a host
+    take turns through an advisory lock of that host, so only one of them trains per run.
+    :param flask_app: The Flask app, whose database engine is used.
+    :param interval: The number of seconds between two runs.
+    :return: The training thread.
+    """
+    def run() -> None:
+        while True:
+            with flask_app.app_context(), Session(db.engine) as db_session:
+                try:
+                    if try_train_lock(db_session):
+                        train_rating_factors(db_session)
+                    db_session.commit()
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # The previous factors are served until the next run succeeds
+                    logging.error("Could not train the rating factors: %s", e)
+                    db_session.rollback()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name="rating-factors", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    config = APIConfig(config_sources=EnvSource(allow_all=True, nested_separator="__", file=".env"))
+    logging.basicConfig(level=config.logging.get_level())
+
+    with Session(create_engine(config.db.connection_url)) as session:
+        train_rating_factors(db_session=session)
@@ -0,0 +1,49 @@
+"""
+Client for fetching movies from the movie API.
+"""
+import json
+import time
+from typing import Any, Optional, Sequence
+
+from src.service_client import service_session
+
+MOVIE_BATCH_URL = "http://movie_api:5000/api/movies/batch"
+"""The movie API route that streams movies by id as NDJSON."""
+
+MOVIE_CARD_FIELDS = ("movie_id", "movie_name", "poster_path")
+"""The movie fields the movie cards of the frontend show, the movie API only loads and sends these."""
+
+
+def fetch_movies(
+    movie_ids: list[int],
+    cookies: dict[str, str],
+    timeout: float = 5,
+    fields: Optional[Sequence[str]] = None
+) -> list[dict[str, Any]]:
+    """
+    Fetch movies by id from the movie API in one request, reading the NDJSON stream line by line.
+    :param movie_ids: The ids of the movies.
+    :param cookies: The cookies to send along, like the access token.
+    :param timeout: The maximum number of seconds to wait for the movie API.
+    :param fields: The fields of the movies to fetch, all fields if None.
+    :return: The movies that exist, in the order of movie_ids.
+    :raises requests.RequestException: If the movie API could not be reached or answered with an error.
+    :raises TimeoutError: If the stream was not read within the timeout.
+    """
+    movies: list[dict[str, Any]] = []
+    params = {"fields": ",".join(fields)} if fields else None
+    deadline = time.monotonic() + timeout
+    with service_session.post(
+        MOVIE_BATCH_URL, params=params, json={"movie_ids": movie_ids}, cookies=cookies, stream=True, timeout=timeout
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if time.monotonic() > deadline:
+                raise TimeoutError("The movie API did not send the movies in time")
+            if line:
+                movie = json.loads(line)
+                if "not_found" not in movie:
+                    movies.append(movie)
+
+    positions = {movie_id: position for position, movie_id in enumerate(movie_ids)}
+    return sorted(movies, key=lambda movie: positions.get(movie["movie_id"], len(positions)))
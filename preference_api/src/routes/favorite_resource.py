@@ -5,6 +5,7 @@ from flask_restx import Namespace, Resource, Api, fields
 
 from src.database import db
 from src.database.models.favorite_movie import FavoriteMovie
+from src.movie_client import MOVIE_CARD_FIELDS, fetch_movies
 
 favorite_api = Namespace('favorite', description='Favorite movies related operations')
 
@@ -95,6 +96,7 @@ class GetFavoriteMoviesResource(Resource):
 
     @favorite_api.response(200, "Success", model=movie_list_model)
     @favorite_api.response(200, "Success")
+    @favorite_api.response(502, "The movie API could not be reached")
     @jwt_required()
     def get(self):
         """
@@ -106,17 +108,16 @@ class GetFavoriteMoviesResource(Resource):
         if not favorite_movies:
             return {"results": []}
 
-        jwt = request.cookies.get("access_token_cookie")
-        response = requests.get(
-            "http://movie_api:5000/api/movies/list", params={
-                "movie_ids": [
-                    movie.movie_id for movie in favorite_movies
-                ]
-            },
-            cookies={"access_token_cookie": jwt},
-            timeout=5,
-        )
-        return response.json()
+        # Stream the movies from the movie API, the id list can be longer than fits in a URL
+        try:
+            movies = fetch_movies(
+                [movie.movie_id for movie in favorite_movies],
+                cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
+                fields=MOVIE_CARD_FIELDS,
+            )
+        except requests.RequestException:
+            return {"message": "Failed to fetch the favorite movies."}, 502
+        return {"results": movies}
 
 
 def register_routes(api_blueprint: Api) -> None:
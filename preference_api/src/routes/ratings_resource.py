@@ -3,9 +3,13 @@ This module contains the resource for handling ratings and favorites.
 """
 import requests
 from flask import request
-from flask_restx import Namespace, Resource, Api, fields, marshal
+from flask_restx import Namespace, Resource, Api, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.activity_client import check_watched
 from src.database import db, Rating
+from src.database.item_similarity import item_recommender
+from src.serializer import serialize
+from src.service_client import ServiceError
 
 rating_ns = Namespace("rating", description="Rating operations")
 
@@ -95,16 +99,17 @@ class RatingResource(Resource):
         args = rating_parser.parse_args(request)
 
         # Check if the movie is watched
-        jwt = request.cookies.get("access_token_cookie")
-        response = requests.get(
-            "http://activity_api:5000/api/activity/watched",
-            params={"user_id": user_id, "movie_id": movie_id},
-            cookies={"access_token_cookie": jwt},
-            timeout=5,
-        )
-        if response.status_code != 200:
-            return {"message": "error while getting watched movies", "error": response.json()}, 400
-        if not response.json()["results"]:
+        csrf_token = request.cookies.get("csrf_access_token", "")
+        try:
+            [watched] = check_watched(
+                [(user_id, movie_id)],
+                cookies={"access_token_cookie": request.cookies.get("access_token_cookie"),
+                         "csrf_access_token": csrf_token},
+                csrf_token=csrf_token,
+            )
+        except ServiceError as e:
+            return {"message": e.message}, 400
+        if not watched:
             return {'message': "Movie not watched"}, 400
 
         # Make a rating
@@ -125,6 +130,9 @@ class RatingResource(Resource):
         db.session.add(rating)
         db.session.commit()
 
+        # Update the recommendations of the user without waiting for the next similarity build
+        item_recommender.fold_in(user_id, movie_id, rating.rating)
+
         return {"message": f"Rating added successfully with id {rating.rating_id}"}, 200
 
     @rating_ns.response(200, "Success")
@@ -145,6 +153,7 @@ class RatingResource(Resource):
 
         db.session.delete(rating)
         db.session.commit()
+        item_recommender.fold_in(user_id, movie_id, None)
 
         return {"message": "Rating deleted successfully"}, 200
 
@@ -162,7 +171,7 @@ class RatingResource(Resource):
         if not ratings:
             return {"results": []}, 200
 
-        return marshal({"results": ratings}, rating_list_model), 200
+        return serialize({"results": ratings}, rating_list_model), 200
 
 
 @rating_ns.route("/friends")
@@ -200,7 +209,7 @@ class FriendsResource(Resource):
             query.filter(Rating.movie_id == movie_id)
         results: list[Rating] = query.all()
 
-        return marshal({"results": results}, rating_list_model), 200
+        return serialize({"results": results}, rating_list_model), 200
 
 
 @rating_ns.route("/friends/<int:friend_id>")
@@ -222,7 +231,7 @@ class FriendMoviesResource(Resource):
         query = db.session.query(Rating).filter(Rating.user_id == friend_id)
         results: list[Rating] = query.all()
 
-        return marshal({"results": results}, rating_list_model), 200
+        return serialize({"results": results}, rating_list_model), 200
 
 
 @rating_ns.route("")
@@ -245,7 +254,7 @@ class RatingResourceDefault(Resource):
         if not ratings:
             return {"results": []}, 200
 
-        return marshal({"results": ratings}, rating_list_model), 200
+        return serialize({"results": ratings}, rating_list_model), 200
 
 
 def register_routes(api_blueprint: Api) -> None:
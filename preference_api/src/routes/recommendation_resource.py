@@ -1,42 +1,95 @@
 """
 This module contains the recommendation resource routes.
 """
+import logging
 
 import requests
 from flask import request
 from flask_restx import Namespace, Resource, Api
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.activity_client import WatchedMovies, fetch_watched_movies
+from src.database import db, Rating
+from src.database.item_similarity import item_recommender
+from src.database.matrix_factorization import get_rating_factors
 from src.routes.favorite_resource import movie_list_model
+from src.movie_client import MOVIE_CARD_FIELDS, fetch_movies
+from src.service_client import Deadline, ServiceError, read_json, service_session
 
 recommendation_ns = Namespace("recommendations", description="Recommendation operations")
 
+USER_FRIENDS_URL = "http://user_api:5000/api/users/friends"
+ACTIVITY_COUNTS_URL = "http://activity_api:5000/api/activity/watched/counts"
+
+FRIENDS_DEADLINE = 3.0
+"""The number of seconds the friends recommendations have for all their calls to the other services."""
+
+WATCHED_TIMEOUT = 1.0
+"""The number of seconds the recommendations wait for the watched movies, before recommending without them."""
+
 rating_parser = recommendation_ns.parser()
 rating_parser.add_argument(
     "amount", type=int, default=1, help="Number of popular movies to fetch, minimum 1, maximum 20", required=False
 )
 
 
+def watched_movies(user_id: int) -> WatchedMovies:
+    """
+    Get the movies the current user watched, to leave them out of the recommendations.
+    :param user_id: The id of the current user.
+    :return: The watched movies, none if the activity API could not tell in time.
+    """
+    try:
+        return fetch_watched_movies(
+            user_id,
+            cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
+            timeout=WATCHED_TIMEOUT,
+        )
+    except requests.RequestException as e:
+        logging.warning("Recommending without leaving out the watched movies: %s", e)
+        return WatchedMovies()
+
+
 @recommendation_ns.route("")
 class RecommendationResource(Resource):
     """
-    Resource for getting movie recommendations based on audience ratings.
+    Resource for getting personal movie recommendations based on the ratings.
     """
 
     @recommendation_ns.expect(rating_parser)
     @recommendation_ns.response(200, "Success", movie_list_model)
     @recommendation_ns.response(400, "Bad Request")
     @recommendation_ns.response(401, "Unauthorized")
+    @recommendation_ns.response(502, "The movie API could not be reached")
     @jwt_required()
     def get(self):
         """
-        Get movie recommendations based on user ratings.
+        Get the movies most similar to the movies the user rated, weighted by their ratings, leaving out the
+        movies they watched.
+
+        Users without ratings get the best rated movies of the catalog instead.
         """
         args = rating_parser.parse_args()
-        amount = args.get("amount", 1)
+        amount = min(max(args.get("amount") or 1, 1), 20)
+        user_id = int(get_jwt_identity())
+
+        # Before the first build of the similarities there is nothing to leave out yet
+        watched = watched_movies(user_id) if item_recommender.similarity is not None else WatchedMovies()
+        recommended = item_recommender.recommend(db.session, user_id, amount, exclude=watched)
+        if recommended:
+            try:
+                movies = fetch_movies(
+                    [movie_id for movie_id, _ in recommended],
+                    cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
+                    fields=MOVIE_CARD_FIELDS,
+                )
+            except requests.RequestException:
+                return {"message": "Failed to fetch the recommended movies."}, 502
+            return {"results": movies}, 200
+
         response = requests.get(
             "http://movie_api:5000/api/movies/list",
             cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
-            params={"amount": amount},
+            params={"amount": amount, "fields": ",".join(MOVIE_CARD_FIELDS)},
             timeout=5,
         )
         if response.status_code != 200:
@@ -45,73 +98,103 @@ class RecommendationResource(Resource):
         return response.json(), 200
 
 
-@recommendation_ns.route("/friends")
-class FriendsRecommendationResource(Resource):
+@recommendation_ns.route("/factors")
+class FactorRecommendationResource(Resource):
     """
-    Resource for getting movie recommendations based on friends' ratings.
+    Resource for getting the movies with the highest predicted rating from the rating factors.
     """
 
     @recommendation_ns.expect(rating_parser)
     @recommendation_ns.response(200, "Success", movie_list_model)
-    @recommendation_ns.response(400, "Bad Request")
     @recommendation_ns.response(401, "Unauthorized")
+    @recommendation_ns.response(502, "The movie API could not be reached")
+    @recommendation_ns.response(503, "The rating factors have not been trained yet")
     @jwt_required()
     def get(self):
         """
-        Get movie recommendations based on what friends watched recently.
+        Get the movies the user has not rated or watched with the highest predicted rating, the highest first.
+
+        Users who had no ratings when the factors were trained are folded in from their current ratings.
         """
         args = rating_parser.parse_args()
-        amount = args.get("amount", 1)
-
-        # Send a request to the friends API to get the list of friends
-        response = requests.get(
-            "http://user_api:5000/api/users/friends",
-            cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
-            timeout=5,
-        )
-        if response.status_code != 200:
-            return {"message": "Failed to fetch friends list."}, response.status_code
-
-        friends = response.json().get("results", [])
-        friend_ids = [friend["user_id"] for friend in friends]
-
-        if not friend_ids:
+        amount = min(max(args.get("amount") or 1, 1), 20)
+        rating_factors = get_rating_factors()
+        if rating_factors is None:
+            return {"message": "The rating factors have not been trained yet."}, 503
+
+        user_id = int(get_jwt_identity())
+        ratings = dict(db.session.query(Rating.movie_id, Rating.rating).filter(Rating.user_id == user_id).all())
+        vector = rating_factors.user_vector(user_id)
+        if vector is None and ratings:
+            vector = rating_factors.fold_in(ratings)
+        if vector is None:
             return {"results": []}, 200
 
-        # Get the movies that friends watched
-        response = requests.get(
-            "http://activity_api:5000/api/activity/watched",
-            cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
-            params={"user_id": friend_ids},
-            timeout=5,
-        )
-        if response.status_code != 200:
-            return {"message": "Failed to fetch friends' watched movies."}, response.status_code
-
-        results = response.json().get("results", [])
-        movie_id_counter = {}
-        for result in results:
-            movie_id = result["movie_id"]
-            if movie_id not in movie_id_counter:
-                movie_id_counter[movie_id] = 0
-            movie_id_counter[movie_id] += 1
+        recommended = rating_factors.recommend(vector, amount, exclude=[*ratings, *watched_movies(user_id)])
+        try:
+            movies = fetch_movies(
+                [movie_id for movie_id, _ in recommended],
+                cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
+                fields=MOVIE_CARD_FIELDS,
+            )
+        except requests.RequestException:
+            return {"message": "Failed to fetch the recommended movies."}, 502
+        return {"results": movies}, 200
 
-        # Sort the movies by the number of friends who watched them
-        sorted_movies = sorted(movie_id_counter.items(), key=lambda x: x[1], reverse=True)
-        sorted_movie_ids = [movie[0] for movie in sorted_movies[:amount]]
 
-        if not sorted_movie_ids:
-            return {"results": []}, 200
+@recommendation_ns.route("/friends")
+class FriendsRecommendationResource(Resource):
+    """
+    Resource for getting movie recommendations based on friends' ratings.
+    """
 
-        # Get the movies from the id list
-        response = requests.get(
-            "http://movie_api:5000/api/movies/list",
-            cookies={"access_token_cookie": request.cookies.get("access_token_cookie")},
-            params={"movie_ids": sorted_movie_ids},
-            timeout=5,
-        )
+    @recommendation_ns.expect(rating_parser)
+    @recommendation_ns.response(200, "Success", movie_list_model)
+    @recommendation_ns.response(400, "Bad Request")
+    @recommendation_ns.response(401, "Unauthorized")
+    @recommendation_ns.response(502, "Another service could not be reached")
+    @recommendation_ns.response(504, "The other services did not answer in time")
+    @jwt_required()
+    def get(self):
+        """
+        Get the movies the user has not watched yet that most friends watched, the most watched first.
 
-        return response.json(), 200
+        The activity API counts the friends per movie and leaves out the movies the user watched, the other
+        services are called over pooled connections and the whole request has FRIENDS_DEADLINE seconds.
+        """
+        args = rating_parser.parse_args()
+        amount = min(max(args.get("amount") or 1, 1), 20)
+        deadline = Deadline(FRIENDS_DEADLINE)
+        cookies = {"access_token_cookie": request.cookies.get("access_token_cookie")}
+
+        try:
+            # Every call needs the answer of the one before, each gets the time left of the deadline
+            friends = read_json(
+                service_session.get(USER_FRIENDS_URL, cookies=cookies, timeout=deadline.remaining()),
+                "Failed to fetch friends list."
+            )
+            friend_ids = [friend["user_id"] for friend in friends.get("results", [])]
+            if not friend_ids:
+                return {"results": []}, 200
+
+            # The most watched movies of the friends, without the ones the user watched
+            counts = read_json(service_session.get(
+                ACTIVITY_COUNTS_URL, cookies=cookies, timeout=deadline.remaining(),
+                params={"user_id": friend_ids, "exclude_user": int(get_jwt_identity()), "top_n": amount}
+            ), "Failed to fetch friends' watched movies.")
+
+            movie_ids = [count["movie_id"] for count in counts.get("results", [])]
+            movies = fetch_movies(
+                movie_ids, cookies=cookies, timeout=deadline.remaining(), fields=MOVIE_CARD_FIELDS
+            ) if movie_ids else []
+        except ServiceError as e:
+            return {"message": e.message}, e.status_code
+        except (TimeoutError, requests.Timeout):
+            return {"message": "The recommendation took too long."}, 504
+        except requests.RequestException:
+            return {"message": "Failed to fetch the recommended movies."}, 502
+
+        return {"results": movies}, 200
 
 
 def register_routes(api_blueprint: Api) -> None:
@@ -0,0 +1,71 @@
+"""
+Pooled connections to the other services, and the deadline of the calls made for one request.
+
+Every request used to open a fresh connection. The pooled session keeps the connections to the other
+services alive between requests.
+"""
+import time
+from typing import Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+SERVICE_CONNECTIONS = 16
+"""The maximum number of kept-alive connections per service."""
+
+# One pooled session keeps the connections to the other services alive between calls
+service_session = requests.Session()
+service_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=SERVICE_CONNECTIONS))
+
+
+class Deadline:
+    """
+    The moment a request has to be answered by, shared by all calls made for it.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        """
+        Initialize a Deadline that expires after a number of seconds.
+        :param seconds: The number of seconds from now.
+        """
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """
+        Get the time that is left, to use as the timeout of the next call.
+        :return: The number of seconds left.
+        :raises TimeoutError: If the deadline has passed.
+        """
+        remaining = self.expires_at - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("The deadline has passed")
+        return remaining
+
+
+class ServiceError(Exception):
+    """
+    A call to another service was answered with an error.
+    """
+
+    def __init__(self, message: str, status_code: int) -> None:
+        """
+        Initialize a ServiceError.
+        :param message: The message for the client of this service.
+        :param status_code: The status code the other service answered with.
+        """
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def read_json(response: requests.Response, message: str) -> Any:
+    """
+    Read the JSON body of a successful response of another service.
+    :param response: The response.
+    :param message: The message for the client of this service if the response is an error.
+    :return: The body.
+    :raises ServiceError: If the other service answered with another status than 200.
+    """
+    if response.status_code != 200:
+        raise ServiceError(message, response.status_code)
+    return response.json()
@@ -0,0 +1,56 @@
+"""
+Test cases for the item-item collaborative filtering.
+"""
+import pytest
+
+from src.database import Rating
+from src.database.item_similarity import ItemRecommender, ItemSimilarity
+
+
+def add_ratings(db_session) -> None:
+    """
+    Add ratings where movies 1 and 2 are rated by the same users, and movie 3 mostly together with movie 4.
+    """
+    for user_id, movie_id, rating in [
+        (2, 1, 8), (2, 2, 8),
+        (3, 1, 9), (3, 2, 7), (3, 3, 2),
+        (4, 3, 9), (4, 4, 9),
+    ]:
+        db_session.add(Rating(rating=rating, review="", user_id=user_id, movie_id=movie_id))
+    db_session.commit()
+
+
+def test_build_keeps_most_similar_movies_first(db_session):
+    """
+    Test that every movie keeps the movies rated by the same users, most similar first and without itself.
+    """
+    add_ratings(db_session)
+
+    similarity = ItemSimilarity.build(db_session, k=2)
+
+    assert similarity.movie_ids.tolist() == [1, 2, 3, 4]
+    assert [movie_id for movie_id, _ in similarity.neighbours(1)] == [2, 3]
+    assert similarity.neighbours(1)[0][1] == pytest.approx(0.99, abs=0.01)
+    assert [movie_id for movie_id, _ in similarity.neighbours(4)] == [3]
+    assert not similarity.neighbours(42)
+
+
+def test_recommend_folds_in_new_ratings(db_session):
+    """
+    Test that a new rating changes the recommendations of a user without a rebuild.
+    """
+    add_ratings(db_session)
+    db_session.add(Rating(rating=9, review="", user_id=1, movie_id=1))
+    db_session.commit()
+    recommender = ItemRecommender()
+
+    assert not recommender.recommend(db_session, 1)
+    recommender.rebuild(db_session)
+    assert [movie_id for movie_id, _ in recommender.recommend(db_session, 1)] == [2, 3]
+
+    recommender.fold_in(1, 3, 10)
+    assert [movie_id for movie_id, _ in recommender.recommend(db_session, 1)] == [4, 2]
+
+    recommender.fold_in(1, 3, None)
+    assert [movie_id for movie_id, _ in recommender.recommend(db_session, 1)] == [2, 3]
+    assert not recommender.recommend(db_session, 5)
@@ -0,0 +1,94 @@
+"""
+Test cases for the matrix factorization of the ratings.
+"""
+from unittest.mock import patch
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from src.database import Rating, db
+from src.database.matrix_factorization import RatingFactors, get_rating_factors, host_lock_key, \
+    reset_rating_factors, train_rating_factors, try_train_lock
+
+
+def make_ratings() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Make ratings of two groups of users, each loving their own half of the movies and disliking the other half.
+    """
+    users, movies, ratings = [], [], []
+    for user_id in range(1, 41):
+        for movie_id in range(1, 21):
+            if (user_id + movie_id) % 3:
+                users.append(user_id)
+                movies.append(movie_id)
+                ratings.append(9.0 if (user_id <= 20) == (movie_id <= 10) else 2.0)
+    return np.array(users), np.array(movies), np.array(ratings, dtype=np.float32)
+
+
+def test_train_predicts_the_ratings():
+    """
+    Test that the factors predict the ratings they were trained on and the ones left out.
+    """
+    users, movies, ratings = make_ratings()
+
+    factors = RatingFactors.train(users, movies, ratings, factors=4)
+
+    assert factors.rmse(users, movies, ratings) < 0.5
+    # User 1 did not rate movie 2, which the users of its group love
+    recommended = factors.recommend(factors.user_vector(1), amount=3, exclude=movies[users == 1].tolist())
+    assert recommended[0][0] == 2
+    assert recommended[0][1] > 7
+    assert factors.user_vector(42) is None
+
+
+def test_fold_in_new_user():
+    """
+    Test that a user without factors gets the recommendations of the users who rated alike.
+    """
+    users, movies, ratings = make_ratings()
+    factors = RatingFactors.train(users, movies, ratings, factors=4)
+
+    vector = factors.fold_in({11: 9.0, 12: 8.0, 1: 2.0})
+
+    recommended = [movie_id for movie_id, _ in factors.recommend(vector, amount=5, exclude=[11, 12, 1])]
+    assert all(movie_id > 10 for movie_id in recommended)
+    assert factors.fold_in({42: 9.0}) is None
+
+
+def test_train_rating_factors_swaps_in_new_version(db_session, tmp_path):
+    """
+    Test that a training run is written to disk and memory-mapped by the workers.
+    """
+    for user_id, movie_id, rating in zip(*make_ratings()):
+        db_session.add(Rating(rating=float(rating), review="", user_id=int(user_id), movie_id=int(movie_id)))
+    db_session.commit()
+    reset_rating_factors()
+
+    assert get_rating_factors(str(tmp_path)) is None
+    trained = train_rating_factors(db_session, str(tmp_path))
+    reset_rating_factors()
+    loaded = get_rating_factors(str(tmp_path))
+
+    assert loaded.version == trained.version
+    assert isinstance(loaded.movie_factors, np.memmap)
+    np.testing.assert_allclose(loaded.user_factors, trained.user_factors)
+    assert (tmp_path / "CURRENT").read_text() == f"factors-{trained.version}"
+    reset_rating_factors()
+
+
+def test_train_lock_is_per_host(app, db_session):  # pylint: disable=unused-argument
+    """
+    Test that the processes of one host take turns training, while other hosts train their own factors.
+    """
+    assert host_lock_key("host-a") != host_lock_key("host-b")
+
+    with patch("src.database.matrix_factorization.socket.gethostname", return_value="host-a"), \
+            Session(db.engine) as other:
+        assert try_train_lock(other)
+        assert not try_train_lock(db_session)
+        db_session.rollback()
+
+        with patch("src.database.matrix_factorization.socket.gethostname", return_value="host-b"):
+            assert try_train_lock(db_session)
+        db_session.rollback()
+        other.rollback()
@@ -1,6 +1,9 @@
 """
 This module contains tests for the favorite resource routes.
 """
+import json
+from unittest.mock import patch
+
 from src.database import FavoriteMovie
 
 
@@ -77,3 +80,23 @@ def test_delete_favorite_nonexistent(client):
     response = client.delete("/api/preference/favorite/999", headers={"X-CSRF-Token": client.csrf_token})
     assert response.status_code == 200
     assert response.json["message"] == "Movie not in favorites."
+
+
+@patch("src.service_client.service_session.post")
+def test_get_favorite_movies_streams_from_movie_api(mock_post, client, db_session):
+    """
+    Test that the favorite movies are fetched from the movie API batch route in the order they were added.
+    """
+    db_session.add_all([FavoriteMovie(user_id=1, movie_id=7), FavoriteMovie(user_id=1, movie_id=3)])
+    db_session.commit()
+    response = mock_post.return_value.__enter__.return_value
+    response.iter_lines.return_value = [
+        json.dumps({"movie_id": 3}).encode(), json.dumps({"movie_id": 7}).encode(), b'{"not_found": []}'
+    ]
+
+    response = client.get("/api/preference/favorite")
+
+    assert response.status_code == 200
+    assert response.json == {"results": [{"movie_id": 7}, {"movie_id": 3}]}
+    assert mock_post.call_args.kwargs["json"] == {"movie_ids": [7, 3]}
+    assert mock_post.call_args.kwargs["params"] == {"fields": "movie_id,movie_name,poster_path"}
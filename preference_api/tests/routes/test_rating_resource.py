@@ -5,14 +5,14 @@ from unittest.mock import patch
 from src.database import Rating, RatingReview
 
 
-@patch("requests.get")
-def test_post_rating_success(mock_get, client):
+@patch("src.service_client.service_session.post")
+def test_post_rating_success(mock_post, client):
     """
     Test case for posting a rating when the movie is watched.
     """
     # Mock external watched check
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {"results": ["dummy_entry"]}
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = {"results": [True]}
 
     response = client.post(
         "/api/preference/rating/123",  # movie_id = 123
@@ -22,16 +22,18 @@ def test_post_rating_success(mock_get, client):
 
     assert response.status_code == 200
     assert "Rating added successfully" in response.json["message"]
+    assert mock_post.call_args.kwargs["json"] == {"pairs": [{"user_id": 1, "movie_id": 123}]}
+    assert mock_post.call_args.kwargs["headers"] == {"X-CSRF-Token": client.csrf_token}
 
 
-@patch("requests.get")
-def test_post_rating_not_watched(mock_get, client):
+@patch("src.service_client.service_session.post")
+def test_post_rating_not_watched(mock_post, client):
     """
     Test case for posting a rating when the movie is not watched.
     """
     # Simulate not watched
-    mock_get.return_value.status_code = 200
-    mock_get.return_value.json.return_value = {"results": []}
+    mock_post.return_value.status_code = 200
+    mock_post.return_value.json.return_value = {"results": [False]}
 
     response = client.post(
         "/api/preference/rating/123",
@@ -43,14 +45,14 @@ def test_post_rating_not_watched(mock_get, client):
     assert response.json["message"] == "Movie not watched"
 
 
-@patch("requests.get")
-def test_post_rating_logging_error(mock_get, client):
+@patch("src.service_client.service_session.post")
+def test_post_rating_logging_error(mock_post, client):
     """
     Test case for posting a rating when there is an error with the logging service.
     """
     # Simulate error from logging service
-    mock_get.return_value.status_code = 500
-    mock_get.return_value.json.return_value = {"error": "Internal Server Error"}
+    mock_post.return_value.status_code = 500
+    mock_post.return_value.json.return_value = {"error": "Internal Server Error"}
 
     response = client.post(
         "/api/preference/rating/123",
@@ -1,7 +1,16 @@
 """
 Test cases for the recommendation resource.
 """
-from unittest.mock import patch, Mock
+import json
+import time
+from unittest.mock import patch, Mock, MagicMock
+
+import numpy as np
+import requests
+
+from src.database import Rating
+from src.database.item_similarity import ItemRecommender
+from src.database.matrix_factorization import RatingFactors
 
 
 @patch("src.routes.recommendation_resource.requests.get")
@@ -17,6 +26,7 @@ def test_get_recommendations_success(mock_get, client):
     assert response.status_code == 200
     assert response.json == {"results": [{"movie_id": 1, "title": "Movie A"}]}
     mock_get.assert_called_once()
+    assert mock_get.call_args.kwargs["params"] == {"amount": 1, "fields": "movie_id,movie_name,poster_path"}
 
 
 @patch("src.routes.recommendation_resource.requests.get")
@@ -32,43 +42,114 @@ def test_get_recommendations_fail(mock_get, client):
     assert response.json == {"message": "Failed to fetch movie list."}
 
 
+@patch("src.service_client.service_session.get")
+@patch("src.service_client.service_session.post")
 @patch("src.routes.recommendation_resource.requests.get")
-def test_get_friends_recommendations_success(mock_get, client):
+def test_get_recommendations_from_similar_movies(mock_get, mock_post, mock_service_get, client, db_session):
+    """
+    Test case for getting the movies similar to the movies the user rated instead of the popular movies, also
+    when the watched movies cannot be fetched.
+    """
+    mock_service_get.side_effect = requests.ConnectionError("activity_api is down")
+    for user_id, movie_id in [(1, 1), (2, 1), (2, 2), (3, 2), (3, 3)]:
+        db_session.add(Rating(rating=8, review="", user_id=user_id, movie_id=movie_id))
+    db_session.commit()
+    recommender = ItemRecommender()
+    recommender.rebuild(db_session)
+    mock_movie_batch(mock_post, [{"movie_id": 2, "movie_name": "Movie B"}])
+
+    with patch("src.routes.recommendation_resource.item_recommender", recommender):
+        response = client.get("/api/preference/recommendations", query_string={"amount": 5})
+
+    assert response.status_code == 200
+    assert response.json == {"results": [{"movie_id": 2, "movie_name": "Movie B"}]}
+    assert mock_post.call_args.kwargs["json"] == {"movie_ids": [2]}
+    mock_get.assert_not_called()
+    assert mock_service_get.call_args.args[0] == "http://activity_api:5000/api/activity/watched/bitmap/1"
+
+
+@patch("src.service_client.service_session.get")
+@patch("src.service_client.service_session.post")
+def test_get_recommendations_from_rating_factors(mock_post, mock_get, client, db_session):
     """
-    Test case for getting movie recommendations based on friends' ratings.
+    Test case for getting the movies with the highest predicted rating for a user without factors, leaving out
+    the movies they watched.
+    """
+    mock_get.return_value = Mock(status_code=200, content=bytes([1 << 3]))
+    user_ids, movie_ids, ratings = [], [], []
+    for user_id in range(2, 12):
+        for movie_id in range(1, 7):
+            user_ids.append(user_id)
+            movie_ids.append(movie_id)
+            ratings.append(9.0 if (user_id % 2 == 0) == (movie_id <= 3) else 2.0)
+    factors = RatingFactors.train(np.array(user_ids), np.array(movie_ids), np.array(ratings, dtype=np.float32), 2)
+    db_session.add_all([
+        Rating(rating=9, review="", user_id=1, movie_id=1), Rating(rating=2, review="", user_id=1, movie_id=4)
+    ])
+    db_session.commit()
+    mock_movie_batch(mock_post, [{"movie_id": 2, "movie_name": "Movie B"}])
+
+    with patch("src.routes.recommendation_resource.get_rating_factors", return_value=factors):
+        response = client.get("/api/preference/recommendations/factors", query_string={"amount": 2})
+
+    assert response.status_code == 200
+    assert response.json == {"results": [{"movie_id": 2, "movie_name": "Movie B"}]}
+    movie_ids = mock_post.call_args.kwargs["json"]["movie_ids"]
+    assert movie_ids[0] == 2 and 3 not in movie_ids and len(movie_ids) == 2
+
+    with patch("src.routes.recommendation_resource.get_rating_factors", return_value=None):
+        assert client.get("/api/preference/recommendations/factors").status_code == 503
+
+
+def mock_movie_batch(mock_post: MagicMock, movies: list[dict]) -> None:
+    """
+    Mock the NDJSON stream of the movie API batch route.
+    """
+    response = mock_post.return_value.__enter__.return_value
+    response.iter_lines.return_value = [json.dumps(movie).encode() for movie in [*movies, {"not_found": []}]]
+
+
+def mock_services(mock_get: MagicMock, friends: list[int], counts: list[tuple[int, int]]) -> None:
+    """
+    Mock the friends route of the user API and the watched counts route of the activity API.
     """
     def side_effect(url, *_, **__):
         """
         Mock responses for different API calls.
         """
-        if "user_api" in url:
-            mock = Mock()
-            mock.status_code = 200
-            mock.json.return_value = {"results": [{"user_id": 2}, {"user_id": 3}]}
-            return mock
-        if "activity_api" in url:
-            mock = Mock()
-            mock.status_code = 200
-            mock.json.return_value = {
-                "results": [{"movie_id": 1, "user_id": 2}, {"movie_id": 1, "user_id": 3}]
-            }
-            return mock
-        if "movie_api" in url:
-            mock = Mock()
-            mock.status_code = 200
-            mock.json.return_value = {"results": [{"movie_id": 1, "title": "Movie A"}]}
-            return mock
-        return Mock(status_code=404)
+        mock = Mock(status_code=200)
+        if url.endswith("/api/users/friends"):
+            mock.json.return_value = {"results": [{"user_id": user_id} for user_id in friends]}
+        elif url.endswith("/api/activity/watched/counts"):
+            mock.json.return_value = {"results": [{"movie_id": movie, "count": count} for movie, count in counts]}
+        else:
+            mock.status_code = 404
+        return mock
 
     mock_get.side_effect = side_effect
 
+
+@patch("src.service_client.service_session.post")
+@patch("src.service_client.service_session.get")
+def test_get_friends_recommendations_success(mock_get, mock_post, client):
+    """
+    Test case for getting the unwatched movies most friends watched, from the counts of the activity API.
+    """
+    mock_services(mock_get, friends=[2, 3], counts=[(1, 2)])
+    mock_movie_batch(mock_post, [{"movie_id": 1, "title": "Movie A"}])
+
     response = client.get("/api/preference/recommendations/friends", query_string={"amount": 1})
 
     assert response.status_code == 200
     assert response.json == {"results": [{"movie_id": 1, "title": "Movie A"}]}
+    counts_call = next(call for call in mock_get.call_args_list if call.args[0].endswith("/counts"))
+    assert counts_call.kwargs["params"] == {"user_id": [2, 3], "exclude_user": 1, "top_n": 1}
+    assert all(0 < call.kwargs["timeout"] <= 3 for call in mock_get.call_args_list)
+    assert mock_post.call_args.kwargs["json"] == {"movie_ids": [1]}
+    assert mock_post.call_args.kwargs["params"] == {"fields": "movie_id,movie_name,poster_path"}
 
 
-@patch("src.routes.recommendation_resource.requests.get")
+@patch("src.service_client.service_session.get")
 def test_get_friends_recommendations_fail_on_friends_api(mock_get, client):
     """
     Test case for getting movie recommendations based on friends' ratings when the friends API fails.
@@ -79,3 +160,31 @@ def test_get_friends_recommendations_fail_on_friends_api(mock_get, client):
 
     assert response.status_code == 500
     assert response.json == {"message": "Failed to fetch friends list."}
+
+
+@patch("src.routes.recommendation_resource.FRIENDS_DEADLINE", 0.2)
+@patch("src.service_client.service_session.get")
+def test_get_friends_recommendations_deadline(mock_get, client):
+    """
+    Test case for a slow service, the recommendations answer 504 once the deadline has passed.
+    """
+    mock_services(mock_get, friends=[2], counts=[(1, 1)])
+    answer = mock_get.side_effect
+
+    def slow_side_effect(url, *args, **kwargs):
+        """
+        Let the friends route hang, the call gives up after its timeout like requests does.
+        """
+        if url.endswith("/api/users/friends"):
+            assert kwargs["timeout"] <= 0.2
+            time.sleep(kwargs["timeout"])
+            raise requests.Timeout()
+        return answer(url, *args, **kwargs)
+
+    mock_get.side_effect = slow_side_effect
+    start = time.monotonic()
+
+    response = client.get("/api/preference/recommendations/friends")
+
+    assert response.status_code == 504
+    assert time.monotonic() - start < 0.45
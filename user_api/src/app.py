@@ -17,7 +17,7 @@ from flask_jwt_extended import JWTManager
 from src.config import APIConfig
 from src.database.database import db
 from src.routes import register_public_routes
-from src.cache import cache
+from src.cache import cache, get_cache_config
 from src.limiter import limiter
 from src.authentication import add_user_identity_lookup, add_user_lookup_callback, add_cookie_refresher
 from src.error_handlers import register_error_handlers
@@ -55,6 +55,7 @@ def create_app(api_config: APIConfig) -> Flask:
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = api_config.db.connection_url
     flask_app.config["SECRET_KEY"] = api_config.secret_key
     flask_app.config["DEBUG"] = api_config.debug
+    flask_app.config.update(get_cache_config(api_config.cache))
 
     CORS(flask_app, supports_credentials=True)
     db.init_app(flask_app)
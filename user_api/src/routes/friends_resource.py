@@ -1,7 +1,11 @@
 """
 This module contains the friend resource for the application.
 """
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
 
+import requests
+from flask import request
 from flask_restx import Namespace, Api, Resource, fields, marshal
 from flask_jwt_extended import jwt_required, get_current_user
 from src.database.models import User
@@ -9,6 +13,11 @@ from src.database import db
 
 friends_ns = Namespace("friends", description="Friends operations")
 
+ACTIVITY_NEWSFEED_FRIENDS_URL = "http://activity_api:5000/api/activity/newsfeed/friends"
+
+notify_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notify-friends")
+"""Notifies the activity API outside of the requests, one at a time so it hears of the changes in order."""
+
 friend_model = friends_ns.model(
     "Friend",
     {
@@ -24,6 +33,42 @@ friends_list_model = friends_ns.model(
 )
 
 
+def notify_friends_changed() -> "Future[None]":
+    """
+    Let the activity API know the friends of the current user changed, so it rebuilds the newsfeeds.
+
+    The activity API is called in the background with the cookies of the current request, so the request does
+    not wait for it. The friendship is stored either way, a newsfeed that missed the change catches up on the
+    next one.
+    :return: The background call.
+    """
+    return notify_executor.submit(
+        post_friends_changed,
+        request.cookies.get("access_token_cookie", ""),
+        request.cookies.get("csrf_access_token", ""),
+    )
+
+
+def post_friends_changed(access_token: str, csrf_token: str) -> None:
+    """
+    Call the activity API to rebuild the newsfeeds of a user whose friends changed, logging failures.
+    :param access_token: The access token cookie of the user.
+    :param csrf_token: The CSRF token cookie of the user.
+    """
+    try:
+        response = requests.post(
+            ACTIVITY_NEWSFEED_FRIENDS_URL,
+            cookies={"access_token_cookie": access_token, "csrf_access_token": csrf_token},
+            headers={"X-CSRF-Token": csrf_token},
+            timeout=5,
+        )
+    except requests.RequestException as e:
+        logging.warning("Could not notify the activity API of the changed friends: %s", e)
+        return
+    if response.status_code != 200:
+        logging.warning("The activity API could not rebuild the newsfeed: %s", response.text)
+
+
 @friends_ns.route("")
 class FriendsResource(Resource):
     """
@@ -67,6 +112,7 @@ class FriendsResource(Resource):
 
             user.add_friend(friend)
             db.session.commit()
+            notify_friends_changed()
 
             return {"message": "Friend added successfully"}, 200
 
@@ -89,6 +135,7 @@ class FriendsResource(Resource):
 
             user.remove_friend(friend)
             db.session.commit()
+            notify_friends_changed()
 
             return {"message": "Friend removed successfully"}, 200
 
@@ -1,8 +1,19 @@
 """
 Test cases for the friend resource in the user API.
 """
+from unittest.mock import patch
+
 import pytest
+import requests
 from src.database import User
+from src.routes.friends_resource import notify_executor
+
+
+def wait_for_notifications() -> None:
+    """
+    Wait until the activity API was notified of every change so far, the notifications run one at a time.
+    """
+    notify_executor.submit(lambda: None).result(timeout=5)
 
 
 @pytest.fixture
@@ -32,10 +43,12 @@ def test_get_friends_returns_user_friends(client, db_session, another_user):  #
     assert results[0]["user_id"] == another_user.user_id
 
 
-def test_post_add_friend_success(client, db_session, another_user):  # pylint: disable=redefined-outer-name
+@patch("src.routes.friends_resource.requests.post")
+def test_post_add_friend_success(mock_post, client, db_session, another_user):  # pylint: disable=redefined-outer-name
     """
-    Test that the POST /friends endpoint adds a friend successfully.
+    Test that the POST /friends endpoint adds a friend successfully and lets the activity API rebuild the newsfeed.
     """
+    mock_post.return_value.status_code = 200
     test_user = db_session.query(User).first()
     response = client.post("/api/users/friends/bob", headers={"X-CSRF-Token": client.csrf_token})
 
@@ -44,6 +57,9 @@ def test_post_add_friend_success(client, db_session, another_user):  # pylint: d
 
     db_session.refresh(test_user)
     assert another_user in test_user.get_friends()
+    wait_for_notifications()
+    assert mock_post.call_args.args[0] == "http://activity_api:5000/api/activity/newsfeed/friends"
+    assert mock_post.call_args.kwargs["headers"] == {"X-CSRF-Token": client.csrf_token}
 
 
 def test_post_add_friend_not_found(client):
@@ -59,10 +75,13 @@ def test_post_add_friend_not_found(client):
     assert response.json == {"message": "User with username 'nonexistent' not found"}
 
 
-def test_delete_friend_success(client, db_session, another_user):  # pylint: disable=redefined-outer-name
+@patch("src.routes.friends_resource.requests.post")
+def test_delete_friend_success(mock_post, client, db_session, another_user):  # pylint: disable=redefined-outer-name
     """
-    Test that the DELETE /friends/<friend_name> endpoint successfully removes a friend.
+    Test that the DELETE /friends/<friend_name> endpoint successfully removes a friend, also when the activity API
+    cannot be reached.
     """
+    mock_post.side_effect = requests.ConnectionError("activity_api is down")
     user = db_session.query(User).first()
     user.add_friend(another_user)
     db_session.commit()
@@ -77,6 +96,8 @@ def test_delete_friend_success(client, db_session, another_user):  # pylint: dis
 
     db_session.refresh(user)
     assert another_user not in user.get_friends()
+    wait_for_notifications()
+    assert mock_post.called
 
 
 def test_delete_friend_not_found(client):